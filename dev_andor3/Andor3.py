@@ -1,17 +1,39 @@
 import os
 import zmq
 import json
+import time
 import tango
 import signal
 import numpy as np
 import logging
+from collections import deque
 from functools import wraps
-from threading import Thread
+from threading import Event, Lock
 from tango import DevState, AttrWriteType
 from tango.server import Device, attribute, command, run, device_property
-from libdaq import Client, Receiver
 from . import andor
 from . import atutility
+from .framepool import FramePool
+from . import decoder
+from .orientation import Orientation
+from .reduction import Reducer
+from .flatfield import Accumulator, Corrector, ReferenceCache, reference_key
+from .pipeline import Pipeline
+from .compression import Compressor
+from .bufferpool import BufferPool
+from .telemetry import Telemetry
+from .metadata import MetadataReader
+from .batching import Batcher
+from .discovery import DiscoveryCache
+from .statuspoller import StatusPoller
+from .eventloop import EventLoop
+from .affinity import parse_cpus
+from .header import HeaderTemplate
+from .preview import Preview
+from .spill import SpillRing
+from .shmring import ShmRing
+from .framestats import FrameStats
+from . import configure
 
 logging.basicConfig()
 
@@ -30,13 +52,73 @@ def handle_error(func):
             
     return wrapper
 
+# seconds between attempts to drain the spill ring while the socket is full
+SPILL_RETRY = 0.001
+# seconds between change events of the LastFrame statistics while frames arrive
+STATS_EVENT_INTERVAL = 0.2
+STATS_ATTRIBUTES = ('LastFrameStats', 'LastFrameMin', 'LastFrameMax', 'LastFrameMean',
+                    'LastFrameSaturated', 'LastFrameHistogram')
+
 trigger_map = {"Internal": "INTERNAL", "External": "EXTERNAL_MULTI", "Software": "SOFTWARE"}
 
+# Configure settings that are also kept on the device
+setting_fields = {'AOIWidth': '_width', 'AOILeft': '_left', 'AOIHeight': '_height', 'AOITop': '_top',
+                  'ExposureTime': '_exposure_time', 'nTriggers': '_frame_count',
+                  'TriggerMode': '_trigger_mode', 'ElectronicShutteringMode': '_shutter_mode',
+                  'PixelReadoutRate': '_pixel_readout_rate',
+                  'SimplePreAmpGainControl': '_gain_control', 'SensorCooling': '_sensor_cooling'}
+
 class Andor3(Device):
     receiver_url = device_property(dtype=str, mandatory=True)
     data_port = device_property(dtype=int, default_value=9999)
     k8s_namespace = device_property(dtype=str)
     serial_number = device_property(dtype=str, default_value="")
+    # memory reserved for recycled output frames, in MB
+    frame_pool_memory = device_property(dtype=int, default_value=1024)
+    # bound of the decode and send queues, in frames
+    pipeline_depth = device_property(dtype=int, default_value=16)
+    # SDK buffers: seconds of frames at FrameRate, at least buffer_min_count of them and capped
+    # by memory in MB; all are allocated and queued in Arm when the frame size changes, so a
+    # longer latency only pays off for a receiver that stalls longer than the decode queues hold
+    buffer_latency = device_property(dtype=float, default_value=0.05)
+    buffer_min_count = device_property(dtype=int, default_value=16)
+    buffer_memory_limit = device_property(dtype=int, default_value=2048)
+    buffer_mlock = device_property(dtype=bool, default_value=False)
+    buffer_hugepages = device_property(dtype=bool, default_value=False)
+    # serve Prometheus metrics on this port, 0 to disable
+    telemetry_port = device_property(dtype=int, default_value=0)
+    # CPUs for the decode workers, sender and decoder threads, e.g. '4-7,12', empty for any
+    worker_cpus = device_property(dtype=str, default_value='')
+    # receiver status poll interval in s, idle and while armed, and the oldest status served
+    status_poll_interval = device_property(dtype=float, default_value=1.0)
+    status_poll_interval_armed = device_property(dtype=float, default_value=0.1)
+    status_max_age = device_property(dtype=float, default_value=2.0)
+    # camera index and video device of the last discovery, empty to always discover
+    discovery_cache = device_property(dtype=str, default_value='/var/tmp/andor3-discovery.json')
+    # seconds a feature read is cached, writes and SDK change callbacks drop it
+    feature_cache_ttl = device_property(dtype=float, default_value=1.0)
+    # directory for the dark and flat references, empty keeps them in memory only
+    reference_cache = device_property(dtype=str, default_value='')
+    # data endpoints on data_port and the ports after it, and how frames are spread over them:
+    # 'frame' by frame number modulo the stripes, 'round_robin' in turn
+    data_stripes = device_property(dtype=int, default_value=1)
+    stripe_mode = device_property(dtype=str, default_value='frame')
+    # ZeroMQ I/O threads of the context the cameras of a server share, set by the first camera,
+    # SNDHWM of the data sockets in messages and SNDBUF in bytes, 0 for the ZeroMQ defaults
+    data_io_threads = device_property(dtype=int, default_value=1)
+    data_hwm = device_property(dtype=int, default_value=0)
+    data_sndbuf = device_property(dtype=int, default_value=0)
+    # MB of shared memory for the frames to a receiver on this host, 0 sends them over the
+    # data socket
+    shm_memory = device_property(dtype=int, default_value=0)
+    # publish a binned, rate limited copy of the frames on this port, 0 to disable
+    preview_port = device_property(dtype=int, default_value=0)
+    # file on local disk for messages the receiver cannot take yet and its size in MB,
+    # empty to block the sender instead
+    spill_path = device_property(dtype=str, default_value='')
+    spill_size = device_property(dtype=int, default_value=4096)
+    # messages queued on the data socket before they spill
+    spill_hwm = device_property(dtype=int, default_value=64)
 
     SimplePreAmpGainControl = attribute(dtype=str,
                                         access=AttrWriteType.READ_WRITE)
@@ -63,189 +145,330 @@ class Andor3(Device):
 
     PresetSimplePreAmpGainControl = device_property(dtype=str)
 
+    # I/O threads of the shared context, from the camera that started it
+    context_io_threads = None
+
     def __init__(self, *args, **kwargs):
-        self.context = zmq.Context()
-        self.pipe = self.context.socket(zmq.PAIR)
-        self.pipe.bind('inproc://zyla')
+        # cameras of one server share the context and the acquisition thread
+        self.context = zmq.Context.instance()
 
         # this internally calls init_device
         super().__init__(*args, **kwargs)
 
+        self.pipe_address = 'inproc://zyla-%x' % id(self)
+        self.pipe = self.context.socket(zmq.PAIR)
+        self.pipe.bind(self.pipe_address)
+
         self.register_signal(signal.SIGINT)
 
-        self.thread = Thread(target=self.main)
-        self.thread.start()
+        self.start_pipeline()
+        self.start_acquisition()
 
 
     def init_device(self):
         super().init_device()
-        
-        andor.sdk.AT_InitialiseLibrary()
-        devcount = andor.get_int(andor.AT_HANDLE_SYSTEM, 'DeviceCount')
-        print('Found %d devices', devcount)
-        i = 0
-        if self.serial_number != "":
-            snmap = {}
-            for i in range(devcount):
-                handle = andor.ffi.new('AT_H*')
-                andor.sdk.AT_Open(i, handle)
-                camera_model = andor.get_string(handle[0], 'CameraModel')
-                camera_serial = andor.get_string(handle[0], 'SerialNumber')
-                print('CameraModel %s: serial: %s', camera_model, camera_serial)
-                andor.sdk.AT_Close(handle[0])
-                snmap[camera_serial] = i
-            i = snmap[self.serial_number]
-
-
-        handle = andor.ffi.new('AT_H*')
-        andor.sdk.AT_Open(i, handle)
-        self.handle = handle[0]
-        self._camera_model = andor.get_string(self.handle, 'CameraModel')
-        self._camera_serial = andor.get_string(handle[0], 'SerialNumber')
-
-        print("using serial number", self._camera_serial)
-        if "SIMCAM" in self._camera_model:
-            logger.error("only simcam found. make sure to have camera connected and on.")
-            self._error_msg = "only simcam found. make sure to have camera connected and on."
-            self.set_state(DevState.FAULT)
-            return
-
-        # find correct dev/video number
-        import glob
-        vdevs = glob.glob("/dev/video*")
-        print("video devices", vdevs)
-
-        fdmap = {}
-        poller = zmq.Poller()
-        for vdev in vdevs:
-            fd_video = os.open(vdev, os.O_RDONLY)
-            fdmap[fd_video] = vdev
-            poller.register(fd_video, zmq.POLLIN)
-
-        self.buffers = []
-
-        image_size = andor.get_int(self.handle, 'ImageSizeBytes')
-        self.buffers.clear()
-        for i in range(100):
-            buf = np.empty(image_size, np.uint8)
-            self.buffers.append(buf)
-        andor.sdk.AT_Flush(self.handle)
-        for buf in self.buffers:
-            andor.sdk.AT_QueueBuffer(self.handle, andor.ffi.from_buffer(buf), image_size)
-        andor.sdk.AT_Command(self.handle, 'AcquisitionStart')
+        self.set_context_io_threads()
+        # only the Tango device talks to a receiver over libdaq, the benchmark and the tests
+        # run on a LocalReceiver without it
+        from libdaq import Receiver
+        self.receiver = Receiver(self.receiver_url)
+        self.init_camera()
+        self.set_change_event('State', True, False)
+        self.set_change_event('Status', True, False)
+        for name in STATS_ATTRIBUTES:
+            self.set_change_event(name, True, False)
+        self.start_status_poller()
 
-        polled = dict(poller.poll())
-        print("polled data: ", polled)
-        print("map", fdmap)
+    def set_context_io_threads(self):
+        # the context starts with its first socket, later settings have no effect
+        if Andor3.context_io_threads is None:
+            self.context.io_threads = self.data_io_threads
+            Andor3.context_io_threads = self.data_io_threads
+        elif self.data_io_threads != Andor3.context_io_threads:
+            logger.warning('data_io_threads %d ignored, the shared context has %d',
+                           self.data_io_threads, Andor3.context_io_threads)
 
-        polledfds = list(polled.keys())
-        if len(polledfds) != 1:
-            self.set_state(DevState.FAULT)
-            self.set_status("no corresponding video device found")
-            return
+    def start_status_poller(self):
+        if getattr(self, 'status_poller', None):
+            self.status_poller.stop()
+        self._pushed_state = None
+        self.status_poller = StatusPoller(self.receiver, self.status_poll_interval,
+                                          self.status_poll_interval_armed, self.status_max_age,
+                                          fast=lambda: self._armed or self._running,
+                                          on_poll=self.push_state)
 
-        self.videodevice = fdmap[polledfds[0]]
+    def init_camera(self):
+        start = time.perf_counter()
+        self._startup_time = float('nan')
+        andor.initialise()
+        self.buffer_pool = BufferPool(self.buffer_latency, self.buffer_memory_limit,
+                                      self.buffer_min_count, lock=self.buffer_mlock,
+                                      hugepages=self.buffer_hugepages)
+        self.discovery = DiscoveryCache(self.discovery_cache)
+        entry = self.discovery.lookup(self.serial_number)
+        self._discovery = 'cached'
+        if not (entry and self.open_cached(entry)):
+            self._discovery = 'full'
+            self.open_camera(self.find_camera_index())
+            if "SIMCAM" in self._camera_model:
+                logger.error("only simcam found. make sure to have camera connected and on.")
+                self._error_msg = "only simcam found. make sure to have camera connected and on."
+                self.set_state(DevState.FAULT)
+                return
+            self.videodevice = self.find_video_device()
+            if self.videodevice is None:
+                self.set_state(DevState.FAULT)
+                self.set_status("no corresponding video device found")
+                return
+            self.discovery.store(self.serial_number, self._camera_index,
+                                 self._camera_serial, self.videodevice)
         print("using video device", self.videodevice)
 
-        andor.sdk.AT_Command(self.handle, 'AcquisitionStop')
-        andor.sdk.AT_Flush(self.handle)
-
-        for fd in fdmap:
-            poller.unregister(fd)
-            os.close(fd)
-
         self._filename = ''
         self._label = ''
         self._nproj = 1
         self._save_raw = True
         self._error_msg = ''
+        # an error of the last series, the next Arm clears it
+        self._series_error = ''
         self._armed = False
         self._frame_count = 1
+        self._series_frames = 1
         self._acquired_frames = 0
-        # 0 is idle and 1 is running
+        # 0 is idle and 1 is running, until the end of the series is sent
         self._running = 0
+        self._finishing = False
+        # clear from the end of a series until its frames are sent and the camera is flushed
+        self.series_ended = Event()
+        self.series_ended.set()
         self._fliplr = False
         self._flipud = False
         self._rotation = 0
+        self._orientation_mode = 'pixels'
+        self.orientation = None
+        self._image_extra = {}
+        self._crop = ''
+        self._binning_rows = 1
+        self._binning_columns = 1
+        self._binning_mode = 'sum'
+        self.reducer = None
+        self._flatfield = 'none'
+        # uint16 output of a transmission of 1, leaves room up to 4
+        self._flatfield_scale = 16384.0
+        self.corrector = None
+        self.reference = None
+        self._preview_rate = 2.0
+        self._preview_binning = 4
+        self.preview = None
+        self._stats_subsample = 8
+        self._stats_saturation = 0
+        self.frame_stats = None
+        self.stats_lock = Lock()
+        self.last_stats = None
+        self._stats_frame = -1
+        self._stats_event_time = 0.0
+        self._header_format = 'json'
+        self.image_header = None
+        self._pipeline_workers = 2
+        self._metadata_enable = bool(self.features.is_implemented('MetadataEnable')
+                                     and self.features.get_bool('MetadataEnable'))
+        self.metadata = None
+        self._dropped_frames = 0
+        self._compression = 'none'
+        self._compression_level = 0
+        self.compressor = Compressor()
+        self._batch_frames = 1
+        self._batch_timeout = 5.0
+        self.batcher = None
+        self.shm_ring = None
+        self._shm_rings = 0
+        self._presets = {}
+        self._presets_json = '{}'
+        self.recycled = deque()
+        self._decoder_engine = 'numpy'
+        self._decoder_threads = 1
+        self._decoder_verify = False
+        self._verify_pending = False
+        self.decoder = None
+        self._decoder_key = None
+        self._pre_arm = False
+        self._prequeued = None
+        self._arm_time = None
+        self._arm_latency = float('nan')
+        self._first_frame_latency = float('nan')
 
-        self._exposure_time = andor.get_float(self.handle, 'ExposureTime')
+        self._exposure_time = self.features.get_float('ExposureTime')
         if self.PresetExposureTime:
             print("setting PresetExposureTime", self.PresetExposureTime)
             self.write_ExposureTime(self.PresetExposureTime)
-        self._trigger_mode = andor.get_enum_string(self.handle, 'TriggerMode')
-        self._shutter_mode = andor.get_enum_string(self.handle, 'ElectronicShutteringMode')
+        self._trigger_mode = self.features.get_enum_string('TriggerMode')
+        self._shutter_mode = self.features.get_enum_string('ElectronicShutteringMode')
         if self.PresetElectronicShutteringMode:
             print("setting PresetElectronicShutteringMode", self.PresetElectronicShutteringMode)
             self.write_ElectronicShutteringMode(self.PresetElectronicShutteringMode)
-        self._pixel_readout_rate = andor.get_enum_string(self.handle, 'PixelReadoutRate')
-        self._sensor_cooling = andor.get_bool(self.handle, 'SensorCooling')
-        self._width = andor.get_int(self.handle, 'AOIWidth')
-        self._left = andor.get_int(self.handle, 'AOILeft')
-        self._height = andor.get_int(self.handle, 'AOIHeight')
-        self._top = andor.get_int(self.handle, 'AOITop')
+        self._pixel_readout_rate = self.features.get_enum_string('PixelReadoutRate')
+        self._sensor_cooling = self.features.get_bool('SensorCooling')
+        self._width = self.features.get_int('AOIWidth')
+        self._left = self.features.get_int('AOILeft')
+        self._height = self.features.get_int('AOIHeight')
+        self._top = self.features.get_int('AOITop')
 
         self._target_temperature = None
-        if andor.is_implemented(self.handle, "TargetSensorTemperature"):
-            self._target_temperature = andor.get_float(self.handle, 'TargetSensorTemperature')
+        if self.features.is_implemented("TargetSensorTemperature"):
+            self._target_temperature = self.features.get_float('TargetSensorTemperature')
 
-        atutility.sdk.AT_InitialiseUtilityLibrary()
+        atutility.initialise()
 
         if self.PresetSimplePreAmpGainControl:
             print("setting PresetSimplePreAmpGainControl", self.PresetSimplePreAmpGainControl)
             self.write_SimplePreAmpGainControl(self.PresetSimplePreAmpGainControl)
-        self._gain_control = andor.get_enum_string(self.handle, 'SimplePreAmpGainControl')
+        self._gain_control = self.features.get_enum_string('SimplePreAmpGainControl')
         self.write_SimplePreAmpGainControl(self._gain_control)
 
-        #print(andor.get_enum_string_options(self.handle, 'TemperatureControl'))
+        #print(self.features.get_enum_options('TemperatureControl'))
         
-        options = andor.get_enum_string_options(self.handle, 'SimplePreAmpGainControl')
+        options = self.features.get_enum_options('SimplePreAmpGainControl')
         self._gain_control_options = '\n'.join(options)
         
-        andor.set_enum_string(self.handle, 'CycleMode', 'Fixed')
+        self.features.set_enum_string('CycleMode', 'Fixed')
         
-        self.buffers = []
-
-        self.receiver = Receiver(self.receiver_url)
+        self.frame_pool = FramePool()
+        # float32 corrected frames, frames after crop and binning, and whichever is sent
+        self.corrected_pool = None
+        self.reduced_pool = None
+        self.output_pool = self.frame_pool
+        self.references = ReferenceCache(self.reference_cache)
 
+        self._startup_time = time.perf_counter() - start
+        logger.info('camera ready after %.3f s (%s discovery)', self._startup_time, self._discovery)
         self.set_state(DevState.ON)
+
+    def find_camera_index(self):
+        # opens every camera to find the one with serial_number
+        devcount = andor.get_int(andor.AT_HANDLE_SYSTEM, 'DeviceCount')
+        print('Found %d devices', devcount)
+        if self.serial_number == "":
+            return 0
+        snmap = {}
+        for i in range(devcount):
+            handle = andor.ffi.new('AT_H*')
+            andor.sdk.AT_Open(i, handle)
+            camera_model = andor.get_string(handle[0], 'CameraModel')
+            camera_serial = andor.get_string(handle[0], 'SerialNumber')
+            print('CameraModel %s: serial: %s', camera_model, camera_serial)
+            andor.sdk.AT_Close(handle[0])
+            snmap[camera_serial] = i
+        return snmap[self.serial_number]
+
+    def open_camera(self, index):
+        handle = andor.ffi.new('AT_H*')
+        andor.sdk.AT_Open(index, handle)
+        self.handle = handle[0]
+        self._camera_index = index
+        self.features = andor.Features(self.handle, self.feature_cache_ttl)
+        self._camera_model = self.features.get_string('CameraModel')
+        self._camera_serial = self.features.get_string('SerialNumber')
+        print("using serial number", self._camera_serial)
+
+    def open_cached(self, entry):
+        # the camera at the cached index must still have the cached serial number
+        try:
+            self.open_camera(entry['index'])
+        except RuntimeError:
+            return False
+        if self._camera_serial != entry['serial']:
+            self.features.close()
+            andor.sdk.AT_Close(self.handle)
+            return False
+        self.videodevice = entry['video']
+        return True
+
+    def find_video_device(self):
+        # the /dev/video node that reports a short acquisition, None if not exactly one
+        vdevs = andor.video_devices()
+        print("video devices", vdevs)
+
+        fdmap = {}
+        poller = zmq.Poller()
+        for vdev in vdevs:
+            fd_video = os.open(vdev, os.O_RDONLY)
+            fdmap[fd_video] = vdev
+            poller.register(fd_video, zmq.POLLIN)
+
+        image_size = self.features.get_int('ImageSizeBytes')
+        andor.sdk.AT_Flush(self.handle)
+        self.buffer_pool.configure(image_size, self.buffer_pool.min_count)
+        self.buffer_pool.queue(self.handle)
+        andor.sdk.AT_Command(self.handle, 'AcquisitionStart')
+
+        polled = dict(poller.poll())
+        print("polled data: ", polled)
+        print("map", fdmap)
+
+        andor.sdk.AT_Command(self.handle, 'AcquisitionStop')
+        andor.sdk.AT_Flush(self.handle)
+
+        for fd in fdmap:
+            poller.unregister(fd)
+            os.close(fd)
+
+        polledfds = list(polled.keys())
+        if len(polledfds) != 1:
+            return None
+        return fdmap[polledfds[0]]
     
     def delete_device(self):
         logger.info('delete_device')
+        self.status_poller.stop()
+        self.features.close()
         andor.sdk.AT_Close(self.handle)
+        andor.finalise()
         self.set_state(DevState.OFF)
 
 
     def signal_handler(self, signo):
         self.pipe.send(b'terminate')
-        self.thread.join(1)
+        self.detached.wait(1)
 
-    @handle_error
-    def update_state_and_status(self):
+    def evaluate_state(self, receiver_status):
         if self._error_msg:
-            self.set_state(DevState.FAULT)
-            self.set_status(self._error_msg)
-            return 
-        
-        receiver_status = self.receiver.status()
+            return DevState.FAULT, self._error_msg
+
+        if self._series_error:
+            return DevState.FAULT, self._series_error
+
         if self._running == 1:
-            state, status = DevState.RUNNING, 'Acquisition in progress'
-            
-        elif receiver_status['state'] == 'error':
-            state, status = DevState.FAULT, 'Error from streaming-receiver: %s' % receiver_status['error']
-            
-        elif self._armed:
+            return DevState.RUNNING, 'Acquisition in progress'
+
+        if receiver_status['state'] == 'error':
+            return DevState.FAULT, 'Error from streaming-receiver: %s' % receiver_status['error']
+
+        if self._armed:
             if receiver_status['state'] == 'running':
-                state, status = DevState.RUNNING, 'Waiting for streaming-receiver to finish'
-            else:
-                self._armed = False
-                state, status = DevState.ON, 'Idle'
-                
-        else:
-            state, status = DevState.ON, 'Idle'
+                return DevState.RUNNING, 'Waiting for streaming-receiver to finish'
+            self._armed = False
 
+        return DevState.ON, 'Idle'
+
+    @handle_error
+    def update_state_and_status(self):
+        # served from the status poller, which refreshes stale snapshots itself
+        receiver_status = None if self._error_msg else self.status_poller.status()
+        state, status = self.evaluate_state(receiver_status)
         self.set_state(state)
         self.set_status(status)
-            
+
+    def push_state(self, receiver_status):
+        # runs on the status poller thread after every poll
+        state, status = self.evaluate_state(receiver_status)
+        if (state, status) == self._pushed_state:
+            return
+        self._pushed_state = (state, status)
+        self.set_state(state)
+        self.set_status(status)
+        self.push_change_event('State', state)
+        self.push_change_event('Status', status)
+
     def dev_state(self):
         self.update_state_and_status()
         return self.get_state()
@@ -258,124 +481,702 @@ class Andor3(Device):
         andor.sdk.AT_QueueBuffer(self.handle, buf, size)
         
     def handle_image(self, buf, size):
-        img = np.empty((self._height, self._width), dtype=np.uint16)
-        ret = atutility.sdk.AT_ConvertBuffer(buf, 
-                                             andor.ffi.from_buffer(img),
-                                             self._width, self._height,
-                                             self.stride, self.pixel_encoding,
-                                             'Mono16')
-        if ret != 0:
-            raise RuntimeError('Error in AT_ConvertBuffer')
-        # return buffer to andor sdk
-        self.queue_buffer(buf, size)
-                
-        if self._fliplr:
-            img = np.fliplr(img)
-                    
-        if self._flipud:
-            img = np.flipud(img)
-                
-        if self._rotation:
-            img = np.rot90(img, self._rotation)
-            
-        img = np.ascontiguousarray(img)
+        raw = np.frombuffer(andor.ffi.buffer(buf, size), np.uint8)
+        if self._verify_pending:
+            self._verify_pending = False
+            if not decoder.verify(raw, self._width, self._height, self.stride, self.pixel_encoding):
+                logger.error('decoder output differs from AT_ConvertBuffer for %s, using sdk',
+                             self.pixel_encoding)
+                self.decoder.close()
+                self.decoder = decoder.Decoder(self._width, self._height, self.stride,
+                                               self.pixel_encoding, engine='sdk')
+                self._decoder_key = None
+        # orientation is applied while decoding by writing through a strided view
+        img = self.frame_pool.acquire(self.orientation.shape)
+        self.decoder.decode(raw, self.orientation.view(img))
         return img
-    
-    def main(self):
-        pipe = self.context.socket(zmq.PAIR)
-        pipe.connect('inproc://zyla')
-        self.data_socket = self.context.socket(zmq.PUSH)
-        self.data_socket.bind(os.environ.get("DATA_SOCKET", f'tcp://*:{self.data_port}'))
-        self._msg_number = 0
-        fd_video = os.open(self.videodevice, os.O_RDONLY)
-        poller = zmq.Poller()
-        poller.register(fd_video, zmq.POLLIN)
-        poller.register(pipe, zmq.POLLIN)
-
-        def finish():
-            if self._running:
-                self.data_socket.send_json({'htype': 'series_end',
-                                            'msg_number': self._msg_number})
-                self._msg_number += 1
-            andor.sdk.AT_Command(self.handle, 'AcquisitionStop')
-            andor.sdk.AT_Flush(self.handle)
-            self._running = 0
-        
-        while True:
-            events = dict(poller.poll())
-            if fd_video in events and events[fd_video] == zmq.POLLIN:
-                while ret := andor.wait_buffer(self.handle, 0):
-                    buf, size = ret
-                    #print('frame', self._acquired_frames)
-                    img = self.handle_image(buf, size)
-                    frame = zmq.Frame(img, copy=False)
-                    self.data_socket.send_json({'htype': 'image',
-                                      'frame': self._acquired_frames,
-                                      'shape': img.shape,
-                                      'type': 'uint16',
-                                      'compression': 'none',
-                                      'msg_number': self._msg_number}, flags=zmq.SNDMORE)
-                    self.data_socket.send(frame, copy=False)
-                    self._msg_number += 1
-                    self._acquired_frames += 1
-                    if self._acquired_frames == self._frame_count:
-                        finish()
-                
-            if pipe in events and events[pipe] == zmq.POLLIN:
-                msg = pipe.recv()
-                if msg == b'start':
-                    logger.debug('start acquisition')
-                    self._running = 1
-                    self.data_socket.send_json({'htype': 'header',
-                                                'filename': self._filename,
-                                                'msg_number': self._msg_number}, flags=zmq.SNDMORE)
-                    
-                    meta = {'cooling': self._sensor_cooling,
-                            'label': self._label,
-                            'nproj': self._nproj,
-                            'save_raw': self._save_raw
-                    }
-                    self.data_socket.send_json(meta)
-                    self._msg_number += 1
-                elif msg == b'stop':
-                    logger.debug('end acquisition')
-                    finish()
-
-                elif msg == b'terminate':
-                    logger.debug('terminating network thread')
-                    finish()
-                    break
-            
-            
+
+    def recycle(self, buf, size):
+        # hand the buffer back to the acquisition stage for requeueing
+        self.recycled.append((buf, size))
+        os.write(self.recycle_w, b'\0')
+
+    def process_image(self, job):
+        # runs on a decode worker
+        frame_number, buf, size, meta = job
+        start = time.perf_counter_ns()
+        try:
+            img = self.handle_image(buf, size)
+        finally:
+            self.recycle(buf, size)
+        self.telemetry.record('decode', time.perf_counter_ns() - start)
+        if self.reference:
+            self.reference.add(img)
+            self.frame_pool.release(img)
+            return None
+        stats = None
+        if self.frame_stats:
+            start = time.perf_counter_ns()
+            stats = self.frame_stats.compute(img)
+            self.telemetry.record('stats', time.perf_counter_ns() - start)
+            self.update_stats(frame_number, stats)
+        pool = self.frame_pool
+        if self.corrector:
+            start = time.perf_counter_ns()
+            if self.corrector.dtype == img.dtype:
+                self.corrector.apply(img, img)
+            else:
+                out = self.corrected_pool.acquire(img.shape)
+                self.corrector.apply(img, out)
+                pool.release(img)
+                img, pool = out, self.corrected_pool
+            self.telemetry.record('correct', time.perf_counter_ns() - start)
+        if self.preview:
+            self.preview.offer(frame_number, img)
+        if self.reducer:
+            start = time.perf_counter_ns()
+            out = self.reduced_pool.acquire(self.reducer.shape)
+            self.reducer.reduce(img, out)
+            pool.release(img)
+            img, pool = out, self.reduced_pool
+            self.telemetry.record('reduce', time.perf_counter_ns() - start)
+        # shape, type and compression are in the per-series image_header
+        header = {'htype': 'image', 'frame': frame_number, **meta}
+        if stats:
+            header['stats'] = stats
+        data = img
+        if self.compressor.codec != 'none':
+            start = time.perf_counter_ns()
+            data = self.compressor.compress(img)
+            self.telemetry.record('compress', time.perf_counter_ns() - start)
+            pool.release(img)
+            header['compressed_size'] = len(data)
+        if self.shm_ring:
+            slot = self.shm_ring.put(data)
+            if slot is not None:
+                # only the descriptor goes over the socket, a full ring sends the data
+                if data is img:
+                    pool.release(img)
+                header['shm_slot'] = slot
+                header['shm_size'] = len(memoryview(data).cast('B'))
+                return [header]
+        return [header, data]
+
+    def update_stats(self, frame_number, stats):
+        # runs on a decode worker, the workers may finish frames out of order
+        with self.stats_lock:
+            if frame_number < self._stats_frame:
+                return
+            self._stats_frame = frame_number
+            self.last_stats = dict(stats, frame=frame_number)
+            now = time.monotonic()
+            if now < self._stats_event_time:
+                return
+            self._stats_event_time = now + STATS_EVENT_INTERVAL
+        self.push_stats()
+
+    def push_stats(self):
+        stats = self.last_stats
+        if stats is None:
+            return
+        self.push_change_event('LastFrameStats', json.dumps(stats))
+        self.push_change_event('LastFrameMin', stats['min'])
+        self.push_change_event('LastFrameMax', stats['max'])
+        self.push_change_event('LastFrameMean', stats['mean'])
+        self.push_change_event('LastFrameSaturated', stats['saturated'])
+        self.push_change_event('LastFrameHistogram', stats['histogram'])
+
+    def send_message(self, message):
+        # runs on the sender thread, the only user of the data sockets
+        header, *parts = message
+        batcher = self.batcher
+        if batcher:
+            if header['htype'] == 'image':
+                if batcher.add(header, parts[0]):
+                    self.send_batch(batcher)
+                return
+            # control messages keep their place after the frames before them
+            self.send_batch(batcher)
+        parts = [json.dumps(part).encode() if isinstance(part, dict) else part for part in parts]
+        if header['htype'] != 'image':
+            # control messages go to every stripe, each counts its own messages
+            for stripe in range(len(self.data_sockets)):
+                header = dict(header, msg_number=self.next_msg_number(stripe), stripe=stripe)
+                self.transmit(stripe, [json.dumps(header).encode(), *parts])
+            return
+        stripe = self.stripe_for(header['frame'])
+        nbytes = header['shm_size'] if not parts else len(memoryview(parts[0]).cast('B'))
+        self.transmit(stripe, [self.image_header.encode(header, self.next_msg_number(stripe)),
+                               *parts])
+        self.telemetry.frames.add()
+        self.telemetry.bytes.add(nbytes)
+        self.telemetry.stripe_bytes[stripe].add(nbytes)
+
+    def stripe_for(self, frame_number):
+        stripes = len(self.data_sockets)
+        if stripes == 1:
+            return 0
+        if self.stripe_mode == 'frame':
+            return frame_number % stripes
+        self._next_stripe = (self._next_stripe + 1) % stripes
+        return self._next_stripe
+
+    def next_msg_number(self, stripe):
+        number = self._msg_numbers[stripe]
+        self._msg_numbers[stripe] += 1
+        return number
+
+    def transmit(self, stripe, frames):
+        # without a spill ring a full socket blocks the sender, and the pipeline behind it
+        spill = self.spill
+        if spill is None:
+            self.send_frames(stripe, frames, 0)
+            return
+        if not spill.records or self.drain_spill():
+            try:
+                self.send_frames(stripe, frames, zmq.NOBLOCK)
+                return
+            except zmq.Again:
+                pass
+        if spill.put(frames, stripe):
+            for part in frames:
+                if isinstance(part, np.ndarray):
+                    self.output_pool.release(part)
+            return
+        if not self._series_error:
+            self._series_error = ('spill buffer full (%d MB), the receiver is too slow'
+                                  % self.spill_size)
+            logger.error(self._series_error)
+        # keep the order, wait for the socket
+        self.drain_spill(block=True)
+        self.send_frames(stripe, frames, 0)
+
+    def send_frames(self, stripe, frames, flags):
+        # a message that is accepted at its first frame is accepted as a whole
+        socket = self.data_sockets[stripe]
+        for i, part in enumerate(frames):
+            more = zmq.SNDMORE if i < len(frames) - 1 else 0
+            if isinstance(part, np.ndarray):
+                frame = zmq.Frame(part, copy=False, track=True)
+                socket.send(frame, flags=flags | more, copy=False)
+                self.output_pool.track(part, frame.tracker)
+            else:
+                socket.send(part, flags=flags | more, copy=isinstance(part, memoryview))
+
+    def drain_spill(self, block=False):
+        # oldest spilled messages first, across all stripes, True once the ring is empty
+        spill = self.spill
+        while spill.records:
+            stripe, frames = spill.peek()
+            try:
+                self.send_frames(stripe, frames, 0 if block else zmq.NOBLOCK)
+            except zmq.Again:
+                return False
+            spill.pop()
+        return True
+
+    def send_batch(self, batcher):
+        if not batcher.frames:
+            return
+        header, payload, frames = batcher.take()
+        header = {**self.image_header.fixed, **header}
+        for frame in frames:
+            if isinstance(frame, np.ndarray):
+                self.output_pool.release(frame)
+        stripe = self.stripe_for(header['frames'][0])
+        header['msg_number'] = self.next_msg_number(stripe)
+        self.transmit(stripe, [json.dumps(header).encode(), payload])
+        self.telemetry.frames.add(header['count'])
+        self.telemetry.bytes.add(len(payload))
+        self.telemetry.stripe_bytes[stripe].add(len(payload))
+
+    def flush(self):
+        # called by the sender thread between messages, returns when to call again
+        timeout = self.flush_batch()
+        if self.spill and self.spill.records and not self.drain_spill():
+            return SPILL_RETRY if timeout is None else min(timeout, SPILL_RETRY)
+        return timeout
+
+    def flush_batch(self):
+        batcher = self.batcher
+        if not batcher:
+            return None
+        remaining = batcher.remaining()
+        if remaining == 0.0:
+            self.send_batch(batcher)
+            return None
+        return remaining
+
+    def start_pipeline(self):
+        self.recycle_r, self.recycle_w = os.pipe()
+        os.set_blocking(self.recycle_r, False)
+        # the sender tells the loop that everything up to the end of a series is sent
+        self.drained_r, self.drained_w = os.pipe()
+        os.set_blocking(self.drained_r, False)
+        if self.stripe_mode not in ('frame', 'round_robin'):
+            raise ValueError('stripe_mode must be frame or round_robin')
+        # DATA_SOCKET sets the stripes when given, not data_stripes
+        self.telemetry = Telemetry(len(self.data_endpoints()))
+        if self.telemetry_port:
+            self.telemetry.serve(self.telemetry_port)
+        self.spill = None
+        if self.spill_path:
+            self.spill = SpillRing(self.spill_path, self.spill_size * 2**20)
+        preview_endpoint = self.preview_endpoint()
+        if preview_endpoint:
+            self.preview = Preview(self.context, preview_endpoint, self.telemetry)
+        self.pipeline = Pipeline(self.process_image, self.send_message,
+                                 self._pipeline_workers, self.pipeline_depth,
+                                 self.telemetry, self.flush,
+                                 parse_cpus(self.worker_cpus))
+
+    def start_acquisition(self):
+        self.detached = Event()
+        EventLoop.call(self.attach)
+
+    def data_endpoints(self):
+        # one per stripe, DATA_SOCKET is a comma separated list
+        if "DATA_SOCKET" in os.environ:
+            return os.environ["DATA_SOCKET"].split(',')
+        return [f'tcp://*:{self.data_port + i}' for i in range(self.data_stripes)]
+
+    def preview_endpoint(self):
+        # empty when there is no preview
+        default = f'tcp://*:{self.preview_port}' if self.preview_port else ''
+        return os.environ.get("PREVIEW_SOCKET", default)
+
+    def attach(self, loop):
+        # acquisition stage, on the acquisition thread shared by all cameras: dequeues
+        # SDK buffers into the pipeline and requeues the ones the decode workers are done with
+        self.loop = loop
+        self.loop_pipe = self.context.socket(zmq.PAIR)
+        self.loop_pipe.connect(self.pipe_address)
+        hwm = self.data_hwm or (self.spill_hwm if self.spill else 0)
+        self.data_sockets = []
+        for endpoint in self.data_endpoints():
+            socket = self.context.socket(zmq.PUSH)
+            if hwm:
+                socket.setsockopt(zmq.SNDHWM, hwm)
+            if self.data_sndbuf:
+                socket.setsockopt(zmq.SNDBUF, self.data_sndbuf)
+            socket.bind(endpoint)
+            self.data_sockets.append(socket)
+        self._msg_numbers = [0] * len(self.data_sockets)
+        self._next_stripe = -1
+        self._sdk_outstanding = 0
+        self._terminating = False
+        self.fd_video = os.open(self.videodevice, os.O_RDONLY)
+        self._video_polled = False
+        self.poll_video(True)
+        loop.register(self.recycle_r, self.requeue)
+        loop.register(self.drained_r, self.on_drained)
+        loop.register(self.loop_pipe, self.on_command)
+
+    def detach(self):
+        self.poll_video(False)
+        for source in (self.recycle_r, self.drained_r, self.loop_pipe):
+            self.loop.unregister(source)
+        os.close(self.fd_video)
+        self.loop_pipe.close()
+        for socket in self.data_sockets:
+            socket.close(linger=0)
+        if self.preview:
+            self.preview.close()
+        if self.spill:
+            self.spill.close()
+        if self.shm_ring:
+            self.shm_ring.close()
+        self.detached.set()
+
+    def requeue(self):
+        try:
+            os.read(self.recycle_r, 65536)
+        except BlockingIOError:
+            pass
+        while self.recycled:
+            buf, size = self.recycled.popleft()
+            self._sdk_outstanding -= 1
+            if self._running and not self._finishing:
+                self.queue_buffer(buf, size)
+        self.update_fill()
+        if self._running and not self._finishing and not self.pipeline.decode_full:
+            # a worker took a frame, there is room for the next one
+            self.poll_video(True)
+
+    def poll_video(self, poll):
+        # the loop is shared by all cameras, it stops polling a camera whose frames cannot be
+        # taken right now rather than block on it
+        if poll == self._video_polled:
+            return
+        if poll:
+            self.loop.register(self.fd_video, self.on_video)
+        else:
+            self.loop.unregister(self.fd_video)
+        self._video_polled = poll
+
+    def update_fill(self):
+        count = len(self.buffer_pool.buffers)
+        self.telemetry.sdk_queue_fill = (count - self._sdk_outstanding) / count if count else 0.0
+
+    def finish(self):
+        # ends the series without waiting on the loop, on_drained completes it once the
+        # sender is through the frames in flight, a stalled receiver holds up only this camera
+        if self._finishing:
+            return
+        self._finishing = True
+        self.series_ended.clear()
+        andor.sdk.AT_Command(self.handle, 'AcquisitionStop')
+        # the frames still in the SDK are flushed with the series, not dequeued
+        self.poll_video(False)
+        if self._running and not self.reference:
+            self.pipeline.post([{'htype': 'series_end',
+                                 'dropped': self._dropped_frames}])
+        self.pipeline.when_sent(lambda: os.write(self.drained_w, b'\0'))
+
+    def on_drained(self):
+        # the workers are done with all SDK buffers of the series, they can be flushed
+        try:
+            os.read(self.drained_r, 64)
+        except BlockingIOError:
+            pass
+        self._finishing = False
+        self.poll_video(True)
+        andor.sdk.AT_Flush(self.handle)
+        if self._running and not self.reference:
+            # the statistics of the last frame, events between are rate limited
+            self.push_stats()
+        self._running = 0
+        self.requeue()
+        if self._pre_arm:
+            # queue the buffers for the next series now, Arm skips it if they still fit
+            self.buffer_pool.queue(self.handle)
+            self._prequeued = (self.buffer_pool.size, len(self.buffer_pool.buffers))
+        if self.reference:
+            self.store_reference()
+        self.series_ended.set()
+        if self._terminating:
+            self.pipeline.stop()
+            self.detach()
+
+    def store_reference(self):
+        # the reference is done once it is stored
+        reference = self.reference
+        try:
+            self.features.write('FrameCount', 'int', self._frame_count)
+            if not reference.count:
+                logger.error('no frames for the %s reference', reference.kind)
+                return
+            logger.info('%s reference from %d frames for %s', reference.kind, reference.count,
+                        reference.key)
+            self.references.put(reference.key, reference.kind, reference.mean())
+        finally:
+            self.reference = None
+
+    def on_video(self):
+        while self._running and not self._finishing:
+            if self.pipeline.decode_full:
+                # the workers are behind, requeue polls again once they took a frame
+                self.poll_video(False)
+                break
+            start = time.perf_counter_ns()
+            ret = andor.wait_buffer(self.handle, 0)
+            if not ret:
+                break
+            self.telemetry.record('wait', time.perf_counter_ns() - start)
+            if self._acquired_frames == 0:
+                self._first_frame_latency = time.perf_counter() - self._arm_time
+            buf, size = ret
+            self._sdk_outstanding += 1
+            if self.recycled:
+                self.requeue()
+            else:
+                self.update_fill()
+            meta = {}
+            if self.metadata:
+                # hardware timestamps, gaps in them are frames lost by the camera
+                meta = self.metadata.read(np.frombuffer(andor.ffi.buffer(buf, size), np.uint8))
+                self._dropped_frames = self.metadata.dropped
+            self.pipeline.submit((self._acquired_frames, buf, size, meta))
+            self._acquired_frames += 1
+            if self._acquired_frames + self._dropped_frames >= self._series_frames:
+                self.finish()
+
+    def on_command(self):
+        msg = self.loop_pipe.recv()
+        if msg == b'start':
+            logger.debug('start acquisition')
+            self._running = 1
+            meta = {'cooling': self._sensor_cooling,
+                    'label': self._label,
+                    'nproj': self._nproj,
+                    'save_raw': self._save_raw
+            }
+            self.pipeline.post([{'htype': 'header',
+                                 'filename': self._filename,
+                                 'stripes': len(self.data_sockets),
+                                 'header_format': self.image_header.format,
+                                 **(self.shm_ring.describe() if self.shm_ring else {}),
+                                 **({'frame_stats': self.frame_stats.describe()}
+                                    if self.frame_stats else {})}, meta])
+        elif msg == b'reference':
+            logger.debug('start reference acquisition')
+            self._running = 1
+
+        elif msg == b'stop':
+            logger.debug('end acquisition')
+            self.finish()
+
+        elif msg == b'video':
+            # Rediscover found the camera on another video device
+            polled = self._video_polled
+            self.poll_video(False)
+            os.close(self.fd_video)
+            self.fd_video = os.open(self.videodevice, os.O_RDONLY)
+            self.poll_video(polled)
+
+        elif msg == b'terminate':
+            logger.debug('detaching from the acquisition thread')
+            # detaches once the series in flight is sent
+            self._terminating = True
+            self.finish()
+
     @command
     def Arm(self):
+        arm_time = time.perf_counter()
         logger.info('start nTriggers %d', self._frame_count)
-        self.stride = andor.get_int(self.handle, 'AOIStride')
-        self.pixel_encoding = andor.get_enum_string(self.handle, 'PixelEncoding')
-        logger.debug("height %d, width %d, stride %d, encoding %s", self._height, self._width, self.stride, self.pixel_encoding)
-        logger.info('ReadoutTime %f', andor.get_float(self.handle, 'ReadoutTime'))
-        logger.debug('ImageSizeBytes %d', andor.get_int(self.handle, 'ImageSizeBytes'))
-        image_size = andor.get_int(self.handle, 'ImageSizeBytes')
+        if not self.series_ended.wait(5.0):
+            raise RuntimeError('Arm while the previous series is still being sent')
+        self._series_frames = self._frame_count
         self._acquired_frames = 0
-        self.buffers.clear()
-        for i in range(100):
-            buf = np.empty(image_size, np.uint8)
-            self.buffers.append(buf)
-        andor.sdk.AT_Flush(self.handle)
-        for buf in self.buffers:
-            andor.sdk.AT_QueueBuffer(self.handle, andor.ffi.from_buffer(buf), image_size)
+        self._dropped_frames = 0
+        self._arm_time = arm_time
+        self._first_frame_latency = float('nan')
+        self.pipeline.set_workers(self._pipeline_workers)
+        self.compressor = Compressor(self._compression, self._compression_level)
+        self.batcher = None
+        # shared memory descriptors are small already, they are not batched
+        if self._batch_frames > 1 and not self.shm_memory:
+            self.batcher = Batcher(self._batch_frames, self._batch_timeout / 1e3,
+                                   lambda: self.telemetry.frames.value)
+        self.telemetry.reset()
+        if self._orientation_mode == 'header':
+            self.orientation = Orientation(self._height, self._width)
+            self._image_extra = {'orientation': Orientation(self._height, self._width, self._fliplr,
+                                                            self._flipud, self._rotation).header()}
+        else:
+            self.orientation = Orientation(self._height, self._width, self._fliplr,
+                                           self._flipud, self._rotation)
+            self._image_extra = {}
+        self.corrector = self.make_corrector()
+        self.reducer = self.make_reducer()
+        self.frame_stats = None
+        if self._stats_subsample:
+            self.frame_stats = FrameStats(self.features.get_enum_string('PixelEncoding'),
+                                          self._stats_subsample, self._stats_saturation)
+        with self.stats_lock:
+            self._stats_frame = -1
+            self._stats_event_time = 0.0
+        shape, dtype = self.orientation.shape, 'uint16'
+        if self.corrector:
+            dtype = self.corrector.dtype.name
+            self._image_extra['flatfield'] = {'scale': self.corrector.scale}
+        if self.reducer:
+            shape, dtype = self.reducer.shape, self.reducer.dtype.name
+            self._image_extra['reduction'] = {'crop': self.crop(),
+                                              'binning': list(self.reducer.binning),
+                                              'mode': self.reducer.mode}
+        if self.preview:
+            preview_dtype = self.corrector.dtype if self.corrector else np.uint16
+            binning = min(self._preview_binning, *self.orientation.shape)
+            self.preview.configure(Reducer(self.orientation.shape, None, (binning, binning),
+                                           'mean', preview_dtype),
+                                   self._preview_rate,
+                                   {'binning': binning, 'filename': self._filename,
+                                    **{k: v for k, v in self._image_extra.items()
+                                       if k != 'reduction'}})
+        if self.shm_memory:
+            self.make_shm_ring(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        # the image header fields that do not change within the series
+        self.image_header = HeaderTemplate({'htype': 'image',
+                                            'shape': shape,
+                                            'type': dtype,
+                                            'compression': self.compressor.codec,
+                                            **self._image_extra},
+                                           self._header_format)
+        # the series header is ready, the camera is prepared during the receiver handshake
         self.pipe.send(b'start')
-        if not self.receiver.wait_for_running(5.0):
-            raise RuntimeError('No reply from streaming-receiver after Arm')
+        try:
+            self.prepare()
+            if not self.receiver.wait_for_running(5.0):
+                raise RuntimeError('No reply from streaming-receiver after Arm')
+        except Exception:
+            self.pipe.send(b'stop')
+            raise
         andor.sdk.AT_Command(self.handle, 'AcquisitionStart')
+        self._series_error = ''
+        self._arm_latency = time.perf_counter() - arm_time
         self._armed = True
+        self.status_poller.wake()
+
+    def prepare(self):
+        # camera side of Arm, skips what is unchanged since the last series
+        self.stride = self.features.get_int('AOIStride')
+        self.pixel_encoding = self.features.get_enum_string('PixelEncoding')
+        image_size = self.features.get_int('ImageSizeBytes')
+        frame_rate = self.features.get_float('FrameRate')
+        logger.debug("height %d, width %d, stride %d, encoding %s, ImageSizeBytes %d",
+                     self._height, self._width, self.stride, self.pixel_encoding, image_size)
+        logger.info('ReadoutTime %f', self.features.get_float('ReadoutTime'))
+        self.metadata = None
+        if self._metadata_enable:
+            period = None
+            if self._trigger_mode == 'Internal':
+                period = 1.0 / frame_rate
+            self.metadata = MetadataReader(self.features.get_int('TimestampClockFrequency'),
+                                           period)
+        frame_bytes = self._height * self._width * 2
+        pool_size = min(256, max(4, self.frame_pool_memory * 2**20 // frame_bytes))
+        self.frame_pool.resize(frame_bytes, pool_size)
+        self.output_pool = self.frame_pool
+        if self.corrector and self.corrector.dtype != np.uint16:
+            self.corrected_pool = self.stage_pool(self.corrected_pool, self.corrector, pool_size)
+            self.output_pool = self.corrected_pool
+        if self.reducer:
+            self.reduced_pool = self.stage_pool(self.reduced_pool, self.reducer, pool_size)
+            self.output_pool = self.reduced_pool
+        decoder_key = (self._width, self._height, self.stride, self.pixel_encoding,
+                       self._decoder_threads, self._decoder_engine)
+        if self.decoder is None or decoder_key != self._decoder_key:
+            if self.decoder:
+                self.decoder.close()
+            self.decoder = decoder.Decoder(self._width, self._height, self.stride,
+                                           self.pixel_encoding, self._decoder_threads,
+                                           self._decoder_engine, parse_cpus(self.worker_cpus))
+            self._decoder_key = decoder_key
+        self._verify_pending = self._decoder_verify
+        count = self.buffer_pool.count_for(frame_rate, image_size)
+        if self._prequeued != (image_size, count):
+            andor.sdk.AT_Flush(self.handle)
+            self.buffer_pool.configure(image_size, count)
+            self.buffer_pool.queue(self.handle)
+        self._prequeued = None
+
+    def stage_pool(self, pool, stage, size):
+        # output frames of a correction or reduction stage
+        if pool is None or pool.dtype != stage.dtype:
+            pool = FramePool(stage.dtype)
+        pool.resize(int(np.prod(stage.shape)) * stage.dtype.itemsize, size)
+        return pool
+
+    def reference_key(self):
+        # from the camera, the cached fields can lag behind attribute writes
+        features = self.features
+        return reference_key(features.get_int('AOIWidth'), features.get_int('AOIHeight'),
+                             features.get_int('AOILeft'), features.get_int('AOITop'),
+                             features.get_float('ExposureTime'),
+                             features.get_enum_string('SimplePreAmpGainControl'))
+
+    def make_corrector(self):
+        if self._flatfield == 'none':
+            return None
+        key = self.reference_key()
+        dark = self.references.get(key, 'dark')
+        flat = self.references.get(key, 'flat')
+        if dark is None or flat is None:
+            raise RuntimeError('no dark and flat reference for %s, run AcquireDark and AcquireFlat'
+                               % key)
+        return Corrector(dark, flat, self.orientation, self._flatfield, self._flatfield_scale)
+
+    def acquire_reference(self, kind, frames):
+        # a local series of frames that are averaged instead of sent
+        if not self.series_ended.wait(5.0):
+            raise RuntimeError('Acquire%s while the previous series is still being sent'
+                               % kind.capitalize())
+        if self._running or self._armed:
+            raise RuntimeError('Acquire%s during acquisition' % kind.capitalize())
+        if frames < 1:
+            raise ValueError('at least one frame is needed')
+        self.reference = Accumulator(kind, self.reference_key(), (self._height, self._width))
+        self.orientation = Orientation(self._height, self._width)
+        self.corrector = None
+        self.reducer = None
+        self._series_frames = frames
+        self._acquired_frames = 0
+        self._dropped_frames = 0
+        self._arm_time = time.perf_counter()
+        try:
+            self.features.write('FrameCount', 'int', frames)
+            self.prepare()
+        except Exception:
+            self.reference = None
+            self.features.write('FrameCount', 'int', self._frame_count)
+            raise
+        self.pipe.send(b'reference')
+        andor.sdk.AT_Command(self.handle, 'AcquisitionStart')
+        self.status_poller.wake()
+
+    def make_shm_ring(self, frame_bytes):
+        # a new ring when the frames no longer fit or waste most of a slot
+        ring = self.shm_ring
+        if ring and frame_bytes <= ring.slot_bytes < 2 * frame_bytes:
+            return
+        slots = max(2, min(1024, self.shm_memory * 2**20 // frame_bytes))
+        self._shm_rings += 1
+        name = 'andor3-%s-%d-%d' % (self._camera_serial, os.getpid(), self._shm_rings)
+        self.shm_ring = ShmRing(name, frame_bytes, slots)
+        if ring:
+            # consumers that mapped the old ring keep it until they unmap it
+            ring.close()
+
+    def crop(self):
+        # Crop is 'top,left,height,width' of the sent frame, empty for the whole frame
+        if not self._crop:
+            return list((0, 0) + self.orientation.shape)
+        return [int(v) for v in self._crop.split(',')]
+
+    def make_reducer(self):
+        binning = (self._binning_rows, self._binning_columns)
+        if not self._crop and binning == (1, 1):
+            return None
+        reducer = Reducer(self.orientation.shape, self.crop(), binning, self._binning_mode,
+                          self.corrector.dtype if self.corrector else np.uint16)
+        return None if reducer.identity else reducer
+
+    def settings(self, settings):
+        """Validated SDK settings from Configure arguments."""
+        preset = settings.pop('preset', None)
+        if preset is not None:
+            if preset not in self._presets:
+                raise ValueError('unknown preset %s' % preset)
+            settings = {**self._presets[preset], **settings}
+        if 'TriggerMode' in settings:
+            # the modes of the TriggerMode attribute, by either name
+            value = settings['TriggerMode']
+            value = {v: k for k, v in trigger_map.items()}.get(value, value)
+            if value not in trigger_map:
+                raise ValueError('TriggerMode must be one of %s' % ', '.join(trigger_map.values()))
+            settings['TriggerMode'] = value
+        # like write_SimplePreAmpGainControl
+        if '12-bit' in settings.get('SimplePreAmpGainControl', ''):
+            settings.setdefault('PixelEncoding', 'Mono12Packed')
+        return configure.validate(self.features, settings)
+
+    @command(dtype_in=str, dtype_out=str)
+    def Configure(self, value):
+        # a JSON object of attribute names and values, 'preset' starts from a stored preset;
+        # returns the effective values of all settings
+        effective = configure.apply(self.features, self.settings(json.loads(value)))
+        for name, field in setting_fields.items():
+            setattr(self, field, effective[name])
+        effective['TriggerMode'] = trigger_map.get(effective['TriggerMode'], effective['TriggerMode'])
+        return json.dumps(effective)
 
     @command
     def Live(self):
         self.write_DestinationFilename('')
         self.write_nTriggers(100000)
         self.write_TriggerMode('INTERNAL')
-        maxfr = andor.get_float_max(self.handle, 'FrameRate')
+        maxfr = self.features.get_float_max('FrameRate')
         self.write_FrameRate(min(maxfr, 1))
         self.Arm()
 
@@ -394,11 +1195,58 @@ class Andor3(Device):
     def Stop(self):
         self.pipe.send(b'stop')
         
+    @command
+    def Rediscover(self):
+        # find the video device of the camera again and update the discovery cache
+        if self._running:
+            raise RuntimeError('Rediscover during acquisition')
+        self._prequeued = None
+        videodevice = self.find_video_device()
+        if videodevice is None:
+            raise RuntimeError('no corresponding video device found')
+        self._discovery = 'full'
+        self.discovery.store(self.serial_number, self._camera_index,
+                             self._camera_serial, videodevice)
+        if videodevice != self.videodevice:
+            self.videodevice = videodevice
+            self.pipe.send(b'video')
+
+    @command(dtype_in=int)
+    def AcquireDark(self, frames):
+        # average of `frames` frames with the shutter closed, for the current AOI, exposure and gain
+        self.acquire_reference('dark', frames)
+
+    @command(dtype_in=int)
+    def AcquireFlat(self, frames):
+        # average of `frames` frames of the beam without sample
+        self.acquire_reference('flat', frames)
+
     @command
     def RestartReceiver(self):
         if self.k8s_namespace:
             self.receiver.restart(self.k8s_namespace)
         
+    @attribute(dtype=str, memorized=True, hw_memorized=True)
+    def Presets(self):
+        return self._presets_json
+
+    @Presets.setter
+    def Presets(self, value):
+        # JSON object of preset name -> Configure settings
+        presets = {name: self.settings(dict(settings))
+                   for name, settings in json.loads(value).items()}
+        self._presets = presets
+        self._presets_json = value
+
+    @attribute(dtype=float, unit='s')
+    def StartupTime(self):
+        return self._startup_time
+
+    @attribute(dtype=str)
+    def Discovery(self):
+        # 'cached' or 'full'
+        return self._discovery
+
     @attribute(dtype=str)
     def CameraModel(self):
         return self._camera_model
@@ -407,10 +1255,99 @@ class Andor3(Device):
     def nFramesAcquired(self):
         return self._acquired_frames
 
+    @attribute(dtype=int)
+    def nFramesDropped(self):
+        return self._dropped_frames
+
     @attribute(dtype=int)
     def nFramesReceived(self):
         return self.receiver.frames_received
 
+    @attribute(dtype=float, unit='ms')
+    def ArmLatency(self):
+        # from Arm to AcquisitionStart
+        return self._arm_latency * 1e3
+
+    @attribute(dtype=float, unit='ms')
+    def FirstFrameLatency(self):
+        # from Arm to the first frame from the SDK, includes waiting for a trigger
+        return self._first_frame_latency * 1e3
+
+    @attribute(dtype=int)
+    def DecodeQueueDepth(self):
+        return self.pipeline.decode_depth
+
+    @attribute(dtype=int)
+    def SendQueueDepth(self):
+        return self.pipeline.send_depth
+
+    @attribute(dtype=str)
+    def Telemetry(self):
+        return self.telemetry.json()
+
+    @attribute(dtype=float, unit='Hz')
+    def MeasuredFrameRate(self):
+        return self.telemetry.frames.value
+
+    @attribute(dtype=float, unit='MB/s')
+    def Throughput(self):
+        return self.telemetry.bytes.value / 1e6
+
+    @attribute(dtype=float)
+    def SdkQueueFill(self):
+        return self.telemetry.sdk_queue_fill
+
+    @attribute(dtype=int)
+    def BufferCount(self):
+        return len(self.buffer_pool.buffers)
+
+    @attribute(dtype=float, unit='MB')
+    def BufferMemory(self):
+        return self.buffer_pool.nbytes / 2**20
+
+    @attribute(dtype=int)
+    def FramePoolSize(self):
+        return self.frame_pool.size
+
+    @attribute(dtype=int)
+    def FramePoolOccupancy(self):
+        return self.frame_pool.occupancy
+
+    @attribute(dtype=int)
+    def FramePoolExhausted(self):
+        return self.frame_pool.exhausted
+
+    @attribute(dtype=(float,), max_dim_x=64, unit='MB/s')
+    def StripeThroughput(self):
+        return [rate.value / 1e6 for rate in self.telemetry.stripe_bytes]
+
+    @attribute(dtype=int)
+    def ShmOccupancy(self):
+        # shared memory slots not yet acknowledged by the receiver
+        return self.shm_ring.occupancy if self.shm_ring else 0
+
+    @attribute(dtype=int)
+    def ShmFallbacks(self):
+        # frames sent over the data socket because the ring was full
+        return self.shm_ring.fallbacks if self.shm_ring else 0
+
+    @attribute(dtype=int)
+    def SpillDepth(self):
+        # messages waiting in the spill ring
+        return len(self.spill.records) if self.spill else 0
+
+    @attribute(dtype=float, unit='MB')
+    def SpillBytes(self):
+        return self.spill.bytes / 1e6 if self.spill else 0.0
+
+    @attribute(dtype=float, unit='MB')
+    def SpillPeak(self):
+        return self.spill.peak / 1e6 if self.spill else 0.0
+
+    @attribute(dtype=float, unit='MB/s')
+    def SpillDrainRate(self):
+        return self.spill.drained.value / 1e6 if self.spill else 0.0
+
     def read_DestinationFilename(self):
         return self._filename
     
@@ -421,37 +1358,38 @@ class Andor3(Device):
         return self._frame_count
     
     def write_nTriggers(self, value):
-        andor.sdk.AT_SetInt(self.handle, 'FrameCount', value)
+        self.features.write('FrameCount', 'int', value)
         self._frame_count = value
 
     def read_ExposureTime(self):
         return self._exposure_time
     
     def write_ExposureTime(self, value):
-        ret = andor.sdk.AT_SetFloat(self.handle, 'ExposureTime', value)
+        ret = self.features.write('ExposureTime', 'float', value)
         if ret != 0:
             raise RuntimeError('Error setting exposure time: %s' %andor.errors.get(ret, ''))
-        self._exposure_time = andor.get_float(self.handle, 'ExposureTime')
+        self._exposure_time = self.features.get_float('ExposureTime')
         
     @attribute(dtype=bool)
     def Overlap(self):
-        ret = andor.get_bool(self.handle, 'Overlap')
+        ret = self.features.get_bool('Overlap')
         value = True if ret == 1 else False
         return value
     
     @Overlap.setter
     def Overlap(self, value):
         attr = 1 if value == True else 0
-        andor.sdk.AT_SetBool(self.handle, 'Overlap', attr)
+        self.features.write('Overlap', 'bool', attr)
     
     def read_SimplePreAmpGainControl(self):
-        ret = andor.get_enum_string(self.handle, 'SimplePreAmpGainControl')
+        ret = self.features.get_enum_string('SimplePreAmpGainControl')
         return ret
     
     def write_SimplePreAmpGainControl(self, value):
-        andor.set_enum_string(self.handle, 'SimplePreAmpGainControl', value)
+        self.features.set_enum_string('SimplePreAmpGainControl', value)
+        self._gain_control = value
         if "12-bit" in value:
-            andor.set_enum_string(self.handle, 'PixelEncoding', "Mono12Packed")
+            self.features.set_enum_string('PixelEncoding', "Mono12Packed")
 
 
     @attribute(dtype=str)
@@ -463,23 +1401,23 @@ class Andor3(Device):
     
     def write_TriggerMode(self, value):
         val = {v:k for k,v in trigger_map.items()}[value]
-        andor.set_enum_string(self.handle, 'TriggerMode', val)
+        self.features.set_enum_string('TriggerMode', val)
         self._trigger_mode = val
        
     def read_FrameRate(self):
-        return andor.get_float(self.handle, 'FrameRate')
+        return self.features.get_float('FrameRate')
     
     def write_FrameRate(self, value):
-        ret = andor.sdk.AT_SetFloat(self.handle, 'FrameRate', value)
+        ret = self.features.write('FrameRate', 'float', value)
         if ret != 0:
             raise RuntimeError('Error setting FrameRate: %s' %andor.errors.get(ret, ''))
-        #self._frame_rate = andor.get_float(self.handle, 'FrameRate')
+        #self._frame_rate = self.features.get_float('FrameRate')
         
     def read_ElectronicShutteringMode(self):
         return self._shutter_mode
         
     def write_ElectronicShutteringMode(self, value):
-        andor.set_enum_string(self.handle, 'ElectronicShutteringMode', value)
+        self.features.set_enum_string('ElectronicShutteringMode', value)
         self._shutter_mode = value
 
     @attribute(dtype=float)
@@ -489,7 +1427,7 @@ class Andor3(Device):
     @TargetSensorTemperature.setter
     def TargetSensorTemperature(self, value):
         if self._target_temperature is not None:
-            andor.set_float(self.handle, 'TargetSensorTemperature', value)
+            self.features.set_float('TargetSensorTemperature', value)
             self._target_temperature = value
         
     @attribute(dtype=str)
@@ -498,20 +1436,31 @@ class Andor3(Device):
     
     @PixelReadoutRate.setter
     def PixelReadoutRate(self, value):
-        andor.set_enum_string(self.handle, 'PixelReadoutRate', value)
+        self.features.set_enum_string('PixelReadoutRate', value)
         self._pixel_readout_rate = value
     
     @attribute(dtype=str)
     def PixelEncoding(self):
-        return andor.get_enum_string(self.handle, 'PixelEncoding')
+        return self.features.get_enum_string('PixelEncoding')
 
     @attribute(dtype=float)
     def ReadoutTime(self):
-        return andor.get_float(self.handle, 'ReadoutTime')
+        return self.features.get_float('ReadoutTime')
+
+    @attribute(dtype=bool)
+    def MetadataEnable(self):
+        return self._metadata_enable
+
+    @MetadataEnable.setter
+    def MetadataEnable(self, value):
+        self.features.set_bool('MetadataEnable', int(value))
+        if value:
+            self.features.set_bool('MetadataTimestamp', 1)
+        self._metadata_enable = value
 
     @attribute(dtype=float)
     def SensorTemperature(self):
-        return andor.get_float(self.handle, 'SensorTemperature')
+        return self.features.get_float('SensorTemperature')
     
     
     # Attributes for the realtime tomo pipeline
@@ -549,7 +1498,7 @@ class Andor3(Device):
     
     @AOIWidth.setter
     def AOIWidth(self, value):
-        andor.set_int(self.handle, 'AOIWidth', value)
+        self.features.set_int('AOIWidth', value)
         self._width = value
     
     @attribute(dtype=int)
@@ -558,7 +1507,7 @@ class Andor3(Device):
     
     @AOILeft.setter
     def AOILeft(self, value):
-        andor.set_int(self.handle, 'AOILeft', value)
+        self.features.set_int('AOILeft', value)
         self._left = value
         
     @attribute(dtype=int)
@@ -567,7 +1516,7 @@ class Andor3(Device):
     
     @AOIHeight.setter
     def AOIHeight(self, value):
-        andor.set_int(self.handle, 'AOIHeight', value)
+        self.features.set_int('AOIHeight', value)
         self._height = value
     
     @attribute(dtype=int)
@@ -576,7 +1525,7 @@ class Andor3(Device):
     
     @AOITop.setter
     def AOITop(self, value):
-        andor.set_int(self.handle, 'AOITop', value)
+        self.features.set_int('AOITop', value)
         self._top = value
     
     @attribute(dtype=bool)
@@ -586,12 +1535,12 @@ class Andor3(Device):
     @SensorCooling.setter
     def SensorCooling(self, value):
         attr = 1 if value == True else 0
-        andor.sdk.AT_SetBool(self.handle, 'SensorCooling', attr)
+        self.features.write('SensorCooling', 'bool', attr)
         self._sensor_cooling = value
         
     @attribute(dtype=str)
     def TemperatureStatus(self):
-        return andor.get_enum_string(self.handle, 'TemperatureStatus')
+        return self.features.get_enum_string('TemperatureStatus')
         
     @attribute(dtype=bool, memorized=True, hw_memorized=True)
     def Fliplr(self):
@@ -616,6 +1565,247 @@ class Andor3(Device):
     @Rotation.setter
     def Rotation(self, value):
         self._rotation = value
+
+    @attribute(dtype=str, memorized=True, hw_memorized=True)
+    def OrientationMode(self):
+        return self._orientation_mode
+
+    @OrientationMode.setter
+    def OrientationMode(self, value):
+        # 'header' leaves pixels untouched and sends the orientation in each image header
+        if value not in ('pixels', 'header'):
+            raise ValueError('OrientationMode must be pixels or header')
+        self._orientation_mode = value
+
+    # Frame conversion attributes, applied on Arm
+
+    @attribute(dtype=str, memorized=True, hw_memorized=True)
+    def FlatField(self):
+        return self._flatfield
+
+    @FlatField.setter
+    def FlatField(self, value):
+        # none, float32 or uint16 scaled by FlatFieldScale
+        if value not in ('none', 'float32', 'uint16'):
+            raise ValueError('FlatField must be none, float32 or uint16')
+        self._flatfield = value
+
+    @attribute(dtype=float, memorized=True, hw_memorized=True)
+    def FlatFieldScale(self):
+        return self._flatfield_scale
+
+    @FlatFieldScale.setter
+    def FlatFieldScale(self, value):
+        if value <= 0:
+            raise ValueError('FlatFieldScale must be positive')
+        self._flatfield_scale = value
+
+    @attribute(dtype=str)
+    def References(self):
+        # references stored for the current AOI, exposure and gain
+        return ','.join(self.references.available(self.reference_key()))
+
+    @attribute(dtype=float, unit='Hz', memorized=True, hw_memorized=True)
+    def PreviewRate(self):
+        return self._preview_rate
+
+    @PreviewRate.setter
+    def PreviewRate(self, value):
+        # most previews per second from the next Arm, 0 publishes none
+        self._preview_rate = max(0.0, value)
+
+    @attribute(dtype=int, memorized=True, hw_memorized=True)
+    def PreviewBinning(self):
+        return self._preview_binning
+
+    @PreviewBinning.setter
+    def PreviewBinning(self, value):
+        self._preview_binning = max(1, value)
+
+    @attribute(dtype=int, memorized=True, hw_memorized=True)
+    def StatsSubsample(self):
+        return self._stats_subsample
+
+    @StatsSubsample.setter
+    def StatsSubsample(self, value):
+        # frame statistics on every n-th row and column from the next Arm, 0 computes none
+        self._stats_subsample = max(0, value)
+
+    @attribute(dtype=int, memorized=True, hw_memorized=True)
+    def StatsSaturation(self):
+        return self._stats_saturation
+
+    @StatsSaturation.setter
+    def StatsSaturation(self, value):
+        # pixels at or above this count as saturated, 0 for the full scale of the encoding
+        self._stats_saturation = max(0, value)
+
+    @attribute(dtype=str)
+    def LastFrameStats(self):
+        # frame, min, max, mean, saturated and histogram of the last frame as JSON
+        return json.dumps(self.last_stats or {})
+
+    @attribute(dtype=int)
+    def LastFrameMin(self):
+        return self.last_stats['min'] if self.last_stats else 0
+
+    @attribute(dtype=int)
+    def LastFrameMax(self):
+        return self.last_stats['max'] if self.last_stats else 0
+
+    @attribute(dtype=float)
+    def LastFrameMean(self):
+        return self.last_stats['mean'] if self.last_stats else float('nan')
+
+    @attribute(dtype=int)
+    def LastFrameSaturated(self):
+        return self.last_stats['saturated'] if self.last_stats else 0
+
+    @attribute(dtype=(int,), max_dim_x=256)
+    def LastFrameHistogram(self):
+        return self.last_stats['histogram'] if self.last_stats else []
+
+    @attribute(dtype=str, memorized=True, hw_memorized=True)
+    def Crop(self):
+        return self._crop
+
+    @Crop.setter
+    def Crop(self, value):
+        # top,left,height,width after orientation, empty sends the whole frame
+        value = value.replace(' ', '')
+        if value:
+            parts = value.split(',')
+            if len(parts) != 4 or not all(p.isdigit() for p in parts):
+                raise ValueError('Crop must be top,left,height,width')
+        self._crop = value
+
+    @attribute(dtype=int, memorized=True, hw_memorized=True)
+    def BinningRows(self):
+        return self._binning_rows
+
+    @BinningRows.setter
+    def BinningRows(self, value):
+        if value < 1:
+            raise ValueError('BinningRows must be at least 1')
+        self._binning_rows = value
+
+    @attribute(dtype=int, memorized=True, hw_memorized=True)
+    def BinningColumns(self):
+        return self._binning_columns
+
+    @BinningColumns.setter
+    def BinningColumns(self, value):
+        if value < 1:
+            raise ValueError('BinningColumns must be at least 1')
+        self._binning_columns = value
+
+    @attribute(dtype=str, memorized=True, hw_memorized=True)
+    def BinningMode(self):
+        return self._binning_mode
+
+    @BinningMode.setter
+    def BinningMode(self, value):
+        # sum sends uint32 frames, mean rounds back to uint16
+        if value not in ('sum', 'mean'):
+            raise ValueError('BinningMode must be sum or mean')
+        self._binning_mode = value
+
+    @attribute(dtype=str)
+    def DecoderEngine(self):
+        return self._decoder_engine
+
+    @DecoderEngine.setter
+    def DecoderEngine(self, value):
+        if value not in ('numpy', 'sdk'):
+            raise ValueError('DecoderEngine must be numpy or sdk')
+        self._decoder_engine = value
+
+    @attribute(dtype=int)
+    def DecoderThreads(self):
+        return self._decoder_threads
+
+    @DecoderThreads.setter
+    def DecoderThreads(self, value):
+        self._decoder_threads = max(1, value)
+
+    @attribute(dtype=bool)
+    def PreArm(self):
+        return self._pre_arm
+
+    @PreArm.setter
+    def PreArm(self, value):
+        # queue the SDK buffers for the next series when a series ends
+        self._pre_arm = value
+
+    @attribute(dtype=int)
+    def PipelineWorkers(self):
+        return self._pipeline_workers
+
+    @PipelineWorkers.setter
+    def PipelineWorkers(self, value):
+        self._pipeline_workers = max(1, value)
+
+    @attribute(dtype=str)
+    def Compression(self):
+        return self._compression
+
+    @Compression.setter
+    def Compression(self, value):
+        Compressor(value)
+        self._compression = value
+
+    @attribute(dtype=int)
+    def CompressionLevel(self):
+        return self._compression_level
+
+    @CompressionLevel.setter
+    def CompressionLevel(self, value):
+        self._compression_level = value
+
+    @attribute(dtype=float)
+    def CompressionRatio(self):
+        return self.compressor.ratio
+
+    @attribute(dtype=float, unit='ms')
+    def CompressionTime(self):
+        return self.compressor.time_per_frame * 1e3
+
+    @attribute(dtype=int)
+    def BatchFrames(self):
+        return self._batch_frames
+
+    @BatchFrames.setter
+    def BatchFrames(self, value):
+        # frames per message from the next Arm, 1 sends every frame on its own
+        self._batch_frames = max(1, value)
+
+    @attribute(dtype=float, unit='ms')
+    def BatchTimeout(self):
+        return self._batch_timeout
+
+    @BatchTimeout.setter
+    def BatchTimeout(self, value):
+        if value <= 0:
+            raise ValueError('BatchTimeout must be positive')
+        self._batch_timeout = value
+
+    @attribute(dtype=str)
+    def HeaderFormat(self):
+        return self._header_format
+
+    @HeaderFormat.setter
+    def HeaderFormat(self, value):
+        # encoding of the image headers from the next Arm, announced in the series header
+        HeaderTemplate({}, value)
+        self._header_format = value
+
+    @attribute(dtype=bool)
+    def DecoderVerify(self):
+        return self._decoder_verify
+
+    @DecoderVerify.setter
+    def DecoderVerify(self, value):
+        self._decoder_verify = value
         
 def main():
     
@@ -0,0 +1,25 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def parse_cpus(text):
+    """CPU set of a list like '0-3,8', None for an empty string."""
+    if not text or not text.strip():
+        return None
+    cpus = set()
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def pin_thread(cpus):
+    """Restrict the calling thread to `cpus`, no-op for None."""
+    if not cpus:
+        return
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (AttributeError, OSError) as e:
+        logger.warning('could not pin thread to CPUs %s: %s', sorted(cpus), e)
@@ -1,5 +1,8 @@
+import os
 import sys
+import glob
 import time
+import threading
 import numpy as np
 from cffi import FFI
 
@@ -10,6 +13,7 @@ ffi.cdef('''
     typedef long long AT_64;
     typedef unsigned char AT_U8;
     typedef wchar_t AT_WC;
+    typedef int (*FeatureCallback)(AT_H Hndl, const AT_WC* Feature, void* Context);
 
     int AT_InitialiseLibrary();
     int AT_FinaliseLibrary();
@@ -17,6 +21,9 @@ ffi.cdef('''
     int AT_Open(int CameraIndex, AT_H *Hndl);
     int AT_Close(AT_H Hndl);
     
+    int AT_RegisterFeatureCallback(AT_H Hndl, const AT_WC* Feature, FeatureCallback EvCallback, void* Context);
+    int AT_UnregisterFeatureCallback(AT_H Hndl, const AT_WC* Feature, FeatureCallback EvCallback, void* Context);
+
     int AT_IsImplemented(AT_H Hndl, const AT_WC* Feature, AT_BOOL* Implemented);
     int AT_IsReadable(AT_H Hndl, const AT_WC* Feature, AT_BOOL* Readable);
     int AT_IsWritable(AT_H Hndl, const AT_WC* Feature, AT_BOOL* Writable);
@@ -55,6 +62,7 @@ ffi.cdef('''
     ''')
 
 AT_SUCCESS = 0
+AT_CALLBACK_SUCCESS = 0
 
 errors = {
     1: 'AT_ERR_NOTINITIALISED',
@@ -67,9 +75,41 @@ errors = {
     19: 'AT_ERR_STRINGNOTIMPLEMENTED'
 }
 
-sdk = ffi.dlopen('libatcore.so')
+# ANDOR3_SIMULATOR=1 selects the simulated SDK, unset, empty, 0 or false the installed one
+SIMULATOR = os.environ.get('ANDOR3_SIMULATOR', '').lower() not in ('', '0', 'false')
+
+if SIMULATOR:
+    from . import simulator
+    sdk = simulator.sdk
+else:
+    sdk = ffi.dlopen('libatcore.so')
 AT_HANDLE_SYSTEM = 1
 
+_users = 0
+_users_lock = threading.Lock()
+
+
+def initialise():
+    """AT_InitialiseLibrary for the first camera of the process, pair with finalise()."""
+    global _users
+    with _users_lock:
+        if _users == 0:
+            check_error(sdk.AT_InitialiseLibrary())
+        _users += 1
+
+
+def finalise():
+    global _users
+    with _users_lock:
+        _users -= 1
+        if _users == 0:
+            sdk.AT_FinaliseLibrary()
+
+def video_devices():
+    if SIMULATOR:
+        return sdk.video_devices()
+    return glob.glob("/dev/video*")
+
 def check_error(ret):
     if ret != AT_SUCCESS:
         msg = errors.get(ret, '')
@@ -103,6 +143,9 @@ def get_float(handle, command):
 def set_float(handle, command, value):
     check_error(sdk.AT_SetFloat(handle, command, value))
 
+def set_bool(handle, command, value):
+    check_error(sdk.AT_SetBool(handle, command, value))
+
 def get_bool(handle, command):
     result = ffi.new('AT_BOOL*')
     check_error(sdk.AT_GetBool(handle, command, result))
@@ -169,3 +212,229 @@ def wait_buffer(handle, timeout=0):
         if ret != 13:
             print('wait_buffer error', ret)
         return None
+
+
+# features that do not change while the camera is open
+STATIC_FEATURES = {'CameraModel', 'SerialNumber', 'SensorWidth', 'SensorHeight',
+                   'TimestampClockFrequency', 'InterfaceType', 'FirmwareVersion'}
+
+STRING_LENGTH = 128
+
+
+class Feature:
+    """One feature of an open camera, its name encoded and out-parameters allocated once."""
+
+    def __init__(self, handle, name):
+        self.handle = handle
+        self.name = name
+        self.wname = ffi.new('AT_WC[]', name)
+        self.int = ffi.new('AT_64*')
+        self.float = ffi.new('double*')
+        self.bool = ffi.new('AT_BOOL*')
+        self.index = ffi.new('int*')
+        self.string = ffi.new('AT_WC[%d]' % STRING_LENGTH)
+        self.options = None
+        self.implemented = None
+        self.watched = False
+
+    def get_int(self):
+        check_error(sdk.AT_GetInt(self.handle, self.wname, self.int))
+        return self.int[0]
+
+    def get_int_min(self):
+        check_error(sdk.AT_GetIntMin(self.handle, self.wname, self.int))
+        return self.int[0]
+
+    def get_int_max(self):
+        check_error(sdk.AT_GetIntMax(self.handle, self.wname, self.int))
+        return self.int[0]
+
+    def get_float(self):
+        check_error(sdk.AT_GetFloat(self.handle, self.wname, self.float))
+        return self.float[0]
+
+    def get_float_min(self):
+        check_error(sdk.AT_GetFloatMin(self.handle, self.wname, self.float))
+        return self.float[0]
+
+    def get_float_max(self):
+        check_error(sdk.AT_GetFloatMax(self.handle, self.wname, self.float))
+        return self.float[0]
+
+    def get_bool(self):
+        check_error(sdk.AT_GetBool(self.handle, self.wname, self.bool))
+        return self.bool[0]
+
+    def get_string(self):
+        check_error(sdk.AT_GetString(self.handle, self.wname, self.string, STRING_LENGTH))
+        return ffi.string(self.string)
+
+    def get_enum_index(self):
+        check_error(sdk.AT_GetEnumIndex(self.handle, self.wname, self.index))
+        return self.index[0]
+
+    def get_enum_options(self):
+        # the string of an index never changes, only whether it is available
+        if self.options is None:
+            check_error(sdk.AT_GetEnumCount(self.handle, self.wname, self.index))
+            options = []
+            for i in range(self.index[0]):
+                check_error(sdk.AT_GetEnumStringByIndex(self.handle, self.wname, i,
+                                                        self.string, STRING_LENGTH))
+                options.append(ffi.string(self.string))
+            self.options = options
+        return self.options
+
+    def get_enum_string(self):
+        return self.get_enum_options()[self.get_enum_index()]
+
+    def get_enum_available(self):
+        """Options that can currently be selected."""
+        available = []
+        for i, option in enumerate(self.get_enum_options()):
+            check_error(sdk.AT_IsEnumIndexAvailable(self.handle, self.wname, i, self.bool))
+            if self.bool[0]:
+                available.append(option)
+        return available
+
+    def is_implemented(self):
+        if self.implemented is None:
+            check_error(sdk.AT_IsImplemented(self.handle, self.wname, self.bool))
+            self.implemented = self.bool[0]
+        return self.implemented
+
+
+class Features:
+    """
+    Feature registry of an open camera with a read cache.
+
+    Values are cached for `ttl` seconds, static features and enum option
+    lists until close. A cached value is dropped when the SDK reports a
+    change of the feature through AT_RegisterFeatureCallback, and every
+    write through the registry drops all cached values as a write can change
+    other features (AOIStride, FrameRate limits, ...).
+    """
+
+    def __init__(self, handle, ttl=1.0):
+        self.handle = handle
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.features = {}
+        # name -> {kind: (value, time)}
+        self.values = {}
+        self.callback = ffi.callback('FeatureCallback', self.changed)
+
+    def __getitem__(self, name):
+        feature = self.features.get(name)
+        if feature is None:
+            feature = self.features[name] = Feature(self.handle, name)
+        return feature
+
+    def changed(self, handle, name, context):
+        # runs on an SDK thread
+        self.values.pop(ffi.string(name), None)
+        return AT_CALLBACK_SUCCESS
+
+    def watch(self, feature):
+        if not feature.watched and feature.name not in STATIC_FEATURES:
+            feature.watched = True
+            sdk.AT_RegisterFeatureCallback(self.handle, feature.wname, self.callback, ffi.NULL)
+
+    def read(self, name, kind):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.values.get(name, {}).get(kind)
+            if cached is not None and (name in STATIC_FEATURES or now - cached[1] < self.ttl):
+                return cached[0]
+            feature = self[name]
+            # registering calls the callback once, so it has to precede the read
+            self.watch(feature)
+            value = getattr(feature, 'get_' + kind)()
+            self.values.setdefault(name, {})[kind] = (value, now)
+            return value
+
+    def invalidate(self):
+        with self.lock:
+            self.values = {name: values for name, values in self.values.items()
+                           if name in STATIC_FEATURES}
+
+    def write(self, name, kind, value=None):
+        """Write a feature and return the SDK error code."""
+        with self.lock:
+            wname = self[name].wname
+            if kind == 'int':
+                ret = sdk.AT_SetInt(self.handle, wname, value)
+            elif kind == 'float':
+                ret = sdk.AT_SetFloat(self.handle, wname, value)
+            elif kind == 'bool':
+                ret = sdk.AT_SetBool(self.handle, wname, value)
+            elif kind == 'enum':
+                ret = sdk.AT_SetEnumString(self.handle, wname, value)
+            elif kind == 'command':
+                ret = sdk.AT_Command(self.handle, wname)
+            else:
+                raise ValueError('unknown feature kind %s' % kind)
+            self.invalidate()
+            return ret
+
+    def get_int(self, name):
+        return self.read(name, 'int')
+
+    def get_int_min(self, name):
+        return self.read(name, 'int_min')
+
+    def get_int_max(self, name):
+        return self.read(name, 'int_max')
+
+    def get_float(self, name):
+        return self.read(name, 'float')
+
+    def get_float_min(self, name):
+        return self.read(name, 'float_min')
+
+    def get_float_max(self, name):
+        return self.read(name, 'float_max')
+
+    def get_bool(self, name):
+        return self.read(name, 'bool')
+
+    def get_string(self, name):
+        return self.read(name, 'string')
+
+    def get_enum_string(self, name):
+        return self.read(name, 'enum_string')
+
+    def get_enum_available(self, name):
+        return self.read(name, 'enum_available')
+
+    def get_enum_options(self, name):
+        with self.lock:
+            return self[name].get_enum_options()
+
+    def is_implemented(self, name):
+        with self.lock:
+            return self[name].is_implemented()
+
+    def set_int(self, name, value):
+        check_error(self.write(name, 'int', value))
+
+    def set_float(self, name, value):
+        check_error(self.write(name, 'float', value))
+
+    def set_bool(self, name, value):
+        check_error(self.write(name, 'bool', value))
+
+    def set_enum_string(self, name, value):
+        check_error(self.write(name, 'enum', value))
+
+    def command(self, name):
+        check_error(self.write(name, 'command'))
+
+    def close(self):
+        with self.lock:
+            for feature in self.features.values():
+                if feature.watched:
+                    sdk.AT_UnregisterFeatureCallback(self.handle, feature.wname,
+                                                     self.callback, ffi.NULL)
+                    feature.watched = False
+            self.values = {}
@@ -1,5 +1,7 @@
+import os
 import sys
 import time
+import threading
 import numpy as np
 from cffi import FFI
 
@@ -21,4 +23,22 @@ ffi.cdef('''
     '''
 )
 
-sdk = ffi.dlopen('libatutility.so')
+from .andor import SIMULATOR
+
+if SIMULATOR:
+    from . import simulator
+    sdk = simulator.utility
+else:
+    sdk = ffi.dlopen('libatutility.so')
+
+_initialised = False
+_lock = threading.Lock()
+
+
+def initialise():
+    """AT_InitialiseUtilityLibrary once per process."""
+    global _initialised
+    with _lock:
+        if not _initialised:
+            sdk.AT_InitialiseUtilityLibrary()
+            _initialised = True
@@ -0,0 +1,59 @@
+import time
+
+
+class Batcher:
+    """
+    Collects consecutive image messages into one 'image_batch' message.
+
+    A batch is sent when it holds the target number of frames or `timeout`
+    seconds after its first frame arrived. The target adapts to the measured
+    frame rate so a batch covers about `timeout` seconds, up to `max_frames`.
+    The batch header lists the per-frame fields ('frame', 'ticks', ...) and
+    the payload is the frames concatenated, with 'sizes' giving the length
+    of each one.
+    """
+
+    # per-frame header fields and the list they become in the batch header
+    PER_FRAME = {'frame': 'frames', 'ticks': 'ticks', 'timestamp': 'timestamps',
+                 'compressed_size': 'compressed_sizes', 'stats': 'stats'}
+
+    def __init__(self, max_frames, timeout, rate=None):
+        self.max_frames = max(1, max_frames)
+        self.timeout = timeout
+        self.rate = rate
+        self.headers = []
+        self.frames = []
+        self.target = self.max_frames
+        self.deadline = None
+
+    def add(self, header, data):
+        """Add one frame, returns True when the batch is full."""
+        if not self.frames:
+            self.deadline = time.monotonic() + self.timeout
+            if self.rate:
+                fps = self.rate()
+                if fps > 0:
+                    self.target = min(self.max_frames, max(1, round(fps * self.timeout)))
+        self.headers.append(header)
+        self.frames.append(data)
+        return len(self.frames) >= self.target
+
+    def remaining(self):
+        """Seconds until the open batch is due, None without one."""
+        if not self.frames:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def take(self):
+        """Return the batch header, the payload and the frames it was built from."""
+        headers, frames = self.headers, self.frames
+        self.headers, self.frames, self.deadline = [], [], None
+        header = {key: value for key, value in headers[0].items() if key not in self.PER_FRAME}
+        header['htype'] = 'image_batch'
+        header['count'] = len(frames)
+        for key, name in self.PER_FRAME.items():
+            if key in headers[0]:
+                header[name] = [h[key] for h in headers]
+        views = [memoryview(frame).cast('B') for frame in frames]
+        header['sizes'] = [len(view) for view in views]
+        return header, b''.join(views), frames
@@ -0,0 +1,571 @@
+"""
+End-to-end throughput benchmark of the Andor3 acquisition loop.
+
+Runs Andor3.init_camera/Arm/main against the simulated SDK and pulls the
+stream into a local ZMQ PULL sink, reporting sustained fps, MB/s and the
+latency from frame generation in the simulator to reception in the sink.
+
+    Andor3-benchmark --frames 2000 --rate 100 --width 2560 --height 2160
+
+--verify checks the decoder against AT_ConvertBuffer of the installed
+libatutility, or of the simulator with ANDOR3_SIMULATOR=1, everything else
+runs on the simulated SDK. main() selects the SDK before dev_andor3.andor is
+first imported, the modules that depend on it are imported where they are used.
+"""
+import os
+import sys
+import time
+import json
+import types
+import argparse
+import logging
+import zmq
+import numpy as np
+from threading import Thread, Event
+from tango import DevState
+from tango.server import device_property
+from . import simulator
+from . import header as image_header
+from . import shmring
+from .localreceiver import LocalReceiver
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkDevice:
+    """Runs the Andor3 device methods without a Tango server."""
+    receiver_url = ''
+    # the simulated video devices live in a new temporary directory every run
+    discovery_cache = ''
+
+    def __init__(self, endpoints, serial_number='', worker_cpus='', preview='', spill_path='',
+                 spill_size=0, stripe_mode='frame', shm_memory=0):
+        self.endpoints = endpoints
+        self.shm_memory = shm_memory
+        self.data_stripes = len(endpoints)
+        self.stripe_mode = stripe_mode
+        self.spill_path = spill_path
+        self.spill_size = spill_size
+        self.preview_address = preview
+        self.serial_number = serial_number
+        self.worker_cpus = worker_cpus
+        self._state = DevState.UNKNOWN
+        self._status = ''
+        self.receiver = LocalReceiver()
+        self.context = zmq.Context.instance()
+        self.pipe_address = 'inproc://zyla-%x' % id(self)
+        self.pipe = self.context.socket(zmq.PAIR)
+        self.pipe.bind(self.pipe_address)
+        self.init_camera()
+        if self._state != DevState.ON:
+            raise RuntimeError('camera initialisation failed: %s' % self._status)
+        self.start_status_poller()
+        self.start_pipeline()
+        self.start_acquisition()
+
+    def __getattr__(self, name):
+        from .Andor3 import Andor3
+        attr = getattr(Andor3, name)
+        if isinstance(attr, device_property):
+            return attr.default_value
+        if callable(attr):
+            return types.MethodType(attr, self)
+        raise AttributeError(name)
+
+    def set_state(self, state):
+        self._state = state
+
+    def get_state(self):
+        return self._state
+
+    def set_status(self, status):
+        self._status = status
+
+    def get_status(self):
+        return self._status
+
+    def error_stream(self, msg):
+        logger.error(msg)
+
+    def push_change_event(self, name, value):
+        pass
+
+    def data_endpoints(self):
+        return self.endpoints
+
+    def preview_endpoint(self):
+        return self.preview_address
+
+    def configure(self, width, height, gain, encoding, rate):
+        self.features.set_int('AOIWidth', width)
+        self.features.set_int('AOIHeight', height)
+        self._width, self._height = width, height
+        self.write_SimplePreAmpGainControl(gain)
+        self.features.set_enum_string('PixelEncoding', encoding)
+        if not rate:
+            rate = self.features.get_float_max('FrameRate')
+        self.write_FrameRate(rate)
+        return rate
+
+    def close(self):
+        self.pipe.send(b'terminate')
+        self.detached.wait()
+        self.status_poller.stop()
+        from . import andor
+        self.features.close()
+        andor.sdk.AT_Close(self.handle)
+        andor.finalise()
+
+
+def sink(endpoint, device, camera, stats, ended, done, stall=0.0):
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.PULL)
+    if stall:
+        socket.setsockopt(zmq.RCVHWM, 16)
+    socket.connect(endpoint)
+    latencies = stats['latency']
+    ring = states = None
+    while not done.is_set():
+        if not socket.poll(100):
+            continue
+        parts = socket.recv_multipart(copy=False)
+        # image headers are msgpack after a series header with header_format msgpack
+        header = image_header.decode(parts[0].bytes)
+        device.receiver.handle(header)
+        htype = header['htype']
+        if htype == 'header':
+            stats['last_frame'] = -1
+            if 'shm_name' in header:
+                states = None
+                ring = shmring.attach(header['shm_name'])
+                states = np.frombuffer(ring, np.uint8, header['shm_slots'])
+                offset, slot_bytes = header['shm_data_offset'], header['shm_slot_bytes']
+        elif htype in ('image', 'image_batch'):
+            now = time.monotonic()
+            if stats['first'] is None:
+                stats['first'] = now
+                # a receiver that stops reading for a while
+                time.sleep(stall)
+            stats['last'] = now
+            if 'shm_slot' in header:
+                # the frame is at hand in the mapped ring, the ack frees the slot
+                start = offset + header['shm_slot'] * slot_bytes
+                stats['bytes'] += len(memoryview(ring)[start:start + header['shm_size']])
+                states[header['shm_slot']] = 0
+            else:
+                stats['bytes'] += len(parts[-1].buffer)
+            stats['messages'] += 1
+            for frame in header.get('frames', [header.get('frame')]):
+                stats['frames'] += 1
+                if frame <= stats['last_frame']:
+                    stats['out_of_order'] += 1
+                stats['last_frame'] = frame
+                latencies.append(now - camera.timestamps[frame])
+        elif htype == 'series_end':
+            ended.set()
+    socket.close()
+
+
+def endpoint_at(base, n):
+    # the n-th endpoint after a tcp://host:port or ipc://path endpoint
+    if base.startswith('ipc://'):
+        return '%s-%d' % (base, n)
+    host, port = base.rsplit(':', 1)
+    return '%s:%d' % (host, int(port) + n)
+
+
+def new_stats():
+    return {'frames': 0, 'bytes': 0, 'first': None, 'last': None, 'latency': [],
+            'last_frame': -1, 'out_of_order': 0, 'messages': 0, 'arm': [],
+            'first_frame': [], 'previews': 0, 'preview_shape': ()}
+
+
+def merge_stats(stripes):
+    # the sink of each stripe counts its own frames, the first one also keeps the series stats
+    stats = dict(stripes[0])
+    for key in ('frames', 'bytes', 'out_of_order', 'messages'):
+        stats[key] = sum(stripe[key] for stripe in stripes)
+    firsts = [stripe['first'] for stripe in stripes if stripe['first'] is not None]
+    lasts = [stripe['last'] for stripe in stripes if stripe['last'] is not None]
+    stats['first'] = min(firsts) if firsts else None
+    stats['last'] = max(lasts) if lasts else None
+    stats['latency'] = [value for stripe in stripes for value in stripe['latency']]
+    return stats
+
+
+def viewer(endpoint, stats, done, delay):
+    # a deliberately slow preview subscriber
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.SUB)
+    socket.setsockopt(zmq.RCVHWM, 1)
+    socket.setsockopt(zmq.SUBSCRIBE, b'')
+    socket.connect(endpoint)
+    while not done.is_set():
+        if not socket.poll(100):
+            continue
+        header = socket.recv_json()
+        socket.recv()
+        stats['previews'] += 1
+        stats['preview_shape'] = header['shape']
+        time.sleep(delay)
+    socket.close(linger=0)
+
+
+def report_stripes(stripes):
+    for index, stats in enumerate(stripes):
+        elapsed = (stats['last'] or 0) - (stats['first'] or 0)
+        print('stripe %-5d %d frames, %.1f MB/s' % (
+            index, stats['frames'], stats['bytes'] / elapsed / 1e6 if elapsed > 0 else 0.0))
+
+
+def report(stats, device, camera, rate):
+    frames = stats['frames']
+    arm = np.array(stats['arm']) * 1e3
+    first = np.array(stats['first_frame']) * 1e3
+    if arm.size:
+        print('series       %d, arm %.2f ms, arm to first frame %.2f ms (median)' %
+              (arm.size, np.median(arm), np.median(first)))
+    elapsed = (stats['last'] or 0) - (stats['first'] or 0)
+    latency = np.array(stats['latency']) * 1e3
+    print('frames       %d in %d messages (requested rate %.1f fps), %d out of order' %
+          (frames, stats['messages'], rate, stats['out_of_order']))
+    if frames > 1 and elapsed > 0:
+        print('elapsed      %.3f s' % elapsed)
+        print('fps          %.1f' % ((frames - 1) / elapsed))
+        print('throughput   %.1f MB/s' % (stats['bytes'] * (frames - 1) / frames / elapsed / 1e6))
+    if latency.size:
+        print('latency      p50 %.2f ms, p99 %.2f ms, max %.2f ms' %
+              (np.percentile(latency, 50), np.percentile(latency, 99), latency.max()))
+    print('dropped      %d (simulator had no queued buffer), %d detected' % (
+        camera.frames_dropped, device._dropped_frames))
+    if device.compressor.codec != 'none':
+        print('compression  %s ratio %.2f, %.2f ms per frame' % (
+            device.compressor.codec, device.compressor.ratio,
+            device.compressor.time_per_frame * 1e3))
+    snapshot = device.telemetry.snapshot()
+    for stage, values in snapshot['stages'].items():
+        if values['count']:
+            print('  %-10s mean %7.3f ms, p50 %7.3f ms, p99 %7.3f ms, max %7.3f ms' % (
+                stage, values['mean_ms'], values['p50_ms'], values['p99_ms'], values['max_ms']))
+    print('sdk buffers  %d x %d bytes' % (len(device.buffer_pool.buffers), device.buffer_pool.size))
+    print('queues       decode %d, send %d' % (device.pipeline.decode_depth,
+                                              device.pipeline.send_depth))
+    print('frame pool   %d slots, exhausted %d times' % (device.frame_pool.size,
+                                                       device.frame_pool.exhausted))
+    if device.last_stats:
+        last = device.last_stats
+        print('last frame   %d: min %d, max %d, mean %.1f, %d saturated' % (
+            last['frame'], last['min'], last['max'], last['mean'], last['saturated']))
+    if device.shm_ring:
+        print('shm ring     %d x %d bytes, %d frames sent over the socket instead' % (
+            device.shm_ring.slots, device.shm_ring.slot_bytes, device.shm_ring.fallbacks))
+    if device.spill:
+        print('spill        %d messages, peak %.1f MB, %d left' % (
+            device.spill.spilled, device.spill.peak / 1e6, len(device.spill.records)))
+    if device.preview:
+        print('preview      %d published, %d conflated, %d received %s by the viewer' % (
+            device.telemetry.preview_frames.total, device.telemetry.preview_conflated,
+            stats['previews'], 'x'.join(map(str, stats['preview_shape']))))
+    if device.reducer:
+        print('reduction    %s %s, %d bytes per frame' % (
+            'x'.join(map(str, device.reducer.binning)), device.reducer.mode,
+            int(np.prod(device.reducer.shape)) * device.reducer.dtype.itemsize))
+
+
+def acquire_references(device, frames, timeout):
+    # the simulator sees the same scene for both, so the corrected frames are 0
+    for acquire in (device.AcquireDark, device.AcquireFlat):
+        start = time.perf_counter()
+        acquire(frames)
+        deadline = time.monotonic() + timeout
+        while device.reference is not None:
+            if time.monotonic() > deadline:
+                raise RuntimeError('timeout acquiring references')
+            time.sleep(0.01)
+        print('reference    %s, %d frames in %.3f s' % (
+            acquire.__name__, frames, time.perf_counter() - start))
+
+
+def report_aggregate(all_stats):
+    frames = sum(stats['frames'] for stats in all_stats)
+    nbytes = sum(stats['bytes'] for stats in all_stats)
+    firsts = [stats['first'] for stats in all_stats if stats['first'] is not None]
+    lasts = [stats['last'] for stats in all_stats if stats['last'] is not None]
+    if not firsts or max(lasts) <= min(firsts):
+        return
+    elapsed = max(lasts) - min(firsts)
+    print('aggregate    %d cameras, %d frames in %.3f s, %.1f fps, %.1f MB/s' %
+          (len(all_stats), frames, elapsed, frames / elapsed, nbytes / elapsed / 1e6))
+
+
+def verify_decoder():
+    """Bit-exact comparison of the NumPy decoder with AT_ConvertBuffer."""
+    from . import andor
+    from . import decoder
+    rng = np.random.default_rng(0)
+    ok = True
+    print('AT_ConvertBuffer of the %s' % ('simulator' if andor.SIMULATOR else 'libatutility'))
+    for encoding in decoder.ENCODINGS:
+        maxval = 0xFFF if encoding.startswith('Mono12') else 0x1FFFF
+        for width, height in ((2560, 16), (1279, 7), (1, 1)):
+            for padding in (0, 13):
+                stride = simulator.row_bytes(width, encoding) + padding
+                pixels = rng.integers(0, maxval + 1, size=(height, width))
+                raw = simulator.encode(pixels, encoding, stride)
+                match = decoder.verify(raw, width, height, stride, encoding)
+                print('%-13s %5dx%-3d stride %5d  %s' % (encoding, width, height, stride,
+                                                         'ok' if match else 'MISMATCH'))
+                ok &= match
+    return ok
+
+
+def bench_headers(count=100000):
+    """Per-message cost of encoding an image header."""
+    fixed = {'htype': 'image', 'shape': (2160, 2560), 'type': 'uint16', 'compression': 'bslz4',
+             'orientation': {'fliplr': False, 'flipud': False, 'rotation': 0}}
+    meta = {'ticks': 123456789012, 'timestamp': 1234.5678901}
+
+    def send_json(frame):
+        header = {'htype': 'image', 'frame': frame, 'shape': fixed['shape'], 'type': 'uint16',
+                  'compression': 'bslz4', **meta, 'orientation': fixed['orientation'],
+                  'compressed_size': 3456789}
+        header['msg_number'] = frame + 1
+        return json.dumps(header).encode()
+
+    def template(fmt):
+        header_template = image_header.HeaderTemplate(fixed, fmt)
+
+        def encode(frame):
+            header = {'htype': 'image', 'frame': frame, **meta, 'compressed_size': 3456789}
+            return header_template.encode(header, frame + 1)
+        return encode
+
+    encoders = [('send_json', send_json), ('json template', template('json'))]
+    if image_header.available('msgpack'):
+        encoders.append(('msgpack template', template('msgpack')))
+    for name, encode in encoders:
+        size = len(encode(0))
+        start = time.perf_counter()
+        for frame in range(count):
+            encode(frame)
+        elapsed = time.perf_counter() - start
+        print('%-17s %6.2f us per header, %d bytes' % (name, elapsed / count * 1e6, size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=0,
+                        help='frame rate in Hz, 0 for the maximum FrameRate')
+    parser.add_argument('--width', type=int, default=2560)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--gain', default='16-bit (low noise & high well capacity)')
+    parser.add_argument('--encoding', default='Mono16')
+    parser.add_argument('--line-time', type=float, default=1e-6,
+                        help='simulated row readout time in s, limits the maximum rate')
+    parser.add_argument('--endpoint', default='tcp://127.0.0.1:19999',
+                        help='stream of the first camera, the others use the following ports')
+    parser.add_argument('--cameras', type=int, default=1,
+                        help='simulated cameras served from this process')
+    parser.add_argument('--worker-cpus', action='append', default=[],
+                        help='CPUs of the workers of the next camera, e.g. 0-3, repeat per camera')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--series', type=int, default=1,
+                        help='number of series to acquire one after the other')
+    parser.add_argument('--prearm', action='store_true',
+                        help='queue the SDK buffers for the next series when a series ends')
+    parser.add_argument('--decoder', default='numpy', choices=('numpy', 'sdk'))
+    parser.add_argument('--decoder-threads', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--compression', default='none')
+    parser.add_argument('--compression-level', type=int, default=0)
+    parser.add_argument('--metadata', action='store_true',
+                        help='enable SDK metadata for hardware timestamps and drop detection')
+    parser.add_argument('--fliplr', action='store_true')
+    parser.add_argument('--rotation', type=int, default=0)
+    parser.add_argument('--orientation-mode', default='pixels', choices=('pixels', 'header'))
+    parser.add_argument('--crop', default='',
+                        help='top,left,height,width of the sent frame')
+    parser.add_argument('--binning', default='1x1', help='rows x columns per output pixel')
+    parser.add_argument('--binning-mode', default='sum', choices=('sum', 'mean'))
+    parser.add_argument('--flatfield', default='none', choices=('none', 'float32', 'uint16'),
+                        help='acquire dark and flat references first and correct the frames')
+    parser.add_argument('--reference-frames', type=int, default=10)
+    parser.add_argument('--preview-rate', type=float, default=0,
+                        help='publish previews at this rate on the next ports after the cameras')
+    parser.add_argument('--preview-binning', type=int, default=4)
+    parser.add_argument('--stats-subsample', type=int, default=8,
+                        help='frame statistics on every n-th row and column, 0 for none')
+    parser.add_argument('--viewer-delay', type=float, default=0.5,
+                        help='seconds the preview viewer spends on each preview')
+    parser.add_argument('--stripes', type=int, default=1,
+                        help='data endpoints per camera, on the ports after --endpoint')
+    parser.add_argument('--stripe-mode', default='frame', choices=('frame', 'round_robin'))
+    parser.add_argument('--buffer-latency', type=float,
+                        help='seconds of frames in SDK buffers, more hides a slower pipeline, '
+                             'the buffer_latency default if not given')
+    parser.add_argument('--io-threads', type=int, default=1,
+                        help='ZeroMQ I/O threads of the context the cameras share')
+    parser.add_argument('--shm-memory', type=int, default=0,
+                        help='MB of shared memory ring, frames bypass the socket')
+    parser.add_argument('--compare-transports', action='store_true',
+                        help='run over tcp, ipc and shared memory and compare')
+    parser.add_argument('--spill', default='', help='spill ring file')
+    parser.add_argument('--spill-size', type=int, default=1024, help='spill ring size in MB')
+    parser.add_argument('--stall', type=float, default=0,
+                        help='seconds the sink stops reading after the first frame')
+    parser.add_argument('--batch-frames', type=int, default=1,
+                        help='maximum frames per message, 1 disables batching')
+    parser.add_argument('--batch-timeout', type=float, default=5.0,
+                        help='maximum time in ms a frame waits in a batch')
+    parser.add_argument('--header-format', default='json', choices=image_header.FORMATS)
+    parser.add_argument('--header-bench', action='store_true',
+                        help='only measure the cost of encoding image headers')
+    parser.add_argument('--verify', action='store_true',
+                        help='only compare the decoder with AT_ConvertBuffer')
+    args = parser.parse_args(argv)
+
+    # --verify follows ANDOR3_SIMULATOR, the benchmark always runs on the simulator
+    if not args.verify and 'dev_andor3.andor' not in sys.modules:
+        os.environ['ANDOR3_SIMULATOR'] = '1'
+    from . import andor
+    if not args.verify and not andor.SIMULATOR:
+        parser.error('the installed SDK is already loaded in this process')
+    if args.verify:
+        sys.exit(0 if verify_decoder() else 1)
+    if args.header_bench:
+        bench_headers()
+        return
+    # like the device server, before the first socket starts the shared context
+    zmq.Context.instance().io_threads = args.io_threads
+    if args.compare_transports:
+        compare_transports(args)
+        return
+    run(args)
+
+
+def compare_transports(args):
+    # the same acquisition over tcp, ipc and the shared memory ring with descriptors over ipc
+    shm_memory = args.shm_memory or 256
+    runs = (('tcp', 'tcp://127.0.0.1:19999', 0),
+            ('ipc', 'ipc:///tmp/andor3-benchmark', 0),
+            ('shm', 'ipc:///tmp/andor3-benchmark-shm', shm_memory))
+    results = []
+    for name, endpoint, shm in runs:
+        print('== %s' % name)
+        results.append((name, run(argparse.Namespace(**dict(vars(args), endpoint=endpoint,
+                                                           shm_memory=shm)))))
+    print('transport      fps     MB/s   latency p50   p99 (ms)')
+    for name, merged in results:
+        stats = merged[0]
+        elapsed = (stats['last'] or 0) - (stats['first'] or 0)
+        latency = np.array(stats['latency']) * 1e3
+        if stats['frames'] < 2 or elapsed <= 0 or not latency.size:
+            print('%-9s no frames' % name)
+            continue
+        print('%-9s %8.1f %8.1f %13.2f %5.2f' % (
+            name, (stats['frames'] - 1) / elapsed, stats['bytes'] / elapsed / 1e6,
+            np.percentile(latency, 50), np.percentile(latency, 99)))
+
+
+def run(args):
+    from . import andor
+    simulator.sdk.set_camera_count(args.cameras)
+    done = Event()
+    cameras = []
+    try:
+        for index in range(args.cameras):
+            endpoints = [endpoint_at(args.endpoint, index * args.stripes + i)
+                         for i in range(args.stripes)]
+            serial = 'VSC-%05d' % index if args.cameras > 1 else ''
+            cpus = args.worker_cpus[index] if index < len(args.worker_cpus) else ''
+            preview = ''
+            if args.preview_rate:
+                preview = endpoint_at(args.endpoint, args.cameras * args.stripes + index)
+            spill = '%s.%d' % (args.spill, index) if args.spill else ''
+            device = BenchmarkDevice(endpoints, serial, cpus, preview, spill, args.spill_size,
+                                     args.stripe_mode, args.shm_memory)
+            camera = andor.sdk.camera(device.handle)
+            camera.line_time = args.line_time
+            if args.buffer_latency is not None:
+                device.buffer_pool.latency = args.buffer_latency
+            device._decoder_engine = args.decoder
+            device._decoder_threads = args.decoder_threads
+            device._pipeline_workers = args.workers
+            if args.metadata:
+                device.features.set_bool('MetadataEnable', 1)
+                device._metadata_enable = True
+            device._compression = args.compression
+            device._compression_level = args.compression_level
+            device._fliplr = args.fliplr
+            device._rotation = args.rotation
+            device._orientation_mode = args.orientation_mode
+            device._crop = args.crop
+            device._binning_rows, device._binning_columns = map(int, args.binning.split('x'))
+            device._binning_mode = args.binning_mode
+            device._batch_frames = args.batch_frames
+            device._batch_timeout = args.batch_timeout
+            device._header_format = args.header_format
+            device._pre_arm = args.prearm
+            device._preview_rate = args.preview_rate
+            device._preview_binning = args.preview_binning
+            device._stats_subsample = args.stats_subsample
+
+            stripes = []
+            for endpoint in endpoints:
+                stats, ended = new_stats(), Event()
+                thread = Thread(target=sink, args=(endpoint, device, camera, stats, ended, done,
+                                                   args.stall))
+                thread.start()
+                stripes.append((stats, ended, thread))
+            stats = stripes[0][0]
+            if preview:
+                Thread(target=viewer, args=(preview, stats, done, args.viewer_delay)).start()
+            rate = device.configure(args.width, args.height, args.gain, args.encoding, args.rate)
+            device.write_nTriggers(args.frames)
+            if args.flatfield != 'none':
+                acquire_references(device, args.reference_frames, args.timeout)
+                device._flatfield = args.flatfield
+            cameras.append((device, camera, stripes, rate))
+
+        for _ in range(args.series):
+            for device, camera, stripes, rate in cameras:
+                for stats, ended, thread in stripes:
+                    ended.clear()
+                device.Arm()
+            deadline = time.monotonic() + args.timeout
+            timeout = False
+            for device, camera, stripes, rate in cameras:
+                # series_end is sent on every stripe
+                if not all(ended.wait(max(0.0, deadline - time.monotonic()))
+                           for stats, ended, thread in stripes):
+                    print('timeout after %.1f s' % args.timeout, file=sys.stderr)
+                    device.Stop()
+                    timeout = True
+                    continue
+                stats = stripes[0][0]
+                stats['arm'].append(device._arm_latency)
+                stats['first_frame'].append(device._first_frame_latency)
+            if timeout:
+                break
+    finally:
+        done.set()
+        for device, camera, stripes, rate in cameras:
+            for stats, ended, thread in stripes:
+                thread.join()
+            device.close()
+    merged = []
+    for index, (device, camera, stripes, rate) in enumerate(cameras):
+        if len(cameras) > 1:
+            print('camera %d (%s)' % (index, device._camera_serial))
+        merged.append(merge_stats([stats for stats, ended, thread in stripes]))
+        report(merged[-1], device, camera, rate)
+        if len(stripes) > 1:
+            report_stripes([stats for stats, ended, thread in stripes])
+    if len(cameras) > 1:
+        report_aggregate(merged)
+    return merged
+
+if __name__ == '__main__':
+    main()
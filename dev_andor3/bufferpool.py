@@ -0,0 +1,90 @@
+import math
+import mmap
+import ctypes
+import logging
+import numpy as np
+from . import andor
+
+logger = logging.getLogger(__name__)
+
+libc = ctypes.CDLL(None, use_errno=True)
+
+
+class Buffer:
+    """Page aligned SDK buffer backed by an anonymous mapping."""
+
+    def __init__(self, size, lock=False, hugepages=False):
+        self.mmap = mmap.mmap(-1, size, flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS)
+        if hugepages and hasattr(mmap, 'MADV_HUGEPAGE'):
+            self.mmap.madvise(mmap.MADV_HUGEPAGE)
+        self.array = np.frombuffer(self.mmap, np.uint8)
+        self.ptr = andor.ffi.from_buffer(self.array)
+        self.size = size
+        self.locked = False
+        if lock:
+            addr = ctypes.c_void_p(self.array.ctypes.data)
+            if libc.mlock(addr, ctypes.c_size_t(size)) == 0:
+                self.locked = True
+            else:
+                logger.warning('mlock of SDK buffer failed: errno %d', ctypes.get_errno())
+        if not self.locked:
+            # fault the pages in now rather than on the first frames
+            self.array[::mmap.PAGESIZE] = 0
+
+    def close(self):
+        if self.locked:
+            libc.munlock(ctypes.c_void_p(self.array.ctypes.data), ctypes.c_size_t(self.size))
+        del self.ptr, self.array
+        try:
+            self.mmap.close()
+        except BufferError:
+            # still referenced somewhere, the mapping goes with the last reference
+            pass
+
+
+class BufferPool:
+    """
+    SDK buffers kept across Arms.
+
+    The number of buffers follows the frame rate times a latency budget,
+    capped by a memory limit. Buffers are only reallocated when
+    ImageSizeBytes changes.
+    """
+
+    def __init__(self, latency=0.05, memory_limit=2048, min_count=16, lock=False,
+                 hugepages=False):
+        self.latency = latency
+        self.memory_limit = memory_limit * 2**20
+        self.min_count = min_count
+        self.lock = lock
+        self.hugepages = hugepages
+        self.size = 0
+        self.buffers = []
+
+    def count_for(self, frame_rate, image_size):
+        count = max(self.min_count, math.ceil(frame_rate * self.latency))
+        return max(2, min(count, self.memory_limit // image_size))
+
+    def configure(self, image_size, count):
+        # buffers must not be queued in the SDK when this is called
+        if image_size != self.size:
+            self.clear()
+            self.size = image_size
+        while len(self.buffers) > count:
+            self.buffers.pop().close()
+        while len(self.buffers) < count:
+            self.buffers.append(Buffer(image_size, self.lock, self.hugepages))
+
+    def queue(self, handle):
+        for buf in self.buffers:
+            andor.check_error(andor.sdk.AT_QueueBuffer(handle, buf.ptr, buf.size))
+
+    def clear(self):
+        for buf in self.buffers:
+            buf.close()
+        self.buffers = []
+        self.size = 0
+
+    @property
+    def nbytes(self):
+        return self.size * len(self.buffers)
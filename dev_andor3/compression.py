@@ -0,0 +1,97 @@
+"""
+Per-frame compression for the image stream.
+
+The codecs are optional dependencies, selecting one that is not installed
+raises a ValueError.
+
+    bslz4  bitshuffle + LZ4 with the 12 byte HDF5 filter header
+           (uncompressed bytes as >u8, block size in bytes as >u4)
+    zstd   zstandard frame
+    blosc  blosc with bitshuffle and lz4
+"""
+import time
+import struct
+import threading
+
+try:
+    import bitshuffle
+except ImportError:
+    bitshuffle = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import blosc
+except ImportError:
+    blosc = None
+
+CODECS = ('none', 'bslz4', 'zstd', 'blosc')
+
+BSLZ4_BLOCK_BYTES = 8192
+
+
+def available(codec):
+    return {'none': True,
+            'bslz4': bitshuffle is not None,
+            'zstd': zstandard is not None,
+            'blosc': blosc is not None}.get(codec, False)
+
+
+class Compressor:
+    """Thread safe compressor that keeps ratio and timing statistics."""
+
+    def __init__(self, codec='none', level=0):
+        if codec not in CODECS:
+            raise ValueError('unknown compression %s, choose from %s' % (codec, ', '.join(CODECS)))
+        if not available(codec):
+            raise ValueError('compression %s is not installed' % codec)
+        self.codec = codec
+        self.level = level
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.frames = 0
+            self.raw_bytes = 0
+            self.compressed_bytes = 0
+            self.seconds = 0.0
+
+    def compress(self, img):
+        """Return the compressed bytes of a C contiguous array."""
+        start = time.perf_counter()
+        if self.codec == 'bslz4':
+            block_size = BSLZ4_BLOCK_BYTES // img.itemsize
+            data = bitshuffle.compress_lz4(img.reshape(-1), block_size)
+            data = struct.pack('>QI', img.nbytes, block_size * img.itemsize) + data.tobytes()
+        elif self.codec == 'zstd':
+            compressor = getattr(self.local, 'zstd', None)
+            if compressor is None:
+                compressor = self.local.zstd = zstandard.ZstdCompressor(level=self.level or 3)
+            data = compressor.compress(img.data)
+        elif self.codec == 'blosc':
+            data = blosc.compress(img.data, typesize=img.itemsize, clevel=self.level or 5,
+                                  shuffle=blosc.BITSHUFFLE, cname='lz4')
+        else:
+            data = img
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.frames += 1
+            self.raw_bytes += img.nbytes
+            self.compressed_bytes += len(data) if self.codec != 'none' else img.nbytes
+            self.seconds += elapsed
+        return data
+
+    @property
+    def ratio(self):
+        with self.lock:
+            return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 1.0
+
+    @property
+    def time_per_frame(self):
+        with self.lock:
+            return self.seconds / self.frames if self.frames else 0.0
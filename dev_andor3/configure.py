@@ -0,0 +1,112 @@
+"""
+Bulk camera configuration.
+
+Settings are validated against the feature types and enum options before
+anything is written, then written in dependency order: the gain selects the
+available pixel encodings, readout rate, shuttering and AOI limit the
+exposure time, and all of them limit the frame rate. Ranges and enum
+availability are checked just before each write as they depend on the
+writes before it. Settings that already have the requested value are not
+written. If a write fails, the settings written so far are restored.
+"""
+from . import andor
+
+# setting -> (SDK feature, kind), in the order they are written
+SETTINGS = {
+    'SimplePreAmpGainControl': ('SimplePreAmpGainControl', 'enum'),
+    'PixelEncoding': ('PixelEncoding', 'enum'),
+    'PixelReadoutRate': ('PixelReadoutRate', 'enum'),
+    'ElectronicShutteringMode': ('ElectronicShutteringMode', 'enum'),
+    'SensorCooling': ('SensorCooling', 'bool'),
+    'AOIWidth': ('AOIWidth', 'int'),
+    'AOILeft': ('AOILeft', 'int'),
+    'AOIHeight': ('AOIHeight', 'int'),
+    'AOITop': ('AOITop', 'int'),
+    'Overlap': ('Overlap', 'bool'),
+    'TriggerMode': ('TriggerMode', 'enum'),
+    'ExposureTime': ('ExposureTime', 'float'),
+    'FrameRate': ('FrameRate', 'float'),
+    'nTriggers': ('FrameCount', 'int'),
+}
+
+READ_KIND = {'enum': 'enum_string', 'int': 'int', 'float': 'float', 'bool': 'bool'}
+
+# an offset limits the size, it is moved to 1 before the size is written
+AOI_OFFSETS = {'AOIWidth': 'AOILeft', 'AOIHeight': 'AOITop'}
+
+
+def validate(features, settings):
+    """Return the settings converted to their feature types."""
+    result = {}
+    for name, value in settings.items():
+        if name not in SETTINGS:
+            raise ValueError('unknown setting %s, choose from %s' % (name, ', '.join(SETTINGS)))
+        feature, kind = SETTINGS[name]
+        if kind == 'enum':
+            options = features.get_enum_options(feature)
+            if value not in options:
+                raise ValueError('%s must be one of %s' % (name, ', '.join(options)))
+        elif kind == 'bool':
+            if not isinstance(value, bool):
+                raise ValueError('%s must be a boolean' % name)
+        elif kind == 'int':
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError('%s must be an integer' % name)
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError('%s must be a number' % name)
+        else:
+            value = float(value)
+        result[name] = value
+    return result
+
+
+def read(features, name):
+    feature, kind = SETTINGS[name]
+    value = features.read(feature, READ_KIND[kind])
+    return bool(value) if kind == 'bool' else value
+
+
+def check(features, name, value):
+    feature, kind = SETTINGS[name]
+    if kind == 'enum':
+        available = features.get_enum_available(feature)
+        if value not in available:
+            raise ValueError('%s %s is not available, choose from %s' %
+                             (name, value, ', '.join(available)))
+    elif kind in ('int', 'float'):
+        minimum = features.read(feature, kind + '_min')
+        maximum = features.read(feature, kind + '_max')
+        if not minimum <= value <= maximum:
+            raise ValueError('%s %s out of range [%s, %s]' % (name, value, minimum, maximum))
+
+
+def write(features, name, value):
+    feature, kind = SETTINGS[name]
+    ret = features.write(feature, kind, int(value) if kind == 'bool' else value)
+    if ret != andor.AT_SUCCESS:
+        raise RuntimeError('Error setting %s to %s: %s' % (name, value, andor.errors.get(ret, ret)))
+
+
+def apply(features, settings, restore=True):
+    """Write validated settings in dependency order, return the effective values of all settings."""
+    previous = {}
+    try:
+        for name in SETTINGS:
+            if name not in settings:
+                continue
+            value = settings[name]
+            offset = AOI_OFFSETS.get(name)
+            if offset in settings and read(features, offset) != 1:
+                previous.setdefault(offset, read(features, offset))
+                write(features, offset, 1)
+            current = read(features, name)
+            if current == value:
+                continue
+            check(features, name, value)
+            previous.setdefault(name, current)
+            write(features, name, value)
+    except Exception:
+        if restore and previous:
+            apply(features, previous, restore=False)
+        raise
+    return {name: read(features, name) for name in SETTINGS}
@@ -0,0 +1,101 @@
+"""
+In-process conversion of raw SDK buffers to Mono16.
+
+Replaces atutility AT_ConvertBuffer with NumPy: Mono16 and Mono12 rows are
+copied out of the buffer without their AOIStride padding, Mono12Packed is
+unpacked with vectorized bit operations and Mono32 is clipped to 16 bits.
+The output is always written into the caller's frame, the SDK buffer is
+requeued right after decoding. Large frames can be split into row bands decoded on a
+thread pool, NumPy releases the GIL for the heavy lifting.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from . import andor
+from . import atutility
+from .affinity import pin_thread
+
+ENCODINGS = ('Mono12', 'Mono12Packed', 'Mono16', 'Mono32')
+
+
+def sdk_convert(raw, out, width, height, stride, encoding):
+    """Convert with AT_ConvertBuffer into a C contiguous (height, width) array."""
+    ret = atutility.sdk.AT_ConvertBuffer(andor.ffi.from_buffer(raw),
+                                         andor.ffi.from_buffer(out),
+                                         width, height, stride,
+                                         encoding, 'Mono16')
+    if ret != 0:
+        raise RuntimeError('Error in AT_ConvertBuffer')
+
+
+class Decoder:
+    def __init__(self, width, height, stride, encoding, threads=1, engine='numpy', cpus=None):
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.encoding = encoding
+        self.threads = max(1, threads)
+        if encoding not in ENCODINGS:
+            engine = 'sdk'
+        self.engine = engine
+        self.executor = None
+        if self.engine == 'numpy' and self.threads > 1:
+            self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='decoder',
+                                               initializer=pin_thread, initargs=(cpus,))
+        step = -(-height // self.threads)
+        self.bands = [(y, min(y + step, height)) for y in range(0, height, step)]
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown()
+
+    def rows(self, raw):
+        return raw[:self.stride * self.height].reshape(self.height, self.stride)
+
+    def decode(self, raw, out):
+        """Decode the raw buffer into `out`, which may be any strided view."""
+        if self.engine == 'sdk':
+            if out.flags.c_contiguous:
+                sdk_convert(raw, out, self.width, self.height, self.stride, self.encoding)
+            else:
+                img = np.empty((self.height, self.width), np.uint16)
+                sdk_convert(raw, img, self.width, self.height, self.stride, self.encoding)
+                np.copyto(out, img)
+            return out
+        rows = self.rows(raw)
+        if self.executor:
+            list(self.executor.map(lambda band: self.decode_rows(rows[band[0]:band[1]],
+                                                                 out[band[0]:band[1]]),
+                                   self.bands))
+        else:
+            self.decode_rows(rows, out)
+        return out
+
+    def decode_rows(self, rows, out):
+        width = self.width
+        if self.encoding == 'Mono12Packed':
+            # 3 bytes per pixel pair, an odd last pixel has 2 bytes that may end the row
+            pairs = width // 2
+            groups = rows[:, :pairs * 3].reshape(rows.shape[0], pairs, 3)
+            even = out[:, 0:pairs * 2:2]
+            odd = out[:, 1:pairs * 2:2]
+            np.left_shift(groups[..., 0], 4, out=even, dtype=np.uint16)
+            even |= groups[..., 1] & 0xF
+            np.left_shift(groups[..., 2], 4, out=odd, dtype=np.uint16)
+            odd |= groups[..., 1] >> 4
+            if width % 2:
+                last = out[:, width - 1]
+                np.left_shift(rows[:, pairs * 3], 4, out=last, dtype=np.uint16)
+                last |= rows[:, pairs * 3 + 1] & 0xF
+        elif self.encoding == 'Mono32':
+            np.minimum(rows[:, :width * 4].view('<u4'), 0xFFFF, out=out, casting='unsafe')
+        else:
+            np.copyto(out, rows[:, :width * 2].view('<u2'))
+
+
+def verify(raw, width, height, stride, encoding):
+    """Compare the NumPy decoder bit for bit with AT_ConvertBuffer."""
+    expected = np.empty((height, width), np.uint16)
+    sdk_convert(raw, expected, width, height, stride, encoding)
+    decoded = np.empty((height, width), np.uint16)
+    Decoder(width, height, stride, encoding).decode(raw, decoded)
+    return np.array_equal(expected, decoded)
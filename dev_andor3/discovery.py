@@ -0,0 +1,68 @@
+"""
+Cache of the camera discovery done at startup.
+
+Finding the index of a serial number means opening every camera and finding
+the /dev/video node of a camera means running a short acquisition. Both are
+stored in a small JSON file together with the identity of the video node
+(its sysfs device and device number). A cached entry is used when the video
+node still has that identity and the camera at the index still has the
+serial number, otherwise the full discovery runs again.
+"""
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def identity(path):
+    """sysfs device and device number of a video node, None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    sysfs = os.path.join('/sys/class/video4linux', os.path.basename(path), 'device')
+    device = os.path.realpath(sysfs) if os.path.exists(sysfs) else None
+    return [device, st.st_rdev]
+
+
+class DiscoveryCache:
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning('ignoring discovery cache %s: %s', self.path, e)
+            return {}
+
+    def lookup(self, serial_number):
+        """Entry for the requested serial number ('' for the first camera) if still valid."""
+        entry = self.load().get(serial_number)
+        if not entry:
+            return None
+        video_identity = identity(entry['video'])
+        if video_identity is None or video_identity != entry['identity']:
+            logger.info('video device %s changed, running discovery', entry['video'])
+            return None
+        return entry
+
+    def store(self, serial_number, index, serial, video):
+        if not self.path:
+            return
+        entries = self.load()
+        entries[serial_number] = {'index': index, 'serial': serial, 'video': video,
+                                  'identity': identity(video)}
+        tmp = '%s.%d' % (self.path, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(entries, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning('could not write discovery cache %s: %s', self.path, e)
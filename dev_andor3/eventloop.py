@@ -0,0 +1,81 @@
+import os
+import logging
+import threading
+from collections import deque
+import zmq
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoop:
+    """
+    One acquisition thread for all cameras of the process.
+
+    Polls the video devices, recycle pipes and control sockets of every
+    attached camera and calls the registered handler of whatever is
+    readable. Handlers run on the loop thread and must not block for long,
+    a slow handler delays the other cameras. EventLoop.call(func) runs
+    func(loop) on the loop thread, starting the loop if needed; this is how
+    cameras attach and detach. The loop ends when no handler is left.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def call(cls, func):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            cls._instance.calls.append(func)
+            os.write(cls._instance.wake_w, b'\0')
+
+    def __init__(self):
+        self.poller = zmq.Poller()
+        self.handlers = {}
+        self.calls = deque()
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        self.poller.register(self.wake_r, zmq.POLLIN)
+        self.thread = threading.Thread(target=self.run, name='acquisition')
+        self.thread.start()
+
+    def register(self, source, handler):
+        self.handlers[source] = handler
+        self.poller.register(source, zmq.POLLIN)
+
+    def unregister(self, source):
+        del self.handlers[source]
+        self.poller.unregister(source)
+
+    def run(self):
+        while True:
+            for source, event in self.poller.poll():
+                if source == self.wake_r:
+                    self.run_calls()
+                    continue
+                handler = self.handlers.get(source)
+                if handler is None or not event & zmq.POLLIN:
+                    continue
+                try:
+                    handler()
+                except Exception:
+                    logger.exception('acquisition handler failed')
+            with self._lock:
+                if not self.handlers and not self.calls:
+                    EventLoop._instance = None
+                    break
+        os.close(self.wake_r)
+        os.close(self.wake_w)
+
+    def run_calls(self):
+        try:
+            os.read(self.wake_r, 65536)
+        except BlockingIOError:
+            pass
+        while self.calls:
+            func = self.calls.popleft()
+            try:
+                func(self)
+            except Exception:
+                logger.exception('acquisition loop call failed')
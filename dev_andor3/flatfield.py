@@ -0,0 +1,133 @@
+"""
+Dark and flat-field correction of the frames on the decode workers.
+
+Dark and flat references are averaged from short acquisitions in sensor
+orientation and cached in memory, and optionally as .npy files in a
+directory, keyed by AOI, exposure time and gain. A Corrector orients them
+like the frames and computes
+
+    (frame - dark) / (flat - dark) * scale
+
+as float32 (scale 1) or rounded and clipped to uint16, the latter in
+place in the decoded frame. Pixels where the flat is not above the dark
+are set to 0.
+"""
+import os
+import hashlib
+import logging
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('dark', 'flat')
+OUTPUTS = ('none', 'float32', 'uint16')
+
+
+def reference_key(width, height, left, top, exposure_time, gain):
+    return '%dx%d+%d+%d %.6g s %s' % (width, height, left, top, exposure_time, gain)
+
+
+class Accumulator:
+    """Mean of the frames added by the decode workers."""
+
+    def __init__(self, kind, key, shape):
+        if kind not in KINDS:
+            raise ValueError('unknown reference %s, choose from %s' % (kind, ', '.join(KINDS)))
+        self.kind = kind
+        self.key = key
+        self.lock = threading.Lock()
+        self.sum = np.zeros(shape, np.float64)
+        self.count = 0
+
+    def add(self, img):
+        with self.lock:
+            np.add(self.sum, img, out=self.sum)
+            self.count += 1
+
+    def mean(self):
+        with self.lock:
+            return (self.sum / self.count).astype(np.float32)
+
+
+class ReferenceCache:
+    def __init__(self, directory=''):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.references = {}
+
+    def path(self, key, kind):
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        return os.path.join(self.directory, '%s-%s.npy' % (digest, kind))
+
+    def get(self, key, kind):
+        with self.lock:
+            reference = self.references.get((key, kind))
+        if reference is not None or not self.directory:
+            return reference
+        try:
+            reference = np.load(self.path(key, kind))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning('ignoring %s reference for %s: %s', kind, key, e)
+            return None
+        with self.lock:
+            self.references[(key, kind)] = reference
+        return reference
+
+    def put(self, key, kind, reference):
+        with self.lock:
+            self.references[(key, kind)] = reference
+        if not self.directory:
+            return
+        path = self.path(key, kind)
+        tmp = '%s.%d.npy' % (path[:-4], os.getpid())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            np.save(tmp, reference)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning('could not store %s reference in %s: %s', kind, path, e)
+
+    def available(self, key):
+        return [kind for kind in KINDS if self.get(key, kind) is not None]
+
+
+class Corrector:
+    def __init__(self, dark, flat, orientation, output='float32', scale=1.0):
+        if output not in OUTPUTS[1:]:
+            raise ValueError('unknown correction output %s, choose from %s' %
+                             (output, ', '.join(OUTPUTS[1:])))
+        if dark.shape != flat.shape or dark.shape != orientation.view_shape:
+            raise ValueError('reference shape %s does not match the frame' % (dark.shape,))
+        self.dtype = np.dtype(output)
+        self.scale = 1.0 if output == 'float32' else scale
+        self.offset = self.oriented(dark, orientation)
+        span = self.oriented(flat, orientation) - self.offset
+        self.gain = np.zeros_like(span)
+        np.divide(self.scale, span, out=self.gain, where=span > 0)
+        self.shape = self.offset.shape
+        self.local = threading.local()
+
+    @staticmethod
+    def oriented(reference, orientation):
+        out = np.empty(orientation.shape, np.float32)
+        orientation.view(out)[...] = reference
+        return out
+
+    def apply(self, img, out):
+        """Write the corrected `img` into `out`, which may be `img` for uint16 output."""
+        if out.dtype == np.float32:
+            np.subtract(img, self.offset, out=out)
+            np.multiply(out, self.gain, out=out)
+            return out
+        tmp = getattr(self.local, 'tmp', None)
+        if tmp is None:
+            tmp = self.local.tmp = np.empty(self.shape, np.float32)
+        np.subtract(img, self.offset, out=tmp)
+        np.multiply(tmp, self.gain, out=tmp)
+        tmp += 0.5
+        np.clip(tmp, 0, 65535, out=tmp)
+        np.copyto(out, tmp, casting='unsafe')
+        return out
@@ -0,0 +1,84 @@
+import threading
+from collections import deque
+import numpy as np
+
+
+class FramePool:
+    """
+    Preallocated output frames that are recycled once ZeroMQ is done with them.
+
+    Frames handed out by acquire() are either given back with release() or
+    passed to track() together with the MessageTracker of the zmq.Frame they
+    were sent in; they return to the pool when the tracker reports done.
+    If no slot is free a temporary array is allocated and counted in
+    `exhausted`.
+    """
+
+    def __init__(self, dtype=np.uint16):
+        self.dtype = np.dtype(dtype)
+        self.lock = threading.Lock()
+        self.nbytes = 0
+        self.size = 0
+        self.slots = {}
+        self.free = deque()
+        self.in_flight = deque()
+        self.exhausted = 0
+
+    def resize(self, nbytes, size):
+        """Make the pool hold `size` slots of `nbytes` each."""
+        with self.lock:
+            if nbytes != self.nbytes:
+                self.slots.clear()
+                self.free.clear()
+                self.nbytes = nbytes
+            self.size = size
+            while len(self.slots) > size and self.free:
+                del self.slots[id(self.free.pop())]
+            while len(self.slots) < size:
+                slot = np.empty(nbytes // self.dtype.itemsize, self.dtype)
+                self.slots[id(slot)] = slot
+                self.free.append(slot)
+            self.exhausted = 0
+
+    def acquire(self, shape):
+        count = int(np.prod(shape))
+        with self.lock:
+            self._reap()
+            if count * self.dtype.itemsize <= self.nbytes and self.free:
+                slot = self.free.popleft()
+                return slot[:count].reshape(shape)
+            self.exhausted += 1
+        return np.empty(shape, self.dtype)
+
+    def release(self, frame):
+        with self.lock:
+            self._put(frame.base)
+
+    def track(self, frame, tracker):
+        with self.lock:
+            if frame.base is not None and id(frame.base) in self.slots:
+                self.in_flight.append((frame.base, tracker))
+
+    def _put(self, slot):
+        if slot is None or self.slots.get(id(slot)) is not slot:
+            return
+        if len(self.slots) > self.size:
+            del self.slots[id(slot)]
+            return
+        self.free.append(slot)
+
+    def _reap(self):
+        # stripes and spilled messages complete out of send order, every tracker is checked
+        waiting = deque()
+        for slot, tracker in self.in_flight:
+            if tracker.done:
+                self._put(slot)
+            else:
+                waiting.append((slot, tracker))
+        self.in_flight = waiting
+
+    @property
+    def occupancy(self):
+        with self.lock:
+            self._reap()
+            return len(self.slots) - len(self.free)
@@ -0,0 +1,47 @@
+"""
+Per-frame statistics for exposure and saturation checks.
+
+The decoded frame, before flat-field correction and binning, is sampled
+every `step` rows and columns on the decode worker and reduced to its
+min, max and mean, the number of pixels at or above `saturation` and a
+histogram of `bins` equal bins over the full scale of the pixel encoding.
+The histogram counts the sampled pixels, the saturated count is scaled
+up to the whole frame and a saturated pixel between the samples can be
+missed.
+"""
+import numpy as np
+
+# full scale of the decoded uint16 frames by pixel encoding
+FULL_SCALE = {'Mono12': 0xFFF, 'Mono12Packed': 0xFFF, 'Mono16': 0xFFFF, 'Mono32': 0xFFFF}
+
+
+class FrameStats:
+    def __init__(self, encoding, step=8, saturation=0, bins=16):
+        if step < 1:
+            raise ValueError('statistics subsample step must be at least 1')
+        if bins < 2 or bins & (bins - 1):
+            raise ValueError('histogram bins must be a power of two, not %d' % bins)
+        self.full_scale = FULL_SCALE.get(encoding, 0xFFFF)
+        self.step = step
+        self.saturation = min(saturation, self.full_scale) if saturation > 0 else self.full_scale
+        self.bins = bins
+        # bins of a power of two pixel values, pixel >> shift is the bin
+        self.shift = max(0, self.full_scale.bit_length() - bins.bit_length() + 1)
+
+    def describe(self):
+        return {'step': self.step, 'saturation': self.saturation, 'bins': self.bins,
+                'bin_width': 1 << self.shift}
+
+    def compute(self, img):
+        """min, max, mean, saturated and histogram of `img` as plain Python values."""
+        sample = img[::self.step, ::self.step]
+        histogram = np.bincount((sample >> self.shift).ravel(), minlength=self.bins)
+        if histogram.size > self.bins:
+            # values above the full scale of the encoding go in the last bin
+            histogram[self.bins - 1] += histogram[self.bins:].sum()
+        saturated = np.count_nonzero(sample >= self.saturation)
+        return {'min': int(sample.min()),
+                'max': int(sample.max()),
+                'mean': round(int(sample.sum(dtype=np.uint64)) / sample.size, 3),
+                'saturated': round(saturated * img.size / sample.size),
+                'histogram': histogram[:self.bins].tolist()}
@@ -0,0 +1,97 @@
+"""
+Preencoded image headers.
+
+The fields that are constant within a series (htype, shape, type,
+compression, orientation) are encoded once at Arm, per frame only the
+varying fields (frame, msg_number, metadata, compressed_size) are encoded
+and appended to the preformatted bytes.
+
+    json     the JSON object send_json would produce, compact separators
+    msgpack  a msgpack map with the same fields, optional dependency
+
+The receiver learns the format from 'header_format' in the series header,
+the series header, image_batch and series_end are always JSON.
+"""
+import json
+import math
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ('json', 'msgpack')
+
+
+def available(fmt):
+    return {'json': True, 'msgpack': msgpack is not None}.get(fmt, False)
+
+
+def decode(raw):
+    """The dict of an encoded header, JSON or msgpack."""
+    if raw[:1] == b'{':
+        return json.loads(raw)
+    if msgpack is None:
+        raise ValueError('msgpack header but msgpack is not installed')
+    return msgpack.unpackb(raw)
+
+
+class HeaderTemplate:
+    def __init__(self, fixed, fmt='json'):
+        if fmt not in FORMATS:
+            raise ValueError('unknown header format %s, choose from %s' % (fmt, ', '.join(FORMATS)))
+        if not available(fmt):
+            raise ValueError('header format %s is not installed' % fmt)
+        self.format = fmt
+        self.fixed = dict(fixed)
+        self.keys = {}
+        if fmt == 'json':
+            # '{"htype":"image",...' without the closing brace
+            self.prefix = json.dumps(self.fixed, separators=(',', ':')).encode()[:-1]
+            self.encode = self.encode_json
+        else:
+            self.prefix = b''.join(msgpack.packb(key) + msgpack.packb(value)
+                                   for key, value in self.fixed.items())
+            self.encode = self.encode_msgpack
+
+    def key(self, key):
+        encoded = self.keys.get(key)
+        if encoded is None:
+            if self.format == 'json':
+                encoded = b',%s:' % json.dumps(key).encode()
+            else:
+                encoded = msgpack.packb(key)
+            self.keys[key] = encoded
+        return encoded
+
+    def encode_json(self, header, msg_number):
+        """Return the bytes of `header` with the fixed fields and msg_number."""
+        parts = [self.prefix]
+        for key, value in header.items():
+            if key in self.fixed:
+                continue
+            parts.append(self.keys.get(key) or self.key(key))
+            kind = type(value)
+            if kind is int:
+                parts.append(b'%d' % value)
+            elif kind is float and math.isfinite(value):
+                parts.append(repr(value).encode())
+            else:
+                parts.append(json.dumps(value).encode())
+        parts.append(b',"msg_number":%d}' % msg_number)
+        return b''.join(parts)
+
+    def encode_msgpack(self, header, msg_number):
+        parts = [b'', self.prefix]
+        count = len(self.fixed) + 1
+        for key, value in header.items():
+            if key in self.fixed:
+                continue
+            parts.append(self.keys.get(key) or self.key(key))
+            parts.append(msgpack.packb(value))
+            count += 1
+        parts.append(self.key('msg_number'))
+        parts.append(msgpack.packb(msg_number))
+        parts[0] = bytes([0x80 | count]) if count < 16 else b'\xde' + struct.pack('>H', count)
+        return b''.join(parts)
@@ -0,0 +1,59 @@
+"""
+In-process stand-in for the status API of libdaq.Receiver.
+
+The device uses status(), wait_for_running(), restart() and
+frames_received of the receiver. LocalReceiver answers them from the
+headers of the data stream its consumer passes to handle(): a series
+header makes it 'running', series_end 'idle' again and images count as
+received frames. Put one in place of the libdaq Receiver where the data
+stream is consumed in the same process, the benchmark, the stream
+recorder and tests.
+"""
+import threading
+
+
+class LocalReceiver:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.state = 'idle'
+        self.error = ''
+        self.frames_received = 0
+
+    def handle(self, header):
+        """Update from the decoded header of one message of the data stream."""
+        htype = header['htype']
+        with self.cond:
+            if htype == 'header':
+                # every stripe sends the series header, only the first one starts the series
+                if self.state != 'running':
+                    self.state = 'running'
+                    self.error = ''
+                    self.frames_received = 0
+            elif htype == 'image':
+                self.frames_received += 1
+            elif htype == 'image_batch':
+                self.frames_received += header['count']
+            elif htype == 'series_end':
+                self.state = 'idle'
+            self.cond.notify_all()
+
+    def fail(self, error):
+        with self.cond:
+            self.state = 'error'
+            self.error = error
+            self.cond.notify_all()
+
+    def status(self):
+        with self.cond:
+            return {'state': self.state, 'error': self.error,
+                    'frames_received': self.frames_received}
+
+    def wait_for_running(self, timeout):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.state == 'running', timeout)
+
+    def restart(self, namespace=None):
+        with self.cond:
+            self.state = 'idle'
+            self.error = ''
+            self.cond.notify_all()
@@ -0,0 +1,71 @@
+"""
+Reader for the SDK3 metadata appended to image buffers.
+
+With MetadataEnable the buffer holds a chain of blocks, each laid out as
+data, CID (u32) and length (u32, CID plus data), read backwards from the
+end of the buffer. The frame data block comes first. The layout does not
+change within a series, so it is parsed once and every later frame is read
+through one structured NumPy view of the trailer.
+"""
+import numpy as np
+
+CID_FRAME = 0
+CID_TICKS = 1
+CID_FRAMEINFO = 7
+
+FRAMEINFO_DTYPE = np.dtype([('height', '<u2'), ('width', '<u2'), ('reserved', 'u1'),
+                            ('encoding', 'u1'), ('stride', '<u2')])
+
+
+def parse_blocks(raw):
+    """Return {cid: (offset, length)} of the data of every metadata block."""
+    blocks = {}
+    end = raw.size
+    while end >= 8:
+        cid, length = np.frombuffer(raw, '<u4', 2, end - 8)
+        start = end - 4 - int(length)
+        if length < 4 or start < 0:
+            raise ValueError('corrupt metadata block at offset %d' % (end - 8))
+        blocks[int(cid)] = (start, int(length) - 4)
+        if cid == CID_FRAME:
+            break
+        end = start
+    return blocks
+
+
+class MetadataReader:
+    def __init__(self, clock_frequency, period=None):
+        self.clock_frequency = clock_frequency
+        # expected ticks between frames, gap detection is off without it
+        self.period_ticks = period * clock_frequency if period else None
+        self.trailer = None
+        self.last_ticks = None
+        self.dropped = 0
+
+    def layout(self, raw):
+        blocks = parse_blocks(raw)
+        if CID_TICKS not in blocks or CID_FRAME not in blocks:
+            raise ValueError('metadata has no timestamp block')
+        # the trailer starts after the frame data block and its CID and length
+        start = sum(blocks[CID_FRAME]) + 8
+        fields = {'ticks': ('<u8', blocks[CID_TICKS][0] - start)}
+        if CID_FRAMEINFO in blocks:
+            fields['info'] = (FRAMEINFO_DTYPE, blocks[CID_FRAMEINFO][0] - start)
+        self.trailer = np.dtype({'names': list(fields),
+                                 'formats': [f for f, _ in fields.values()],
+                                 'offsets': [o for _, o in fields.values()],
+                                 'itemsize': raw.size - start})
+        self.offset = start
+
+    def read(self, raw):
+        """Return the header fields of one frame and count missing frames."""
+        if self.trailer is None:
+            self.layout(raw)
+        trailer = np.frombuffer(raw, self.trailer, 1, self.offset)[0]
+        ticks = int(trailer['ticks'])
+        if self.last_ticks is not None and self.period_ticks:
+            missing = round((ticks - self.last_ticks) / self.period_ticks) - 1
+            if missing > 0:
+                self.dropped += missing
+        self.last_ticks = ticks
+        return {'ticks': ticks, 'timestamp': ticks / self.clock_frequency}
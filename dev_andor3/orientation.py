@@ -0,0 +1,40 @@
+import numpy as np
+
+
+class Orientation:
+    """
+    Fliplr, Flipud and Rotation (quarter turns, applied in that order) folded
+    into one strided view.
+
+    view(out) returns a (height, width) view of the oriented output frame,
+    writing the decoded image into it produces the oriented frame in one pass.
+    """
+
+    def __init__(self, height, width, fliplr=False, flipud=False, rotation=0):
+        self.fliplr = bool(fliplr)
+        self.flipud = bool(flipud)
+        self.rotation = rotation % 4
+        self.identity = not (self.fliplr or self.flipud or self.rotation)
+        self.shape = (width, height) if self.rotation % 2 else (height, width)
+
+        out = np.empty(self.shape, np.uint16)
+        view = np.rot90(out, -self.rotation)
+        if self.flipud:
+            view = np.flipud(view)
+        if self.fliplr:
+            view = np.fliplr(view)
+        # in elements, view() works for frames of any dtype
+        self.view_shape = view.shape
+        self.view_strides = tuple(s // out.itemsize for s in view.strides)
+        self.view_offset = (view.__array_interface__['data'][0] - out.ctypes.data) // out.itemsize
+
+    def view(self, out):
+        if self.identity:
+            return out
+        itemsize = out.itemsize
+        return np.ndarray(self.view_shape, out.dtype, buffer=out,
+                          offset=self.view_offset * itemsize,
+                          strides=tuple(s * itemsize for s in self.view_strides))
+
+    def header(self):
+        return {'fliplr': self.fliplr, 'flipud': self.flipud, 'rotation': self.rotation}
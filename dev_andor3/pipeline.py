@@ -0,0 +1,169 @@
+import time
+import queue
+import logging
+import threading
+from .affinity import pin_thread
+
+logger = logging.getLogger(__name__)
+
+
+class Pipeline:
+    """
+    Decode worker pool followed by an ordered sender thread.
+
+    The acquisition stage hands raw frames to submit() and control messages
+    to post(). Every item gets a sequence number when it enters the
+    pipeline; `process` turns submitted items into messages on one of the
+    worker threads and `send` is called with the messages strictly in
+    sequence order on the sender thread. A callback passed to when_sent()
+    is called on the sender thread once everything before it has been sent.
+    Both queues are bounded by `depth`.
+    Queueing, reorder, send and total times of submitted items are recorded
+    in `telemetry` if given. `flush`, if given, is called on the sender
+    thread after every message and whenever the time it returned (seconds,
+    None to wait indefinitely) runs out without a new message. The worker
+    and sender threads run on `cpus` if given.
+    """
+
+    def __init__(self, process, send, workers=1, depth=16, telemetry=None, flush=None,
+                 cpus=None):
+        self.cpus = cpus
+        self.process = process
+        self.send = send
+        self.flush = flush
+        self.telemetry = telemetry
+        self.depth = depth
+        self.decode_queue = queue.Queue(depth)
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.callbacks = {}
+        self.seq = 0
+        self.next_seq = 0
+        self.running = True
+        self.workers = []
+        self.set_workers(workers)
+        self.sender = threading.Thread(target=self.send_loop, name='sender', daemon=True)
+        self.sender.start()
+
+    def set_workers(self, count):
+        count = max(1, count)
+        while len(self.workers) < count:
+            worker = threading.Thread(target=self.work_loop, name='decode', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        while len(self.workers) > count:
+            self.decode_queue.put(None)
+            self.workers.pop()
+
+    def submit(self, item):
+        # blocks while decode_full, callers on a shared thread check it first
+        seq = self.seq
+        self.seq += 1
+        self.decode_queue.put((seq, item, time.perf_counter_ns()))
+
+    def post(self, message):
+        with self.cond:
+            seq = self.seq
+            self.seq += 1
+            self.pending[seq] = (message, None, None)
+            self.cond.notify_all()
+
+    def when_sent(self, callback):
+        with self.cond:
+            seq = self.seq
+            self.seq += 1
+            self.pending[seq] = (None, None, None)
+            self.callbacks[seq] = callback
+            self.cond.notify_all()
+
+    def join(self):
+        """Wait until everything submitted or posted so far has been sent."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.next_seq >= self.seq or not self.running)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        for _ in self.workers:
+            self.decode_queue.put(None)
+        self.sender.join()
+
+    @property
+    def decode_full(self):
+        return self.decode_queue.full()
+
+    @property
+    def decode_depth(self):
+        return self.decode_queue.qsize()
+
+    @property
+    def send_depth(self):
+        return len(self.pending)
+
+    def work_loop(self):
+        pin_thread(self.cpus)
+        while True:
+            item = self.decode_queue.get()
+            if item is None:
+                return
+            seq, job, submitted = item
+            started = time.perf_counter_ns()
+            if self.telemetry:
+                self.telemetry.record('queue', started - submitted)
+            try:
+                message = self.process(job)
+            except Exception:
+                logger.exception('processing frame failed')
+                message = None
+            with self.cond:
+                # keep the reorder buffer bounded, the next message in line always fits
+                self.cond.wait_for(lambda: len(self.pending) < self.depth
+                                   or seq == self.next_seq or not self.running)
+                self.pending[seq] = (message, submitted, time.perf_counter_ns())
+                self.cond.notify_all()
+
+    def call_flush(self):
+        if self.flush is None:
+            return None
+        try:
+            return self.flush()
+        except Exception:
+            logger.exception('flushing messages failed')
+            return None
+
+    def send_loop(self):
+        pin_thread(self.cpus)
+        timeout = None
+        while True:
+            with self.cond:
+                ready = self.cond.wait_for(lambda: self.next_seq in self.pending or not self.running,
+                                           timeout)
+                if not self.running:
+                    return
+                if ready:
+                    message, submitted, processed = self.pending.pop(self.next_seq)
+                    callback = self.callbacks.pop(self.next_seq, None)
+            if not ready:
+                timeout = self.call_flush()
+                continue
+            if message is not None:
+                start = time.perf_counter_ns()
+                try:
+                    self.send(message)
+                except Exception:
+                    logger.exception('sending message failed')
+                if self.telemetry and submitted is not None:
+                    end = time.perf_counter_ns()
+                    self.telemetry.record('reorder', start - processed)
+                    self.telemetry.record('send', end - start)
+                    self.telemetry.record('total', end - submitted)
+            with self.cond:
+                self.next_seq += 1
+                self.cond.notify_all()
+            if callback is not None:
+                try:
+                    callback()
+                except Exception:
+                    logger.exception('sent callback failed')
+            timeout = self.call_flush()
@@ -0,0 +1,82 @@
+"""
+Live preview on a PUB socket next to the data stream.
+
+At most `rate` frames per second are binned (mean) on the decode worker
+that has the frame, frames in between are not touched. The binned copy
+replaces any copy the publisher thread has not sent yet and the PUB
+socket keeps a single message per subscriber, so slow viewers only miss
+previews and never hold up the data stream.
+
+Messages are [json header, binned frame], the header has htype
+'preview', frame, shape, type and binning.
+"""
+import time
+import threading
+import numpy as np
+import zmq
+
+
+class Preview:
+    def __init__(self, context, endpoint, telemetry):
+        self.telemetry = telemetry
+        self.socket = context.socket(zmq.PUB)
+        self.socket.setsockopt(zmq.SNDHWM, 1)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(endpoint)
+        self.cond = threading.Condition()
+        self.reducer = None
+        self.header = {}
+        self.interval = 0.0
+        self.next_time = 0.0
+        self.latest = None
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='preview', daemon=True)
+        self.thread.start()
+
+    def configure(self, reducer, rate, header):
+        """Preview frames binned by `reducer` at `rate` Hz, 0 to stop."""
+        with self.cond:
+            self.reducer = reducer if rate > 0 else None
+            self.interval = 1.0 / rate if rate > 0 else 0.0
+            self.next_time = 0.0
+            self.header = {'htype': 'preview', 'shape': reducer.shape,
+                           'type': reducer.dtype.name, **header}
+
+    def offer(self, frame_number, img):
+        # runs on a decode worker, cheap unless a preview is due
+        now = time.monotonic()
+        if self.reducer is None or now < self.next_time:
+            return
+        with self.cond:
+            reducer = self.reducer
+            if reducer is None or now < self.next_time:
+                return
+            self.next_time = now + self.interval
+            header = dict(self.header, frame=frame_number)
+        start = time.perf_counter_ns()
+        out = np.empty(reducer.shape, reducer.dtype)
+        reducer.reduce(img, out)
+        self.telemetry.record('preview', time.perf_counter_ns() - start)
+        with self.cond:
+            if self.latest is not None:
+                self.telemetry.preview_conflated += 1
+            self.latest = (header, out)
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.latest is not None or not self.running)
+                if not self.running:
+                    break
+                (header, data), self.latest = self.latest, None
+            self.socket.send_json(header, flags=zmq.SNDMORE)
+            self.socket.send(data, copy=False)
+            self.telemetry.preview_frames.add()
+        self.socket.close()
+
+    def close(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
@@ -0,0 +1,319 @@
+"""
+Record the data stream to a file and replay it on the same protocol.
+
+    Andor3-recorder record scan.a3s --endpoint tcp://b-v-zyla-0:9999
+    Andor3-recorder replay scan.a3s --endpoint tcp://*:9999 --rate 500
+
+record pulls the header, image, image_batch and series_end messages from
+the data endpoints, a comma list for a striped stream, into an indexed
+file until the given number of series ended on every endpoint. Frames
+that came through the shared memory ring are stored inline and lose the
+shm fields of their header, all other messages are stored as received.
+
+replay binds the endpoints like the device and sends the messages again,
+zero-copy from a memory map of the file, at the recorded pace
+('original'), at a fixed frame rate or as fast as the receiver takes
+them ('max'). Messages recorded from endpoint s go to endpoint s modulo
+the number of endpoints.
+
+The file is
+
+    [magic, version u32, 0 u32]
+    [message parts, each on a 64 byte boundary]
+    [MESSAGE index][PART index]
+    [message index offset, messages, part index offset, parts u64, magic]
+
+little endian, the index is written when the recording is closed.
+"""
+import sys
+import time
+import mmap
+import struct
+import argparse
+import logging
+import json
+import zmq
+import numpy as np
+from . import header as image_header
+from . import shmring
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'A3STREAM'
+VERSION = 1
+ALIGN = 64
+PREAMBLE = struct.Struct('<8sII')
+TRAILER = struct.Struct('<QQQQ8s')
+# seconds since the first message, its parts in PART, the endpoint and the frames it holds
+MESSAGE = np.dtype([('time', '<f8'), ('first', '<u8'), ('count', '<u4'), ('stripe', '<u4'),
+                    ('frames', '<u4'), ('pad', '<u4')])
+PART = np.dtype([('offset', '<u8'), ('length', '<u8')])
+RATES = ('original', 'max')
+
+
+class StreamWriter:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(PREAMBLE.pack(MAGIC, VERSION, 0))
+        self.position = PREAMBLE.size
+        self.messages = []
+        self.parts = []
+        self.start = None
+        self.bytes = 0
+
+    def pad(self):
+        padding = -self.position % ALIGN
+        if padding:
+            self.file.write(bytes(padding))
+            self.position += padding
+
+    def write(self, parts, stripe=0, frames=0, now=None):
+        now = time.monotonic() if now is None else now
+        if self.start is None:
+            self.start = now
+        self.messages.append((now - self.start, len(self.parts), len(parts), stripe, frames, 0))
+        for part in parts:
+            view = memoryview(part).cast('B')
+            self.pad()
+            self.parts.append((self.position, view.nbytes))
+            self.file.write(view)
+            self.position += view.nbytes
+            self.bytes += view.nbytes
+
+    def close(self):
+        self.pad()
+        messages = np.array(self.messages, MESSAGE)
+        parts = np.array(self.parts, PART)
+        self.file.write(messages.tobytes())
+        self.file.write(parts.tobytes())
+        self.file.write(TRAILER.pack(self.position, len(messages),
+                                     self.position + messages.nbytes, len(parts), MAGIC))
+        self.file.close()
+
+
+class StreamReader:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = PREAMBLE.unpack_from(self.map)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError('%s is not a stream recording' % path)
+        if version != VERSION:
+            self.map.close()
+            raise ValueError('stream recording version %d is not supported' % version)
+        message_offset, messages, part_offset, parts, magic = TRAILER.unpack_from(
+            self.map, len(self.map) - TRAILER.size)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError('%s has no index, the recording was not closed' % path)
+        # copies, the parts are the only views of the map
+        self.messages = np.frombuffer(self.map, MESSAGE, messages, message_offset).copy()
+        self.parts = np.frombuffer(self.map, PART, parts, part_offset).copy()
+        self.view = memoryview(self.map)
+
+    def message(self, first, count):
+        """The parts of a message as views of the map, valid until close()."""
+        return [self.view[offset:offset + length]
+                for offset, length in self.parts[first:first + count].tolist()]
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+
+class Inliner:
+    """Frames out of the shared memory ring of a series, with headers to match."""
+    # the fields of the series header that announce the ring
+    KEYS = ('shm_name', 'shm_slots', 'shm_slot_bytes', 'shm_data_offset')
+
+    def __init__(self, header):
+        self.map = shmring.attach(header['shm_name'])
+        self.states = np.frombuffer(self.map, np.uint8, header['shm_slots'])
+        self.offset = header['shm_data_offset']
+        self.slot_bytes = header['shm_slot_bytes']
+
+    def inline(self, raw, header):
+        """The parts of the image message with the frame inline and its slot."""
+        slot, size = header.pop('shm_slot'), header.pop('shm_size')
+        start = self.offset + slot * self.slot_bytes
+        data = memoryview(self.map)[start:start + size]
+        if raw[:1] == b'{':
+            return [json.dumps(header, separators=(',', ':')).encode(), data], slot
+        return [image_header.msgpack.packb(header), data], slot
+
+    def ack(self, slot):
+        self.states[slot] = 0
+
+    def close(self):
+        del self.states
+        self.map.close()
+
+
+def record(path, endpoints, series=1, timeout=0.0, receiver=None, stop=None):
+    """
+    Write the stream of `endpoints` to `path` until `series` series ended on
+    every endpoint (0 for no limit), nothing arrived for `timeout` s after
+    the first message (0 for no limit) or `stop` is set. A LocalReceiver
+    passed as `receiver` follows the stream, for a device in the same process.
+    """
+    context = zmq.Context.instance()
+    poller = zmq.Poller()
+    sockets = []
+    for endpoint in endpoints:
+        socket = context.socket(zmq.PULL)
+        socket.connect(endpoint)
+        poller.register(socket, zmq.POLLIN)
+        sockets.append(socket)
+    writer = StreamWriter(path)
+    ended = [0] * len(sockets)
+    inliners = {}
+    inliner = None
+    last = None
+    try:
+        while not (series and min(ended) >= series) and not (stop and stop.is_set()):
+            events = dict(poller.poll(100))
+            now = time.monotonic()
+            if not events:
+                if timeout and last is not None and now - last > timeout:
+                    logger.warning('nothing received for %.1f s, stopping', timeout)
+                    break
+                continue
+            last = now
+            for stripe, socket in enumerate(sockets):
+                if socket not in events:
+                    continue
+                parts = socket.recv_multipart(copy=False)
+                raw = parts[0].bytes
+                header = image_header.decode(raw)
+                if receiver:
+                    receiver.handle(header)
+                htype = header['htype']
+                frames = 0
+                slot = None
+                if htype == 'header' and 'shm_name' in header:
+                    # the replay has no ring, every stripe announces the same one
+                    if header['shm_name'] not in inliners:
+                        inliners[header['shm_name']] = Inliner(header)
+                    inliner = inliners[header['shm_name']]
+                    for key in Inliner.KEYS:
+                        header.pop(key)
+                    parts = [json.dumps(header).encode(), *parts[1:]]
+                elif htype == 'image':
+                    frames = 1
+                    if 'shm_slot' in header and inliner:
+                        parts, slot = inliner.inline(raw, header)
+                elif htype == 'image_batch':
+                    frames = header['count']
+                elif htype == 'series_end':
+                    ended[stripe] += 1
+                writer.write([part.buffer if isinstance(part, zmq.Frame) else part
+                              for part in parts], stripe, frames, now)
+                if slot is not None:
+                    # the frame is in the recording, free the slot and drop the view of the ring
+                    inliner.ack(slot)
+                    del parts
+    finally:
+        writer.close()
+        for socket in sockets:
+            socket.close()
+        for inliner in inliners.values():
+            inliner.close()
+    return {'messages': len(writer.messages), 'bytes': writer.bytes,
+            'frames': sum(message[4] for message in writer.messages)}
+
+
+def replay(path, endpoints, rate='original', repeat=1):
+    """Send the recording at `path` on `endpoints` `repeat` times, returns the totals."""
+    fps = None if rate in RATES else float(rate)
+    if fps is not None and fps <= 0:
+        raise ValueError('replay rate must be positive')
+    reader = StreamReader(path)
+    context = zmq.Context()
+    sockets = []
+    for endpoint in endpoints:
+        socket = context.socket(zmq.PUSH)
+        socket.bind(endpoint)
+        sockets.append(socket)
+    totals = {'messages': 0, 'frames': 0, 'bytes': 0, 'elapsed': 0.0}
+    lengths = reader.parts['length']
+    try:
+        for _ in range(repeat):
+            origin = None
+            sent = 0
+            for stamp, first, count, stripe, frames, _ in reader.messages.tolist():
+                if origin is not None:
+                    due = None
+                    if fps and frames:
+                        due = origin + sent / fps
+                    elif rate == 'original':
+                        due = origin + stamp
+                    if due is not None:
+                        delay = due - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                sockets[stripe % len(sockets)].send_multipart(reader.message(first, count),
+                                                              copy=False)
+                if origin is None:
+                    # the first send waits for the receiver, the pace starts after it
+                    origin = time.monotonic() - stamp
+                    start = origin + stamp
+                sent += frames
+                totals['messages'] += 1
+                totals['frames'] += frames
+                totals['bytes'] += int(lengths[first:first + count].sum())
+            if origin is not None:
+                totals['elapsed'] += time.monotonic() - start
+    finally:
+        # the sockets linger until the queued messages, which are views of the map, are out
+        for socket in sockets:
+            socket.close()
+        context.term()
+        reader.close()
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    parser_record = commands.add_parser('record', help='record the data stream to a file')
+    parser_record.add_argument('file')
+    parser_record.add_argument('--endpoint', default='tcp://127.0.0.1:9999',
+                               help='data endpoints to connect to, comma separated')
+    parser_record.add_argument('--series', type=int, default=1,
+                               help='series to record, 0 until interrupted')
+    parser_record.add_argument('--timeout', type=float, default=0,
+                               help='stop when nothing arrived for this many s, 0 to wait')
+    parser_replay = commands.add_parser('replay', help='replay a recorded stream')
+    parser_replay.add_argument('file')
+    parser_replay.add_argument('--endpoint', default='tcp://*:9999',
+                               help='endpoints to bind, comma separated')
+    parser_replay.add_argument('--rate', default='original',
+                               help="'original', 'max' or frames per second")
+    parser_replay.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    endpoints = args.endpoint.split(',')
+
+    if args.command == 'record':
+        start = time.monotonic()
+        try:
+            totals = record(args.file, endpoints, args.series, args.timeout)
+        except KeyboardInterrupt:
+            print('interrupted, the recording is closed', file=sys.stderr)
+            return
+        print('recorded     %d messages, %d frames, %.1f MB in %.1f s' % (
+            totals['messages'], totals['frames'], totals['bytes'] / 1e6, time.monotonic() - start))
+        return
+
+    totals = replay(args.file, endpoints, args.rate, args.repeat)
+    elapsed = totals['elapsed']
+    print('replayed     %d messages, %d frames, %.1f MB in %.3f s' % (
+        totals['messages'], totals['frames'], totals['bytes'] / 1e6, elapsed))
+    if elapsed > 0:
+        print('rate         %.1f fps, %.1f MB/s' % (totals['frames'] / elapsed,
+                                                   totals['bytes'] / elapsed / 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Software crop and binning of the frames before they are sent.
+
+The crop (top, left, height, width) is taken in the coordinates of the
+frame as it would be sent, after orientation. Binning sums or averages
+blocks of `binning` (rows, columns) pixels, a crop that is not a multiple
+of the block is trimmed at the bottom and right. Sums of uint16 frames
+are widened to uint32, means are rounded back to uint16. float32 frames
+(flat-field corrected) stay float32.
+"""
+import threading
+import numpy as np
+
+MODES = ('sum', 'mean')
+
+
+class Reducer:
+    def __init__(self, shape, crop=None, binning=(1, 1), mode='sum', dtype=np.uint16):
+        if mode not in MODES:
+            raise ValueError('unknown binning mode %s, choose from %s' % (mode, ', '.join(MODES)))
+        height, width = shape
+        top, left, crop_height, crop_width = crop or (0, 0, height, width)
+        if (top < 0 or left < 0 or crop_height < 1 or crop_width < 1
+                or top + crop_height > height or left + crop_width > width):
+            raise ValueError('crop %s outside of the %dx%d frame' % (crop, height, width))
+        rows, cols = binning
+        if rows < 1 or cols < 1 or rows > crop_height or cols > crop_width:
+            raise ValueError('binning %dx%d does not fit the %dx%d crop' %
+                             (rows, cols, crop_height, crop_width))
+        self.binning = (rows, cols)
+        self.mode = mode
+        self.pixels = rows * cols
+        self.shape = (crop_height // rows, crop_width // cols)
+        self.rows = slice(top, top + self.shape[0] * rows)
+        self.cols = slice(left, left + self.shape[1] * cols)
+        self.identity = self.shape == (height, width) and self.pixels == 1
+        self.floating = np.dtype(dtype).kind == 'f'
+        self.acc_dtype = np.dtype(np.float32 if self.floating else np.uint32)
+        if self.floating:
+            self.dtype = self.acc_dtype
+        else:
+            self.dtype = np.dtype(np.uint32 if mode == 'sum' and self.pixels > 1 else np.uint16)
+        self.local = threading.local()
+
+    def scratch(self, name, shape):
+        buf = getattr(self.local, name, None)
+        if buf is None:
+            buf = np.empty(shape, self.acc_dtype)
+            setattr(self.local, name, buf)
+        return buf
+
+    def reduce(self, img, out):
+        """Write the reduced `img` into `out` of self.shape and self.dtype."""
+        view = img[self.rows, self.cols]
+        if self.pixels == 1:
+            np.copyto(out, view)
+            return out
+        rows, cols = self.binning
+        height, width = self.shape
+        # rows first on whole lines, then the columns of the much smaller partial sums
+        blocks = view.reshape(height, rows, width * cols)
+        acc = self.scratch('rows', (height, width * cols))
+        np.copyto(acc, blocks[:, 0])
+        for i in range(1, rows):
+            np.add(acc, blocks[:, i], out=acc)
+        acc = acc.reshape(height, width, cols)
+        total = out if self.mode == 'sum' else self.scratch('total', self.shape)
+        np.copyto(total, acc[:, :, 0])
+        for j in range(1, cols):
+            np.add(total, acc[:, :, j], out=total)
+        if self.mode == 'mean' and self.floating:
+            np.divide(total, self.pixels, out=out)
+        elif self.mode == 'mean':
+            total += self.pixels // 2
+            np.floor_divide(total, self.pixels, out=out, casting='unsafe')
+        return out
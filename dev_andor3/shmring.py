@@ -0,0 +1,91 @@
+"""
+Shared memory ring for frames to a receiver on the same host.
+
+The ring is a POSIX shared memory object /dev/shm/<name>:
+
+    [slot states, `slots` bytes, padded to DATA_OFFSET][slot 0][slot 1]...
+
+Each slot holds one frame (raw or compressed) of up to `slot_bytes`. The
+decode worker copies a frame into a free slot and marks it busy (1); only
+a descriptor with shm_slot and shm_size goes over the data socket. The
+consumer acknowledges a slot by writing 0 to its state byte once it is
+done with the data, which makes the slot available again. When no slot
+is free the frame is sent over the data socket as usual.
+
+The series header announces the ring with shm_name, shm_slots,
+shm_slot_bytes and shm_data_offset; slot i starts at
+shm_data_offset + i * shm_slot_bytes.
+"""
+import os
+import mmap
+import threading
+import numpy as np
+
+DATA_OFFSET = 4096
+ALIGN = 4096
+
+
+def attach(name):
+    """Map an existing ring, for consumers."""
+    fd = os.open(os.path.join('/dev/shm', name), os.O_RDWR)
+    try:
+        return mmap.mmap(fd, 0)
+    finally:
+        os.close(fd)
+
+
+class ShmRing:
+    def __init__(self, name, slot_bytes, slots):
+        if slots > DATA_OFFSET:
+            raise ValueError('at most %d shared memory slots' % DATA_OFFSET)
+        self.name = name
+        self.slot_bytes = -(-slot_bytes // ALIGN) * ALIGN
+        self.slots = slots
+        size = DATA_OFFSET + self.slot_bytes * slots
+        path = os.path.join('/dev/shm', name)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.path = path
+        self.states = np.frombuffer(self.map, np.uint8, slots)
+        self.data = np.frombuffer(self.map, np.uint8, self.slot_bytes * slots, DATA_OFFSET)
+        self.lock = threading.Lock()
+        self.cursor = 0
+        self.fallbacks = 0
+
+    def describe(self):
+        return {'shm_name': self.name, 'shm_slots': self.slots,
+                'shm_slot_bytes': self.slot_bytes, 'shm_data_offset': DATA_OFFSET}
+
+    def put(self, data):
+        """Copy `data` into a free slot and return the slot, None if the ring is full."""
+        view = memoryview(data).cast('B')
+        if view.nbytes > self.slot_bytes:
+            return None
+        with self.lock:
+            free = np.flatnonzero(self.states == 0)
+            if not free.size:
+                self.fallbacks += 1
+                return None
+            # the next free slot after the last one handed out, keeps the reuse spread
+            slot = int(free[np.searchsorted(free, self.cursor) % free.size])
+            self.cursor = slot + 1
+            self.states[slot] = 1
+        start = slot * self.slot_bytes
+        self.data[start:start + view.nbytes] = np.frombuffer(view, np.uint8)
+        return slot
+
+    @property
+    def occupancy(self):
+        return int(np.count_nonzero(self.states))
+
+    def close(self):
+        del self.states, self.data
+        self.map.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
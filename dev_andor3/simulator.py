@@ -0,0 +1,679 @@
+"""
+Simulated Andor SDK3 backend.
+
+Implements the subset of libatcore/libatutility used by this package so the
+device server can be run and benchmarked without a camera. Select it by
+setting ANDOR3_SIMULATOR=1 before dev_andor3.andor is imported.
+
+Environment:
+    ANDOR3_SIM_CAMERAS      number of simulated cameras (default 1)
+    ANDOR3_SIM_LINE_TIME    sensor row readout time in s, limits FrameRate
+    ANDOR3_SIM_STRIDE_ALIGN AOIStride alignment in bytes (default 8)
+"""
+import os
+import time
+import shutil
+import atexit
+import tempfile
+import threading
+from collections import deque
+import numpy as np
+from cffi import FFI
+
+ffi = FFI()
+ffi.cdef('''
+    typedef unsigned char AT_U8;
+''')
+
+AT_SUCCESS = 0
+AT_ERR_NOTINITIALISED = 1
+AT_ERR_NOTIMPLEMENTED = 2
+AT_ERR_READONLY = 3
+AT_ERR_NOTWRITABLE = 5
+AT_ERR_OUTOFRANGE = 6
+AT_ERR_INDEXNOTAVAILABLE = 7
+AT_ERR_INVALIDHANDLE = 12
+AT_ERR_TIMEDOUT = 13
+AT_ERR_INVALIDSIZE = 15
+AT_ERR_STRINGNOTIMPLEMENTED = 19
+
+AT_HANDLE_SYSTEM = 1
+HANDLE_OFFSET = 100
+
+SENSOR_WIDTH = 2560
+SENSOR_HEIGHT = 2160
+CLOCK_FREQUENCY = 100000000
+
+BYTES_PER_PIXEL = {'Mono12': 2, 'Mono12Packed': 1.5, 'Mono16': 2, 'Mono32': 4}
+
+GAIN_ENCODINGS = {
+    '12-bit (high well capacity)': ['Mono12', 'Mono12Packed', 'Mono16'],
+    '12-bit (low noise)': ['Mono12', 'Mono12Packed', 'Mono16'],
+    '16-bit (low noise & high well capacity)': ['Mono16', 'Mono32'],
+}
+
+
+def text(value):
+    """Feature names and strings arrive as str or as AT_WC arrays."""
+    return value if isinstance(value, str) else ffi.string(value)
+
+
+def pack_mono12(pixels):
+    """Encode (height, width) 12 bit pixels as Mono12Packed rows."""
+    height, width = pixels.shape
+    if width % 2:
+        pixels = np.pad(pixels, ((0, 0), (0, 1)))
+    p0 = pixels[:, 0::2].astype(np.uint16)
+    p1 = pixels[:, 1::2].astype(np.uint16)
+    packed = np.empty((height, p0.shape[1], 3), np.uint8)
+    packed[..., 0] = p0 >> 4
+    packed[..., 1] = (p0 & 0xF) | ((p1 & 0xF) << 4)
+    packed[..., 2] = p1 >> 4
+    return packed.reshape(height, -1)[:, :row_bytes(width, 'Mono12Packed')]
+
+
+def row_bytes(width, encoding):
+    return int(np.ceil(width * BYTES_PER_PIXEL[encoding]))
+
+
+def encode(pixels, encoding, stride):
+    """Encode pixels into a raw SDK buffer with the given row stride."""
+    height, width = pixels.shape
+    if encoding == 'Mono12Packed':
+        rows = pack_mono12(pixels)
+    elif encoding == 'Mono32':
+        rows = pixels.astype('<u4').view(np.uint8).reshape(height, -1)
+    else:
+        rows = pixels.astype('<u2').view(np.uint8).reshape(height, -1)
+    raw = np.zeros((height, stride), np.uint8)
+    raw[:, :rows.shape[1]] = rows
+    return raw.reshape(-1)
+
+
+def convert(raw, width, height, stride, encoding):
+    """Reference conversion of a raw buffer to Mono16."""
+    rows = raw[:stride * height].reshape(height, stride)
+    if encoding == 'Mono12Packed':
+        ngroups = (width + 1) // 2
+        # an odd last pixel has 2 bytes, pad the group it starts
+        used = row_bytes(width, encoding)
+        rows = np.pad(rows[:, :used], ((0, 0), (0, ngroups * 3 - used)))
+        groups = rows.reshape(height, ngroups, 3).astype(np.uint16)
+        out = np.empty((height, ngroups, 2), np.uint16)
+        out[..., 0] = (groups[..., 0] << 4) + (groups[..., 1] & 0xF)
+        out[..., 1] = (groups[..., 2] << 4) + (groups[..., 1] >> 4)
+        return out.reshape(height, -1)[:, :width]
+    if encoding == 'Mono32':
+        line = rows[:, :width * 4].copy().view('<u4')
+        return np.minimum(line, 0xFFFF).astype(np.uint16)
+    return rows[:, :width * 2].copy().view('<u2').astype(np.uint16)
+
+
+class Feature:
+    def __init__(self, kind, value=None, minimum=None, maximum=None,
+                 options=None, writable=True, getter=None, setter=None):
+        self.kind = kind
+        self.value = value
+        self.minimum = minimum
+        self.maximum = maximum
+        self.options = options
+        self.writable = writable
+        self.getter = getter
+        self.setter = setter
+
+    def get(self):
+        return self.getter() if self.getter else self.value
+
+
+class Camera:
+    def __init__(self, index, fifo_dir):
+        self.index = index
+        self.lock = threading.RLock()
+        self.cond = threading.Condition(self.lock)
+        self.queued = deque()
+        self.completed = deque()
+        self.running = False
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.timestamps = []
+        self.frames_generated = 0
+        self.frames_dropped = 0
+        self.line_time = float(os.environ.get('ANDOR3_SIM_LINE_TIME', 10e-6))
+        self.stride_align = int(os.environ.get('ANDOR3_SIM_STRIDE_ALIGN', 8))
+        self.patterns = []
+        self.trailer = False
+
+        self.video_device = os.path.join(fifo_dir, 'video%d' % index)
+        os.mkfifo(self.video_device)
+        # O_RDWR keeps the fifo open for readers and lets us drain it ourselves
+        self.video_fd = os.open(self.video_device, os.O_RDWR | os.O_NONBLOCK)
+
+        gain_options = list(GAIN_ENCODINGS)
+        self.features = {
+            'CameraModel': Feature(str, 'ZYLA5.5-SIM', writable=False),
+            'SerialNumber': Feature(str, 'VSC-%05d' % index, writable=False),
+            'SensorWidth': Feature(int, SENSOR_WIDTH, writable=False),
+            'SensorHeight': Feature(int, SENSOR_HEIGHT, writable=False),
+            'AOIWidth': Feature(int, SENSOR_WIDTH, 1, SENSOR_WIDTH),
+            'AOILeft': Feature(int, 1, 1, SENSOR_WIDTH),
+            'AOIHeight': Feature(int, SENSOR_HEIGHT, 1, SENSOR_HEIGHT),
+            'AOITop': Feature(int, 1, 1, SENSOR_HEIGHT),
+            'AOIStride': Feature(int, writable=False, getter=self.stride),
+            'ImageSizeBytes': Feature(int, writable=False, getter=self.image_size),
+            'FrameCount': Feature(int, 1, 1, 2**31 - 1),
+            'ExposureTime': Feature(float, 0.01, 1e-5, 30.0),
+            'FrameRate': Feature(float, 10.0, 0.001, getter=self.frame_rate,
+                                 setter=self.set_frame_rate),
+            'ReadoutTime': Feature(float, writable=False, getter=self.readout_time),
+            'SensorTemperature': Feature(float, 0.0, writable=False),
+            'SensorCooling': Feature(bool, 0),
+            'Overlap': Feature(bool, 0),
+            'CycleMode': Feature('enum', 0, options=['Fixed', 'Continuous']),
+            'TriggerMode': Feature('enum', 0, options=['Internal', 'External',
+                                                        'External Start',
+                                                        'External Exposure',
+                                                        'Software']),
+            'ElectronicShutteringMode': Feature('enum', 0, options=['Rolling', 'Global']),
+            'PixelReadoutRate': Feature('enum', 1, options=['100 MHz', '280 MHz']),
+            'SimplePreAmpGainControl': Feature('enum', 2, options=gain_options,
+                                               setter=self.set_gain),
+            'PixelEncoding': Feature('enum', 2, options=list(BYTES_PER_PIXEL)),
+            'TemperatureStatus': Feature('enum', 0, writable=False,
+                                         options=['Cooler Off', 'Stabilised',
+                                                  'Cooling', 'Drift',
+                                                  'Not Stabilised', 'Fault']),
+            'AcquisitionStart': Feature('command', setter=self.start),
+            'AcquisitionStop': Feature('command', setter=self.stop),
+            'SoftwareTrigger': Feature('command', setter=self.software_trigger),
+            'MetadataEnable': Feature(bool, 0),
+            'MetadataTimestamp': Feature(bool, 1),
+            'MetadataFrameInfo': Feature(bool, 1),
+            'TimestampClockFrequency': Feature(int, CLOCK_FREQUENCY, writable=False),
+        }
+
+    def enum_string(self, name):
+        feature = self.features[name]
+        return feature.options[feature.value]
+
+    def enum_available(self, name, index):
+        if name == 'PixelEncoding':
+            gain = self.enum_string('SimplePreAmpGainControl')
+            return self.features[name].options[index] in GAIN_ENCODINGS[gain]
+        return True
+
+    def stride(self):
+        width = self.features['AOIWidth'].value
+        size = row_bytes(width, self.enum_string('PixelEncoding'))
+        return -(-size // self.stride_align) * self.stride_align
+
+    def metadata_size(self):
+        if not self.features['MetadataEnable'].value:
+            return 0
+        size = 8
+        if self.features['MetadataTimestamp'].value:
+            size += 16
+        if self.features['MetadataFrameInfo'].value:
+            size += 16
+        return size
+
+    def image_size(self):
+        return self.stride() * self.features['AOIHeight'].value + self.metadata_size()
+
+    def metadata(self, index):
+        """Metadata trailer of the index-th frame of the series."""
+        if not self.features['MetadataEnable'].value:
+            return b''
+        frame_bytes = self.stride() * self.features['AOIHeight'].value
+        blocks = [np.array([0, frame_bytes + 4], '<u4').tobytes()]
+        if self.features['MetadataTimestamp'].value:
+            ticks = round(index * CLOCK_FREQUENCY / self.frame_rate())
+            blocks.append(np.array([ticks], '<u8').tobytes() + np.array([1, 12], '<u4').tobytes())
+        if self.features['MetadataFrameInfo'].value:
+            encoding = self.features['PixelEncoding']
+            info = np.array([(self.features['AOIHeight'].value, self.features['AOIWidth'].value,
+                              0, encoding.value, self.stride() & 0xFFFF)],
+                            [('height', '<u2'), ('width', '<u2'), ('reserved', 'u1'),
+                             ('encoding', 'u1'), ('stride', '<u2')])
+            blocks.append(info.tobytes() + np.array([7, 12], '<u4').tobytes())
+        return b''.join(blocks)
+
+    def readout_time(self):
+        return self.features['AOIHeight'].value * self.line_time
+
+    def max_frame_rate(self):
+        readout = self.readout_time()
+        return 1.0 / readout if readout > 0 else 1e6
+
+    def frame_rate(self):
+        feature = self.features['FrameRate']
+        feature.maximum = self.max_frame_rate()
+        return min(feature.value, feature.maximum)
+
+    def set_frame_rate(self, value):
+        if value > self.max_frame_rate():
+            return AT_ERR_OUTOFRANGE
+        self.features['FrameRate'].value = value
+        return AT_SUCCESS
+
+    def set_gain(self, index):
+        self.features['SimplePreAmpGainControl'].value = index
+        encoding = self.features['PixelEncoding']
+        allowed = GAIN_ENCODINGS[self.enum_string('SimplePreAmpGainControl')]
+        if encoding.options[encoding.value] not in allowed:
+            encoding.value = encoding.options.index(allowed[0])
+        return AT_SUCCESS
+
+    def make_patterns(self, count=4):
+        width = self.features['AOIWidth'].value
+        height = self.features['AOIHeight'].value
+        encoding = self.enum_string('PixelEncoding')
+        maxval = 0xFFF if encoding.startswith('Mono12') else 0xFFFF
+        rng = np.random.default_rng(self.index)
+        ramp = np.add.outer(np.arange(height), np.arange(width)) % (maxval + 1)
+        self.patterns = []
+        for i in range(count):
+            noise = rng.integers(0, 64, size=(height, width))
+            pixels = np.minimum(ramp + noise + i, maxval).astype(np.uint32)
+            self.patterns.append(encode(pixels, encoding, self.stride()))
+
+    # acquisition
+
+    def start(self):
+        if self.running:
+            return AT_SUCCESS
+        self.make_patterns()
+        self.trailer = self.metadata_size() > 0
+        self.timestamps = []
+        self.frames_generated = 0
+        self.frames_dropped = 0
+        self.running = True
+        self.stop_event.clear()
+        if self.enum_string('TriggerMode') != 'Software':
+            self.thread = threading.Thread(target=self.generate, daemon=True)
+            self.thread.start()
+        return AT_SUCCESS
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        return AT_SUCCESS
+
+    def software_trigger(self):
+        if self.running and self.enum_string('TriggerMode') == 'Software':
+            self.produce()
+        return AT_SUCCESS
+
+    def frame_limit(self):
+        if self.enum_string('CycleMode') == 'Fixed':
+            return self.features['FrameCount'].value
+        return None
+
+    def produce(self):
+        with self.lock:
+            limit = self.frame_limit()
+            if limit is not None and self.frames_generated >= limit:
+                return False
+            self.frames_generated += 1
+            index = self.frames_generated - 1
+            if not self.queued:
+                self.frames_dropped += 1
+                return True
+            ptr, size = self.queued.popleft()
+            pattern = self.patterns[self.frames_generated % len(self.patterns)]
+            dest = np.frombuffer(ffi.buffer(ptr, size), np.uint8)
+            dest[:pattern.size] = pattern
+            if self.trailer:
+                trailer = np.frombuffer(self.metadata(index), np.uint8)
+                dest[pattern.size:pattern.size + trailer.size] = trailer
+            self.timestamps.append(time.monotonic())
+            self.completed.append((ptr, size))
+            self.cond.notify()
+        try:
+            os.write(self.video_fd, b'\0')
+        except BlockingIOError:
+            pass
+        return True
+
+    def generate(self):
+        rate = self.frame_rate()
+        period = 1.0 / rate
+        t0 = time.monotonic()
+        produced = 0
+        while not self.stop_event.is_set():
+            due = int((time.monotonic() - t0) * rate) + 1
+            while produced < due:
+                if not self.produce():
+                    return
+                produced += 1
+            self.stop_event.wait(max(0.0, t0 + produced * period - time.monotonic()))
+
+    def queue_buffer(self, ptr, size):
+        if size < self.image_size():
+            return AT_ERR_INVALIDSIZE
+        with self.lock:
+            self.queued.append((ffi.cast('AT_U8*', ptr), size))
+        return AT_SUCCESS
+
+    def wait_buffer(self, ptr, size, timeout):
+        with self.cond:
+            if not self.completed:
+                self.cond.wait(timeout / 1000.0)
+            if not self.completed:
+                return AT_ERR_TIMEDOUT
+            buf, buf_size = self.completed.popleft()
+        try:
+            os.read(self.video_fd, 1)
+        except BlockingIOError:
+            pass
+        ptr[0] = buf
+        size[0] = buf_size
+        return AT_SUCCESS
+
+    def flush(self):
+        with self.lock:
+            self.queued.clear()
+            self.completed.clear()
+            try:
+                while os.read(self.video_fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+        return AT_SUCCESS
+
+
+class SimulatedSDK:
+    """Stand-in for ffi.dlopen('libatcore.so')."""
+
+    def __init__(self, ncameras=None):
+        if ncameras is None:
+            ncameras = int(os.environ.get('ANDOR3_SIM_CAMERAS', 1))
+        self.fifo_dir = tempfile.mkdtemp(prefix='andor3-sim-')
+        self.cameras = [Camera(i, self.fifo_dir) for i in range(ncameras)]
+        self.initialised = False
+        # handle -> {feature name: [(callback, context)]}
+        self.callbacks = {}
+        self.system = {
+            'DeviceCount': Feature(int, ncameras, writable=False),
+            'SoftwareVersion': Feature(str, '3.15.30092.0-sim', writable=False),
+        }
+
+        atexit.register(self.cleanup)
+
+    def cleanup(self):
+        for camera in self.cameras:
+            camera.stop()
+            os.close(camera.video_fd)
+        shutil.rmtree(self.fifo_dir, ignore_errors=True)
+
+    def set_camera_count(self, count):
+        while len(self.cameras) < count:
+            self.cameras.append(Camera(len(self.cameras), self.fifo_dir))
+        self.system['DeviceCount'].value = len(self.cameras)
+
+    def video_devices(self):
+        return [camera.video_device for camera in self.cameras]
+
+    def camera(self, handle):
+        return self.cameras[handle - HANDLE_OFFSET]
+
+    def feature(self, handle, name):
+        if handle == AT_HANDLE_SYSTEM:
+            features = self.system
+        elif HANDLE_OFFSET <= handle < HANDLE_OFFSET + len(self.cameras):
+            features = self.camera(handle).features
+        else:
+            return None, AT_ERR_INVALIDHANDLE
+        feature = features.get(text(name))
+        if feature is None:
+            return None, AT_ERR_NOTIMPLEMENTED
+        return feature, AT_SUCCESS
+
+    def _get(self, handle, name, kinds, result):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if feature.kind not in kinds:
+            return AT_ERR_NOTIMPLEMENTED
+        result[0] = feature.get()
+        return AT_SUCCESS
+
+    def _set(self, handle, name, kinds, value):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if feature.kind not in kinds:
+            return AT_ERR_NOTIMPLEMENTED
+        if not feature.writable:
+            return AT_ERR_READONLY
+        # getters refresh dynamic limits such as the maximum FrameRate
+        feature.get()
+        if feature.minimum is not None and value < feature.minimum:
+            return AT_ERR_OUTOFRANGE
+        if feature.maximum is not None and value > feature.maximum:
+            return AT_ERR_OUTOFRANGE
+        if feature.setter:
+            ret = feature.setter(value)
+        else:
+            feature.value = value
+            ret = AT_SUCCESS
+        if ret == AT_SUCCESS:
+            self.notify(handle)
+        return ret
+
+    def notify(self, handle):
+        # a write can change dependent features, report all watched ones
+        for name, callbacks in list(self.callbacks.get(handle, {}).items()):
+            for callback, context in list(callbacks):
+                callback(handle, name, context)
+
+    def _bound(self, handle, name, kind, result, attr):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if feature.kind is not kind:
+            return AT_ERR_NOTIMPLEMENTED
+        feature.get()
+        value = getattr(feature, attr)
+        result[0] = value if value is not None else (0 if attr == 'minimum' else 2**31 - 1)
+        return AT_SUCCESS
+
+    def _is(self, handle, name, result, check):
+        feature, ret = self.feature(handle, name)
+        if ret == AT_ERR_INVALIDHANDLE:
+            return ret
+        result[0] = bool(feature is not None and check(feature))
+        return AT_SUCCESS
+
+    # library
+
+    def AT_InitialiseLibrary(self):
+        self.initialised = True
+        return AT_SUCCESS
+
+    def AT_FinaliseLibrary(self):
+        self.initialised = False
+        return AT_SUCCESS
+
+    def AT_Open(self, index, handle):
+        if index >= len(self.cameras):
+            return AT_ERR_OUTOFRANGE
+        handle[0] = HANDLE_OFFSET + index
+        return AT_SUCCESS
+
+    def AT_Close(self, handle):
+        if handle >= HANDLE_OFFSET:
+            camera = self.camera(handle)
+            camera.stop()
+            camera.flush()
+        return AT_SUCCESS
+
+    # feature access
+
+    def AT_RegisterFeatureCallback(self, handle, name, callback, context):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        name = text(name)
+        self.callbacks.setdefault(handle, {}).setdefault(name, []).append((callback, context))
+        # like the SDK, the callback is called once on registration
+        callback(handle, name, context)
+        return AT_SUCCESS
+
+    def AT_UnregisterFeatureCallback(self, handle, name, callback, context):
+        callbacks = self.callbacks.get(handle, {}).get(text(name), [])
+        if (callback, context) in callbacks:
+            callbacks.remove((callback, context))
+        return AT_SUCCESS
+
+    def AT_IsImplemented(self, handle, name, result):
+        return self._is(handle, name, result, lambda f: True)
+
+    def AT_IsReadable(self, handle, name, result):
+        return self._is(handle, name, result, lambda f: f.kind != 'command')
+
+    def AT_IsWritable(self, handle, name, result):
+        return self._is(handle, name, result, lambda f: f.writable)
+
+    def AT_IsReadOnly(self, handle, name, result):
+        return self._is(handle, name, result, lambda f: not f.writable)
+
+    def AT_SetInt(self, handle, name, value):
+        return self._set(handle, name, (int,), value)
+
+    def AT_GetInt(self, handle, name, result):
+        return self._get(handle, name, (int,), result)
+
+    def AT_GetIntMax(self, handle, name, result):
+        return self._bound(handle, name, int, result, 'maximum')
+
+    def AT_GetIntMin(self, handle, name, result):
+        return self._bound(handle, name, int, result, 'minimum')
+
+    def AT_SetFloat(self, handle, name, value):
+        return self._set(handle, name, (float,), value)
+
+    def AT_GetFloat(self, handle, name, result):
+        return self._get(handle, name, (float,), result)
+
+    def AT_GetFloatMax(self, handle, name, result):
+        return self._bound(handle, name, float, result, 'maximum')
+
+    def AT_GetFloatMin(self, handle, name, result):
+        return self._bound(handle, name, float, result, 'minimum')
+
+    def AT_SetBool(self, handle, name, value):
+        return self._set(handle, name, (bool,), int(bool(value)))
+
+    def AT_GetBool(self, handle, name, result):
+        return self._get(handle, name, (bool,), result)
+
+    def AT_SetEnumIndex(self, handle, name, index):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if feature.kind != 'enum':
+            return AT_ERR_NOTIMPLEMENTED
+        if not 0 <= index < len(feature.options):
+            return AT_ERR_OUTOFRANGE
+        if not self.camera(handle).enum_available(text(name), index):
+            return AT_ERR_INDEXNOTAVAILABLE
+        return self._set(handle, name, ('enum',), index)
+
+    def AT_SetEnumString(self, handle, name, string):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if feature.kind != 'enum':
+            return AT_ERR_NOTIMPLEMENTED
+        if text(string) not in feature.options:
+            return AT_ERR_STRINGNOTIMPLEMENTED
+        return self.AT_SetEnumIndex(handle, name, feature.options.index(text(string)))
+
+    def AT_GetEnumIndex(self, handle, name, result):
+        return self._get(handle, name, ('enum',), result)
+
+    def AT_GetEnumCount(self, handle, name, result):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        result[0] = len(feature.options)
+        return AT_SUCCESS
+
+    def AT_IsEnumIndexAvailable(self, handle, name, index, result):
+        result[0] = self.camera(handle).enum_available(text(name), index)
+        return AT_SUCCESS
+
+    def AT_IsEnumIndexImplemented(self, handle, name, index, result):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        result[0] = 0 <= index < len(feature.options)
+        return AT_SUCCESS
+
+    def AT_GetEnumStringByIndex(self, handle, name, index, string, length):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if not 0 <= index < len(feature.options):
+            return AT_ERR_OUTOFRANGE
+        value = feature.options[index][:length - 1]
+        string[0:len(value) + 1] = value + '\0'
+        return AT_SUCCESS
+
+    def AT_Command(self, handle, name):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if feature.kind != 'command':
+            return AT_ERR_NOTIMPLEMENTED
+        return feature.setter()
+
+    def AT_SetString(self, handle, name, string):
+        return self._set(handle, name, (str,), text(string))
+
+    def AT_GetString(self, handle, name, string, length):
+        feature, ret = self.feature(handle, name)
+        if ret != AT_SUCCESS:
+            return ret
+        if feature.kind is not str:
+            return AT_ERR_NOTIMPLEMENTED
+        value = feature.get()[:length - 1]
+        string[0:len(value) + 1] = value + '\0'
+        return AT_SUCCESS
+
+    def AT_GetStringMaxLength(self, handle, name, result):
+        result[0] = 64
+        return AT_SUCCESS
+
+    # buffers
+
+    def AT_QueueBuffer(self, handle, ptr, size):
+        return self.camera(handle).queue_buffer(ptr, size)
+
+    def AT_WaitBuffer(self, handle, ptr, size, timeout):
+        return self.camera(handle).wait_buffer(ptr, size, timeout)
+
+    def AT_Flush(self, handle):
+        return self.camera(handle).flush()
+
+
+class SimulatedUtility:
+    """Stand-in for ffi.dlopen('libatutility.so')."""
+
+    def AT_InitialiseUtilityLibrary(self):
+        return AT_SUCCESS
+
+    def AT_ConvertBuffer(self, inp, out, width, height, stride, in_encoding, out_encoding):
+        if text(out_encoding) != 'Mono16' or text(in_encoding) not in BYTES_PER_PIXEL:
+            return AT_ERR_NOTIMPLEMENTED
+        raw = np.frombuffer(ffi.buffer(inp, stride * height), np.uint8)
+        dest = np.frombuffer(ffi.buffer(out, width * height * 2), np.uint16)
+        dest[:] = convert(raw, width, height, stride, text(in_encoding)).reshape(-1)
+        return AT_SUCCESS
+
+
+sdk = SimulatedSDK()
+utility = SimulatedUtility()
@@ -0,0 +1,89 @@
+"""
+Overflow ring for messages the data socket cannot take.
+
+A preallocated file (meant for local NVMe) is memory mapped and used as a
+ring of multipart messages. The sender spills a message when the socket
+is at its high water mark, and every message after it while the ring is
+not empty so the order is kept, and drains the ring from the oldest
+message whenever the socket accepts again. The index of the messages is
+kept in memory only, the file is scratch space.
+"""
+import os
+import mmap
+import threading
+from collections import deque
+from .telemetry import Rate
+
+
+class SpillRing:
+    def __init__(self, path, capacity):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                os.posix_fallocate(fd, 0, capacity)
+            except OSError:
+                os.ftruncate(fd, capacity)
+            self.map = mmap.mmap(fd, capacity)
+        finally:
+            os.close(fd)
+        self.path = path
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        # (offset, part lengths, bytes, tag) of the spilled messages, oldest first
+        self.records = deque()
+        self.head = 0
+        self.bytes = 0
+        self.peak = 0
+        self.spilled = 0
+        self.drained = Rate()
+
+    def offset(self, size):
+        # where a message of `size` bytes fits, None if the ring is full
+        if not self.records:
+            self.head = 0
+            return 0 if size <= self.capacity else None
+        tail = self.records[0][0]
+        if self.head > tail:
+            if size <= self.capacity - self.head:
+                return self.head
+            return 0 if size <= tail else None
+        return self.head if size <= tail - self.head else None
+
+    def put(self, parts, tag=None):
+        """Store a multipart message, False if it does not fit."""
+        parts = [memoryview(part).cast('B') for part in parts]
+        lengths = [part.nbytes for part in parts]
+        size = sum(lengths)
+        with self.lock:
+            offset = self.offset(size)
+            if offset is None:
+                return False
+            position = offset
+            for part in parts:
+                self.map[position:position + part.nbytes] = part
+                position += part.nbytes
+            self.head = position
+            self.records.append((offset, lengths, size, tag))
+            self.bytes += size
+            self.peak = max(self.peak, self.bytes)
+            self.spilled += 1
+        return True
+
+    def peek(self):
+        """The tag and parts of the oldest message, the parts are valid until pop()."""
+        offset, lengths, _, tag = self.records[0]
+        view = memoryview(self.map)
+        parts = []
+        for length in lengths:
+            parts.append(view[offset:offset + length])
+            offset += length
+        return tag, parts
+
+    def pop(self):
+        with self.lock:
+            _, _, size, _ = self.records.popleft()
+            self.bytes -= size
+        self.drained.add(size)
+
+    def close(self):
+        self.map.close()
@@ -0,0 +1,74 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StatusPoller:
+    """
+    Refreshes the streaming-receiver status on a background thread.
+
+    The status is polled every `interval` seconds, every `fast_interval`
+    while `fast()` is true. status() returns the last snapshot and only
+    polls itself when the snapshot is older than `max_age`. `on_poll` is
+    called with the snapshot on the poller thread after every poll.
+    """
+
+    def __init__(self, receiver, interval=1.0, fast_interval=0.1, max_age=2.0,
+                 fast=None, on_poll=None):
+        self.receiver = receiver
+        self.interval = interval
+        self.fast_interval = fast_interval
+        self.max_age = max_age
+        self.fast = fast
+        self.on_poll = on_poll
+        self.lock = threading.Lock()
+        self.snapshot = None
+        self.error = None
+        self.updated = None
+        self.running = True
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='status-poller', daemon=True)
+        self.thread.start()
+
+    def poll(self):
+        try:
+            snapshot, error = self.receiver.status(), None
+        except Exception as e:
+            snapshot, error = None, e
+        with self.lock:
+            self.snapshot, self.error = snapshot, error
+            self.updated = time.monotonic()
+        return snapshot, error
+
+    def status(self):
+        """Last receiver status, raises the error of the last poll if it failed."""
+        with self.lock:
+            snapshot, error, updated = self.snapshot, self.error, self.updated
+        if updated is None or time.monotonic() - updated > self.max_age:
+            snapshot, error = self.poll()
+        if error is not None:
+            raise error
+        return snapshot
+
+    def wake(self):
+        """Poll now, e.g. after Arm."""
+        self.wakeup.set()
+
+    def run(self):
+        while self.running:
+            snapshot, error = self.poll()
+            if self.on_poll and error is None:
+                try:
+                    self.on_poll(snapshot)
+                except Exception:
+                    logger.exception('handling receiver status failed')
+            fast = self.fast and self.fast()
+            self.wakeup.wait(self.fast_interval if fast else self.interval)
+            self.wakeup.clear()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
@@ -0,0 +1,186 @@
+"""
+Low overhead timing of the frame loop.
+
+Stage durations are recorded in nanoseconds into log-linear histograms
+(HDR style, 16 sub-buckets per power of two, about 6% resolution), which
+costs a few integer operations per sample. Frame and byte rates are kept
+over a rolling window. Everything can be read as a dict for Tango or as
+Prometheus text, optionally served over HTTP.
+"""
+import time
+import json
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SUB_BITS = 4
+SUB_COUNT = 1 << SUB_BITS
+
+STAGES = ('wait', 'queue', 'decode', 'stats', 'correct', 'reduce', 'preview', 'compress',
+          'reorder', 'send', 'total')
+
+
+class Histogram:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (64 * SUB_COUNT)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, ns):
+        if ns < 2 * SUB_COUNT:
+            index = max(ns, 0)
+        else:
+            shift = ns.bit_length() - SUB_BITS - 1
+            index = (shift + 1) * SUB_COUNT + (ns >> shift) - SUB_COUNT
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += ns
+        if ns > self.max:
+            self.max = ns
+
+    @staticmethod
+    def lower_bound(index):
+        if index < 2 * SUB_COUNT:
+            return index
+        shift = index // SUB_COUNT - 1
+        return (index % SUB_COUNT + SUB_COUNT) << shift
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile, in ns."""
+        if not self.count:
+            return 0
+        target = q / 100.0 * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= target:
+                return min(self.lower_bound(index + 1), self.max)
+        return self.max
+
+
+class Rate:
+    """Events per second over a rolling window."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.total = 0
+        self.samples = deque([(time.monotonic(), 0)])
+
+    def add(self, n=1):
+        self.total += n
+        now = time.monotonic()
+        if now - self.samples[-1][0] >= 0.1:
+            self.samples.append((now, self.total))
+            while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+                self.samples.popleft()
+
+    @property
+    def value(self):
+        now = time.monotonic()
+        t0, n0 = self.samples[0]
+        if now - t0 <= 0 or now - self.samples[-1][0] > self.window:
+            return 0.0
+        return (self.total - n0) / (now - t0)
+
+
+class Telemetry:
+    def __init__(self, stripes=1):
+        # the decode workers, sender and loop record concurrently
+        self.lock = threading.Lock()
+        self.histograms = {stage: Histogram() for stage in STAGES}
+        self.frames = Rate()
+        self.bytes = Rate()
+        # bytes of frames sent on each data stripe
+        self.stripe_bytes = [Rate() for _ in range(stripes)]
+        self.sdk_queue_fill = 1.0
+        # previews published, and replaced by a newer one before they were sent
+        self.preview_frames = Rate()
+        self.preview_conflated = 0
+        self.server = None
+
+    def reset(self):
+        with self.lock:
+            for histogram in self.histograms.values():
+                histogram.reset()
+
+    def record(self, stage, ns):
+        with self.lock:
+            self.histograms[stage].record(ns)
+
+    def snapshot(self):
+        stages = {}
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                stages[stage] = {'count': histogram.count,
+                                 'mean_ms': histogram.sum / histogram.count / 1e6 if histogram.count else 0.0,
+                                 'p50_ms': histogram.percentile(50) / 1e6,
+                                 'p99_ms': histogram.percentile(99) / 1e6,
+                                 'max_ms': histogram.max / 1e6}
+        return {'fps': self.frames.value,
+                'mb_per_s': self.bytes.value / 1e6,
+                'sdk_queue_fill': self.sdk_queue_fill,
+                'stripe_mb_per_s': [rate.value / 1e6 for rate in self.stripe_bytes],
+                'preview_fps': self.preview_frames.value,
+                'preview_conflated': self.preview_conflated,
+                'stages': stages}
+
+    def json(self):
+        return json.dumps(self.snapshot())
+
+    def prometheus(self, prefix='andor3'):
+        lines = ['# TYPE %s_stage_latency_seconds summary' % prefix]
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                for q in (0.5, 0.9, 0.99):
+                    lines.append('%s_stage_latency_seconds{stage="%s",quantile="%s"} %g' %
+                                 (prefix, stage, q, histogram.percentile(q * 100) / 1e9))
+                lines.append('%s_stage_latency_seconds_sum{stage="%s"} %g' % (prefix, stage, histogram.sum / 1e9))
+                lines.append('%s_stage_latency_seconds_count{stage="%s"} %d' % (prefix, stage, histogram.count))
+        lines += ['# TYPE %s_frames_total counter' % prefix,
+                  '%s_frames_total %d' % (prefix, self.frames.total),
+                  '# TYPE %s_bytes_total counter' % prefix,
+                  '%s_bytes_total %d' % (prefix, self.bytes.total),
+                  '# TYPE %s_frame_rate gauge' % prefix,
+                  '%s_frame_rate %g' % (prefix, self.frames.value),
+                  '# TYPE %s_throughput_bytes_per_second gauge' % prefix,
+                  '%s_throughput_bytes_per_second %g' % (prefix, self.bytes.value),
+                  '# TYPE %s_sdk_queue_fill gauge' % prefix,
+                  '%s_sdk_queue_fill %g' % (prefix, self.sdk_queue_fill),
+                  '# TYPE %s_stripe_bytes_total counter' % prefix]
+        lines += ['%s_stripe_bytes_total{stripe="%d"} %d' % (prefix, index, rate.total)
+                  for index, rate in enumerate(self.stripe_bytes)]
+        lines += ['# TYPE %s_stripe_throughput_bytes_per_second gauge' % prefix]
+        lines += ['%s_stripe_throughput_bytes_per_second{stripe="%d"} %g' %
+                  (prefix, index, rate.value) for index, rate in enumerate(self.stripe_bytes)]
+        lines += ['# TYPE %s_preview_frames_total counter' % prefix,
+                  '%s_preview_frames_total %d' % (prefix, self.preview_frames.total),
+                  '# TYPE %s_preview_conflated_total counter' % prefix,
+                  '%s_preview_conflated_total %d' % (prefix, self.preview_conflated)]
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port):
+        """Serve the Prometheus text on http://<host>:<port>/metrics."""
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='telemetry', daemon=True).start()
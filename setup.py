@@ -6,8 +6,12 @@ setup(
     setup_requires=["setuptools_scm"],
     packages=find_packages(),
     install_requires=['libdaq', 'pytango', 'pyzmq'],
+    extras_require={'compression': ['bitshuffle', 'zstandard', 'blosc'],
+                    'msgpack': ['msgpack']},
     entry_points = {
-        'console_scripts': ['Andor3 = dev_andor3.Andor3:main',]
+        'console_scripts': ['Andor3 = dev_andor3.Andor3:main',
+                            'Andor3-benchmark = dev_andor3.benchmark:main',
+                            'Andor3-recorder = dev_andor3.recorder:main',]
     }
 ) 
  
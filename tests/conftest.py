@@ -0,0 +1,4 @@
+import os
+
+# the tests run against the simulated SDK, set before dev_andor3.andor is imported
+os.environ.setdefault('ANDOR3_SIMULATOR', '1')
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from dev_andor3.decoder import Decoder
+
+# hand-packed rows of known pixels, 0xEE is AOIStride padding the decoder must skip
+PAD = 0xEE
+
+
+def raw(rows, stride):
+    data = b''.join(bytes(row) + bytes([PAD] * (stride - len(row))) for row in rows)
+    return np.frombuffer(data, np.uint8)
+
+
+def decode(rows, width, stride, encoding, threads=1):
+    out = np.zeros((len(rows), width), np.uint16)
+    Decoder(width, len(rows), stride, encoding, threads).decode(raw(rows, stride), out)
+    return out.tolist()
+
+
+def test_mono12packed_even_width():
+    # pixels A, B packed as A[11:4], B[3:0] << 4 | A[3:0], B[11:4]
+    rows = [[0xAB, 0x3C, 0x12, 0xFF, 0x0F, 0x00]]
+    assert decode(rows, 4, 6, 'Mono12Packed') == [[0xABC, 0x123, 0xFFF, 0x000]]
+
+
+def test_mono12packed_odd_width_padded_stride():
+    rows = [[0xFF, 0x0F, 0x00, 0x80, 0x01],
+            [0x00, 0x01, 0x01, 0x10, 0x00]]
+    assert decode(rows, 3, 8, 'Mono12Packed') == [[0xFFF, 0x000, 0x801],
+                                                  [0x001, 0x010, 0x100]]
+
+
+def test_mono12packed_odd_width_unpadded_stride():
+    # the last pixel of a row has no partner, its row ends after 5 bytes
+    rows = [[0x12, 0x03, 0x00, 0x45, 0x06],
+            [0x78, 0x09, 0x00, 0xAB, 0x0C]]
+    assert decode(rows, 3, 5, 'Mono12Packed') == [[0x123, 0x000, 0x456],
+                                                  [0x789, 0x000, 0xABC]]
+
+
+@pytest.mark.parametrize('encoding', ['Mono12', 'Mono16'])
+def test_16_bit_little_endian_padded_stride(encoding):
+    rows = [[0x34, 0x12, 0xFF, 0x0F, 0x01, 0x00],
+            [0x00, 0x00, 0xCD, 0xAB, 0xFF, 0xFF]]
+    assert decode(rows, 3, 10, encoding) == [[0x1234, 0x0FFF, 0x0001],
+                                             [0x0000, 0xABCD, 0xFFFF]]
+
+
+def test_mono32_clipped_to_16_bits():
+    rows = [[0x34, 0x12, 0x00, 0x00, 0x45, 0x23, 0x01, 0x00, 0xFF, 0xFF, 0x00, 0x00]]
+    assert decode(rows, 3, 16, 'Mono32') == [[0x1234, 0xFFFF, 0xFFFF]]
+
+
+def test_row_bands_match_single_thread():
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 256, size=(9, 12)).tolist()
+    assert (decode(rows, 7, 12, 'Mono12Packed', threads=3)
+            == decode(rows, 7, 12, 'Mono12Packed'))
+
+
+def test_strided_output_view():
+    # orientation writes through a strided view of the frame
+    rows = [[0x01, 0x00, 0x02, 0x00], [0x03, 0x00, 0x04, 0x00]]
+    out = np.zeros((2, 2), np.uint16)
+    Decoder(2, 2, 4, 'Mono16').decode(raw(rows, 4), out[:, ::-1])
+    assert out.tolist() == [[2, 1], [4, 3]]
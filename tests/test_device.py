@@ -0,0 +1,312 @@
+import json
+import time
+import itertools
+import threading
+import numpy as np
+import pytest
+import zmq
+from tango import DevState
+from dev_andor3 import andor
+from dev_andor3 import simulator
+from dev_andor3 import header as image_header
+from dev_andor3.benchmark import BenchmarkDevice
+
+GAIN = '16-bit (low noise & high well capacity)'
+WIDTH, HEIGHT = 64, 32
+TIMEOUT = 10.0
+ENDPOINTS = itertools.count()
+
+
+class Sink:
+    """The data stream of a device, pulled like a receiver in the same process."""
+
+    def __init__(self, device, endpoints, stall=False):
+        self.device = device
+        self.messages = []
+        self.cond = threading.Condition()
+        # a stalled sink stops reading after the first frame until resumed
+        self.resume = threading.Event()
+        if not stall:
+            self.resume.set()
+        self.done = threading.Event()
+        self.sockets = []
+        for endpoint in endpoints:
+            socket = zmq.Context.instance().socket(zmq.PULL)
+            socket.setsockopt(zmq.RCVHWM, 4)
+            socket.connect(endpoint)
+            self.sockets.append(socket)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        poller = zmq.Poller()
+        for socket in self.sockets:
+            poller.register(socket, zmq.POLLIN)
+        while not self.done.is_set():
+            events = dict(poller.poll(50))
+            for stripe, socket in enumerate(self.sockets):
+                if socket not in events:
+                    continue
+                parts = socket.recv_multipart()
+                header = image_header.decode(parts[0])
+                self.device.receiver.handle(header)
+                with self.cond:
+                    self.messages.append((stripe, header, parts[1:]))
+                    self.cond.notify_all()
+                if header['htype'] == 'image':
+                    self.resume.wait()
+
+    def headers(self, stripe=None, htype=None):
+        with self.cond:
+            return [header for s, header, _ in self.messages
+                    if stripe in (None, s) and htype in (None, header['htype'])]
+
+    def wait(self, condition):
+        with self.cond:
+            assert self.cond.wait_for(condition, TIMEOUT)
+
+    def wait_for_end(self, series=1):
+        # series_end is sent on every stripe
+        self.wait(lambda: all(len(self.headers(stripe, 'series_end')) >= series
+                              for stripe in range(len(self.sockets))))
+
+    def frames(self):
+        with self.cond:
+            return [np.frombuffer(parts[0], header['type']).reshape(header['shape'])
+                    for _, header, parts in self.messages if header['htype'] == 'image']
+
+    def close(self):
+        self.resume.set()
+        self.done.set()
+        self.thread.join()
+        for socket in self.sockets:
+            socket.close(linger=0)
+
+
+@pytest.fixture
+def make_device(tmp_path):
+    created = []
+
+    def make(stripes=1, stall=False, spill=False, rate=500.0, camera=0, spill_size=16):
+        endpoints = ['inproc://andor3-test-%d' % next(ENDPOINTS) for _ in range(stripes)]
+        andor.sdk.set_camera_count(camera + 1)
+        device = BenchmarkDevice(endpoints, 'VSC-%05d' % camera,
+                                 spill_path=str(tmp_path / 'spill') if spill else '',
+                                 spill_size=spill_size)
+        sink = Sink(device, endpoints, stall)
+        created.append((device, sink))
+        device.configure(WIDTH, HEIGHT, GAIN, 'Mono16', rate)
+        return device, sink
+
+    yield make
+    for device, sink in created:
+        sink.resume.set()
+        device.close()
+        sink.close()
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def acquire(device, sink, frames, series=1):
+    device.write_nTriggers(frames)
+    device.Arm()
+    sink.wait_for_end(series)
+    wait_until(lambda: not device._running)
+
+
+def expected(device, frame):
+    # the simulator cycles through its patterns from the second one
+    camera = andor.sdk.camera(device.handle)
+    raw = camera.patterns[(frame + 1) % len(camera.patterns)]
+    return simulator.convert(raw, WIDTH, HEIGHT, camera.stride(),
+                             camera.enum_string('PixelEncoding'))
+
+
+def test_series(make_device):
+    device, sink = make_device()
+    acquire(device, sink, 20)
+    htypes = [header['htype'] for header in sink.headers()]
+    assert htypes == ['header'] + ['image'] * 20 + ['series_end']
+    assert [header['frame'] for header in sink.headers(htype='image')] == list(range(20))
+    assert sink.headers(htype='series_end')[0]['dropped'] == 0
+    assert device.receiver.status() == {'state': 'idle', 'error': '', 'frames_received': 20}
+    assert not device._running
+    for frame, image in enumerate(sink.frames()):
+        np.testing.assert_array_equal(image, expected(device, frame))
+
+
+def test_stop_and_next_series(make_device):
+    device, sink = make_device(rate=200.0)
+    device.write_nTriggers(100000)
+    device.Arm()
+    sink.wait(lambda: len(sink.headers(htype='image')) >= 5)
+    device.Stop()
+    sink.wait_for_end()
+    wait_until(lambda: not device._running)
+    stopped = len(sink.headers(htype='image'))
+    assert stopped < 100000
+    acquire(device, sink, 10, series=2)
+    frames = [header['frame'] for header in sink.headers(htype='image')]
+    assert frames == list(range(stopped)) + list(range(10))
+    assert [header['htype'] for header in sink.headers()][-12:] == (
+        ['header'] + ['image'] * 10 + ['series_end'])
+
+
+def test_stalled_camera_leaves_the_loop_to_others(make_device, monkeypatch):
+    # more SDK buffers than the decode queue holds, the stalled camera must not block the loop
+    monkeypatch.setattr(BenchmarkDevice, 'data_hwm', 8, raising=False)
+    stalled, stalled_sink = make_device(stall=True, rate=1000.0)
+    stalled.write_nTriggers(100000)
+    stalled.Arm()
+    wait_until(lambda: not stalled._video_polled)
+    device, sink = make_device(camera=1)
+    acquire(device, sink, 20)
+    assert len(sink.headers(htype='image')) == 20
+    stalled.Stop()
+    stalled_sink.resume.set()
+    stalled_sink.wait_for_end()
+
+
+def test_spill_replays_in_order(make_device):
+    device, sink = make_device(stall=True, spill=True, rate=1000.0)
+    device.write_nTriggers(300)
+    device.Arm()
+    # the series ends on the device while the receiver is still behind
+    wait_until(lambda: not device._running)
+    assert device.spill.spilled > 0
+    sink.resume.set()
+    sink.wait_for_end()
+    headers = sink.headers()
+    assert [header['frame'] for header in headers[1:-1]] == list(range(300))
+    assert headers[-1]['htype'] == 'series_end'
+    numbers = [header['msg_number'] for header in headers]
+    assert numbers == list(range(numbers[0], numbers[0] + len(numbers)))
+    assert not device.spill.records
+
+
+def test_full_spill_fails_only_its_series(make_device):
+    device, sink = make_device(stall=True, spill=True, rate=1000.0, spill_size=1)
+    device.write_nTriggers(400)
+    device.Arm()
+    wait_until(lambda: device._series_error)
+    sink.resume.set()
+    sink.wait_for_end()
+    wait_until(lambda: not device._running)
+    # the frames keep their order, the series is marked failed
+    assert [header['frame'] for header in sink.headers(htype='image')] == list(range(400))
+    assert device.evaluate_state(device.receiver.status())[0] == DevState.FAULT
+    acquire(device, sink, 20, series=2)
+    assert device.evaluate_state(device.receiver.status()) == (DevState.ON, 'Idle')
+
+
+def test_stripes(make_device):
+    device, sink = make_device(stripes=2)
+    acquire(device, sink, 20)
+    for stripe in range(2):
+        headers = sink.headers(stripe)
+        assert headers[0]['htype'] == 'header' and headers[0]['stripes'] == 2
+        assert headers[-1]['htype'] == 'series_end'
+        assert [header['frame'] for header in headers[1:-1]] == list(range(stripe, 20, 2))
+        numbers = [header['msg_number'] for header in headers]
+        assert numbers == list(range(numbers[0], numbers[0] + len(numbers)))
+    assert device.receiver.frames_received == 20
+
+
+def test_metadata_gaps(make_device, monkeypatch):
+    device, sink = make_device()
+    device.features.set_bool('MetadataEnable', 1)
+    device._metadata_enable = True
+    camera = andor.sdk.camera(device.handle)
+    produce = camera.produce
+
+    def lossy():
+        # the camera loses the 6th and 7th frame, their ticks are missing from the stream
+        if camera.frames_generated in (5, 6):
+            with camera.lock:
+                camera.frames_generated += 1
+            return True
+        return produce()
+
+    monkeypatch.setattr(camera, 'produce', lossy)
+    acquire(device, sink, 20)
+    images = sink.headers(htype='image')
+    assert len(images) == 18
+    assert sink.headers(htype='series_end')[0]['dropped'] == 2
+    assert device._dropped_frames == 2
+    period = images[1]['ticks'] - images[0]['ticks']
+    assert images[5]['ticks'] - images[4]['ticks'] == 3 * period
+
+
+def test_configure_rolls_back(make_device):
+    device, sink = make_device()
+    with pytest.raises(ValueError):
+        device.Configure(json.dumps({'AOIWidth': 32, 'ExposureTime': 100.0}))
+    assert device.features.get_int('AOIWidth') == WIDTH
+    assert device._width == WIDTH
+    effective = json.loads(device.Configure(json.dumps({'AOIWidth': 32, 'ExposureTime': 0.002})))
+    assert effective['AOIWidth'] == 32 and device._width == 32
+    assert device._exposure_time == pytest.approx(0.002)
+
+
+def test_configure_trigger_modes(make_device):
+    device, sink = make_device()
+    with pytest.raises(ValueError, match='TriggerMode'):
+        device.Configure(json.dumps({'TriggerMode': 'External Start'}))
+    assert device.read_TriggerMode() == 'INTERNAL'
+    device.Configure(json.dumps({'TriggerMode': 'EXTERNAL_MULTI'}))
+    assert device.read_TriggerMode() == 'EXTERNAL_MULTI'
+    device.Configure(json.dumps({'TriggerMode': 'Internal'}))
+    assert device.read_TriggerMode() == 'INTERNAL'
+
+
+@pytest.mark.parametrize('fliplr, flipud, rotation', [(True, False, 0), (False, True, 1),
+                                                      (True, True, 2), (True, False, 3)])
+def test_orientation_matches_flip_rot90(make_device, fliplr, flipud, rotation):
+    device, sink = make_device()
+    device._fliplr, device._flipud, device._rotation = fliplr, flipud, rotation
+    acquire(device, sink, 8)
+    for frame, image in enumerate(sink.frames()):
+        # the order of the frame loop before orientation was fused into the decode
+        img = expected(device, frame)
+        if fliplr:
+            img = np.fliplr(img)
+        if flipud:
+            img = np.flipud(img)
+        np.testing.assert_array_equal(image, np.rot90(img, rotation))
+
+
+def test_reference_right_after_a_series(make_device):
+    device, sink = make_device()
+    device.write_nTriggers(20)
+    device.Arm()
+    # series_end is out and the receiver idle, the device may still be flushing the series
+    sink.wait_for_end()
+    wait_until(lambda: not device._armed)
+    device.AcquireDark(4)
+    wait_until(lambda: device.reference is None)
+    assert device.references.get(device.reference_key(), 'dark') is not None
+
+
+def test_reference_key_follows_the_camera(make_device):
+    device, sink = make_device()
+    for acquire_reference in (device.AcquireDark, device.AcquireFlat):
+        acquire_reference(4)
+        wait_until(lambda: device.reference is None)
+    device._flatfield = 'float32'
+    acquire(device, sink, 4)
+    assert 'flatfield' in sink.headers(htype='image')[0]
+    # a gain written after the references needs references of its own
+    device.write_SimplePreAmpGainControl('12-bit (low noise)')
+    assert '12-bit (low noise)' in device.reference_key()
+    with pytest.raises(RuntimeError, match='no dark and flat reference'):
+        device.Arm()
+    device.write_SimplePreAmpGainControl(GAIN)
+    device.features.set_enum_string('PixelEncoding', 'Mono16')
+    device.Configure(json.dumps({'ExposureTime': device.features.get_float('ExposureTime') / 2}))
+    with pytest.raises(RuntimeError, match='no dark and flat reference'):
+        device.Arm()
@@ -0,0 +1,40 @@
+import numpy as np
+from dev_andor3.framepool import FramePool
+
+
+class Tracker:
+    done = False
+
+
+def test_slots_return_out_of_send_order():
+    # a frame on an idle stripe completes before an earlier one on a stalled stripe
+    pool = FramePool()
+    pool.resize(16, 2)
+    first, second = pool.acquire((2, 4)), pool.acquire((2, 4))
+    stalled, idle = Tracker(), Tracker()
+    pool.track(first, stalled)
+    pool.track(second, idle)
+    idle.done = True
+    assert pool.occupancy == 1
+    assert pool.acquire((2, 4)).base is second.base
+    assert pool.exhausted == 0
+
+
+def test_exhausted_while_in_flight():
+    pool = FramePool()
+    pool.resize(16, 1)
+    frame = pool.acquire((8,))
+    tracker = Tracker()
+    pool.track(frame, tracker)
+    assert pool.acquire((8,)).base is None
+    assert pool.exhausted == 1
+    tracker.done = True
+    assert pool.acquire((8,)).base is frame.base
+
+
+def test_release_returns_slot():
+    pool = FramePool(np.float32)
+    pool.resize(32, 1)
+    frame = pool.acquire((2, 2))
+    pool.release(frame)
+    assert pool.occupancy == 0
@@ -0,0 +1,20 @@
+import threading
+from dev_andor3.telemetry import Telemetry
+
+
+def test_concurrent_records_are_counted():
+    # the decode workers record into the same histograms
+    telemetry = Telemetry()
+
+    def work():
+        for ns in range(20000):
+            telemetry.record('decode', ns)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    decode = telemetry.snapshot()['stages']['decode']
+    assert decode['count'] == 80000
+    assert decode['max_ms'] == 19999 / 1e6